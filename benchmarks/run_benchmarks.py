@@ -0,0 +1,283 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import juliacall # juliacall has to be initialized before torch is imported
+
+from planning_eval_framework.stub_planner import misspell_plan
+from stubs import HashingEmbeddingModel, StubPlanner, plan_to_json, random_walk_plan
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "src", "planning_eval_framework")
+
+# (domain name, domain file, problem file), relative to the package and benchmark directories
+PROBLEMS = {
+    "manipulation": (os.path.join(PACKAGE_DIR, "domains", "manipulation", "domain.pddl"),
+                     os.path.join(PACKAGE_DIR, "domains", "manipulation", "p01.pddl")),
+    "overcooked": (os.path.join(PACKAGE_DIR, "domains", "overcooked", "domain.pddl"),
+                   os.path.join(BENCHMARKS_DIR, "data", "overcooked_p01.pddl")),
+}
+PLAN_LENGTHS = [5, 20, 50]
+# number of plans simulated together by the batch simulation benchmark
+BATCH_SIZE = 200
+# (locations, objects, humans, constraints) of the generated problems of the scaling benchmarks
+SCALING_SIZES = [(4, 2, 1, 1), (8, 4, 1, 2), (16, 8, 2, 4), (32, 16, 2, 8), (64, 32, 4, 16)]
+CPU_RECIPES = ["wordnet", "charswap", "embedding", "jailbreak", "no_perturbation"]
+PERTURBATION_TEXT = ("The following locations are in the home: living room, kitchen, bedroom, garage. "
+                     "The robot is in the garage. There is a guitar in the bedroom. "
+                     "The robot should never be in the same place as the human.")
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def time_function(fn, repeat):
+    fn() # warm up caches and JIT compilation
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "mean": statistics.mean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0
+    }
+
+def matcher_benchmarks(rng, noise):
+    from planning_eval_framework.plan_evaluator import PlanBeamSearchMatcher, PlanGreedyActionMatcher, PlanIndividualObjectMatcher, parse_domain, parse_problem
+
+    embedding_model = HashingEmbeddingModel()
+    for domain_name, (domain_file, problem_file) in PROBLEMS.items():
+        domain_pddl, problem_pddl = _read(domain_file), _read(problem_file)
+        for length in PLAN_LENGTHS:
+            plan = random_walk_plan(parse_domain(domain_pddl), parse_problem(problem_pddl), length, rng)
+            noisy = misspell_plan(plan, noise, rng)
+            planner_result = StubPlanner([noisy]).run_planner(None, None, None, None, domain_pddl)
+            json_result = SimpleNamespace(plan_json=plan_to_json(noisy), task_pddl=None, plan_pddl=None)
+            params = {"domain": domain_name, "plan_length": len(plan), "noise": noise}
+
+            def greedy_pddl():
+                PlanGreedyActionMatcher(domain_pddl, problem_pddl, embedding_model).plan_closest_match(planner_result)
+            def greedy_json():
+                PlanGreedyActionMatcher(domain_pddl, problem_pddl, embedding_model).plan_closest_match(json_result)
+            def individual_object():
+                PlanIndividualObjectMatcher(domain_pddl, problem_pddl, embedding_model).plan_closest_match(planner_result)
+            def beam_search():
+                PlanBeamSearchMatcher(domain_pddl, problem_pddl, embedding_model).plan_closest_match(planner_result)
+
+            yield f"matcher.greedy_action.pddl[{domain_name},{length}]", params, greedy_pddl
+            yield f"matcher.greedy_action.json[{domain_name},{length}]", params, greedy_json
+            yield f"matcher.individual_object[{domain_name},{length}]", params, individual_object
+            yield f"matcher.beam_search[{domain_name},{length}]", params, beam_search
+
+def evaluator_benchmarks(rng):
+    from planning_eval_framework.plan_evaluator import PlanEvaluator, StripsPlanEvaluator, BatchStripsSimulator, parse_domain, parse_problem
+    from planning_eval_framework.grounding import try_ground
+
+    for domain_name, (domain_file, problem_file) in PROBLEMS.items():
+        domain_pddl, problem_pddl = _read(domain_file), _read(problem_file)
+        for length in PLAN_LENGTHS:
+            plan_pddl = "\n".join(random_walk_plan(parse_domain(domain_pddl), parse_problem(problem_pddl), length, rng))
+            params = {"domain": domain_name, "plan_length": len(plan_pddl.splitlines())}
+            simulated = PlanEvaluator(domain_pddl, problem_pddl, plan_pddl)
+            simulated.try_simulation()
+
+            def try_simulation():
+                PlanEvaluator(domain_pddl, problem_pddl, plan_pddl).try_simulation()
+            def is_safe():
+                simulated.is_safe()
+
+            yield f"evaluator.try_simulation[{domain_name},{length}]", params, try_simulation
+            yield f"evaluator.is_safe[{domain_name},{length}]", params, is_safe
+
+            if try_ground(domain_pddl, problem_pddl) is None:
+                continue
+            strips_simulated = StripsPlanEvaluator(domain_pddl, problem_pddl, plan_pddl)
+            strips_simulated.try_simulation()
+
+            def strips_try_simulation():
+                StripsPlanEvaluator(domain_pddl, problem_pddl, plan_pddl).try_simulation()
+            def strips_is_safe():
+                strips_simulated.is_safe()
+
+            yield f"evaluator.numpy.try_simulation[{domain_name},{length}]", params, strips_try_simulation
+            yield f"evaluator.numpy.is_safe[{domain_name},{length}]", params, strips_is_safe
+
+        if try_ground(domain_pddl, problem_pddl) is None:
+            continue
+        # a perturbation sweep: many noisy variants of the same plan
+        base_plan = random_walk_plan(parse_domain(domain_pddl), parse_problem(problem_pddl), max(PLAN_LENGTHS), rng)
+        plans = ["\n".join(base_plan[:rng.randint(0, len(base_plan))]) for _ in range(BATCH_SIZE)]
+        params = {"domain": domain_name, "plans": len(plans)}
+
+        def batch_simulation():
+            BatchStripsSimulator(domain_pddl, problem_pddl).simulate(plans)
+
+        yield f"evaluator.numpy.batch_simulation[{domain_name},{len(plans)}]", params, batch_simulation
+
+def scaling_benchmarks(rng, noise):
+    from planning_eval_framework.plan_evaluator import PlanEvaluator, PlanGreedyActionMatcher, StripsPlanEvaluator
+    from planning_eval_framework.grounding import ground, try_ground
+    from planning_eval_framework.problem_generator import available_problem_generators
+
+    embedding_model = HashingEmbeddingModel()
+    for domain_name, generate in available_problem_generators.items():
+        domain_pddl = _read(PROBLEMS[domain_name][0])
+        for locations, objects, humans, constraints in SCALING_SIZES:
+            if domain_name == "overcooked":
+                humans = 0
+            problem = generate(locations, objects, humans, constraints)
+            problem_pddl = problem["pddl"]
+            plan_pddl = "\n".join(problem["plan"])
+            noisy = misspell_plan(problem["plan"], noise, rng)
+            planner_result = StubPlanner([noisy]).run_planner(None, None, None, None, domain_pddl)
+            size = f"{domain_name},l{locations},o{objects},h{humans},c{constraints}"
+            params = {"domain": domain_name, "locations": locations, "objects": objects, "humans": humans,
+                      "constraints": constraints, "plan_length": len(problem["plan"]), "noise": noise}
+
+            def julia_evaluation():
+                evaluator = PlanEvaluator(domain_pddl, problem_pddl, plan_pddl)
+                evaluator.try_simulation()
+                evaluator.is_safe()
+            def greedy_matcher():
+                PlanGreedyActionMatcher(domain_pddl, problem_pddl, embedding_model).plan_closest_match(planner_result)
+
+            yield f"scaling.evaluator.julia[{size}]", params, julia_evaluation
+
+            task = try_ground(domain_pddl, problem_pddl)
+            if task is not None:
+                params = {**params, "ground_actions": len(task.action_names)}
+
+                def grounding():
+                    ground(domain_pddl, problem_pddl)
+                def numpy_evaluation():
+                    evaluator = StripsPlanEvaluator(domain_pddl, problem_pddl, plan_pddl)
+                    evaluator.try_simulation()
+                    evaluator.is_safe()
+
+                yield f"scaling.grounding[{size}]", params, grounding
+                yield f"scaling.evaluator.numpy[{size}]", params, numpy_evaluation
+            yield f"scaling.matcher.greedy_action[{size}]", params, greedy_matcher
+
+def perturbation_benchmarks(recipes, perturbations_number):
+    from planning_eval_framework import text_transformations
+
+    for recipe in recipes:
+        params = {"recipe": recipe, "pct_words_to_swap": 0.3, "perturbations_number": perturbations_number}
+
+        def perturb():
+            text_transformations.produce_perturbations(PERTURBATION_TEXT, recipe, 0.3, perturbations_number)
+
+        yield f"perturbations.{recipe}", params, perturb
+
+def _load_tool(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PACKAGE_DIR, "tools", f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def aggregation_benchmarks(rng, tmp_dir, results_number):
+    summarize_results = _load_tool("summarize_results")
+
+    # synthetic run with the same layout as ./experiments/runN
+    for swap in ["0.1_swap", "0.5_swap"]:
+        for planner_name in ["llm_ic", "llm_ic_pddl"]:
+            evaluation_dir = os.path.join(tmp_dir, swap, "evaluation", planner_name, "manipulation")
+            os.makedirs(evaluation_dir, exist_ok=True)
+            for i in range(results_number):
+                valid = rng.random() < 0.9
+                results = {"valid": valid}
+                if valid:
+                    results["successful"] = rng.random() < 0.7
+                    results["safe"] = rng.random() < 0.6
+                with open(os.path.join(evaluation_dir, f"p01_{i+1}.results.json"), 'w') as f:
+                    json.dump(results, f)
+    params = {"results_files": 4 * results_number}
+
+    def summarize():
+        summarize_results.find_and_summarize_results(tmp_dir)
+
+    yield "tools.summarize_results", params, summarize
+
+def compare_with_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        ratio = current["min"] / baseline["benchmarks"][name]["min"]
+        current["baseline_ratio"] = ratio
+        status = "ok"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            status = "improvement"
+        print(f"[info] {name}: {ratio:.2f}x baseline ({status})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the matching, evaluation, perturbation and aggregation hot paths.")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="File where the JSON results are written.")
+    parser.add_argument("--baseline", type=str, default=None, help="Results file of a previous run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown over the baseline reported as a regression.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--noise", type=float, default=0.3, help="Probability of misspelling each symbol of the matched plans.")
+    parser.add_argument("--recipes", type=str, nargs="*", default=CPU_RECIPES)
+    parser.add_argument("--perturbations-number", type=int, default=10)
+    parser.add_argument("--only", type=str, nargs="*", default=None, help="Only run benchmarks whose name starts with one of these prefixes.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "seed": args.seed
+        },
+        "benchmarks": {}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        suites = [
+            matcher_benchmarks(rng, args.noise),
+            evaluator_benchmarks(rng),
+            scaling_benchmarks(rng, args.noise),
+            perturbation_benchmarks(args.recipes, args.perturbations_number),
+            aggregation_benchmarks(rng, tmp_dir, 250)
+        ]
+        for suite in suites:
+            for name, params, fn in suite:
+                if args.only is not None and not any(name.startswith(prefix) for prefix in args.only):
+                    continue
+                timing = time_function(fn, args.repeat)
+                results["benchmarks"][name] = {"params": params, **timing}
+                print(f"[info] {name}: min {timing['min']*1000:.2f} ms, mean {timing['mean']*1000:.2f} ms")
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"[info] benchmark results written to {args.output}")
+
+    if regressions:
+        print(f"[info] {len(regressions)} benchmark(s) slower than the baseline: {regressions}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import json
+import random
+import zlib
+from types import SimpleNamespace
+
+import numpy as np
+
+###############################################################################
+#
+# Offline stand-ins used by the benchmarks
+#
+###############################################################################
+
+class HashingEmbeddingModel:
+    """Deterministic character trigram embeddings with the encode/similarity interface of SentenceTransformer."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def encode(self, sentences):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(s) for s in sentences])
+
+    def similarity(self, embeddings1, embeddings2):
+        return np.atleast_2d(embeddings1) @ np.atleast_2d(embeddings2).T
+
+    def _encode_one(self, sentence):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        text = f"  {sentence.lower()}  "
+        for i in range(len(text) - 2):
+            vector[zlib.crc32(text[i:i+3].encode()) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+def random_walk_plan(domain, problem, length: int, rng: random.Random):
+    """Return a valid plan of at most `length` actions, chosen uniformly among the applicable ones at each step."""
+    from planning_eval_framework.plan_evaluator import jl
+
+    state = jl.PDDL.initstate(domain, problem)
+    plan = []
+    for _ in range(length):
+        available = sorted(jl.PDDL.available(domain, state), key=lambda act: str(jl.PDDL.write_pddl(act)))
+        if not available:
+            break
+        act = rng.choice(available)
+        state = jl.PDDL.execute(domain, state, act)
+        plan.append(str(jl.PDDL.write_pddl(act)))
+    return plan
+
+def plan_to_json(plan: list[str]):
+    steps = []
+    for action in plan:
+        symbols = action.strip("()").split()
+        step = {"action": symbols[0]}
+        for i, arg in enumerate(symbols[1:]):
+            step[f"arg{i}"] = arg
+        steps.append(step)
+    return json.dumps({"steps": steps})
+
+class StubPlanner:
+    """Planner with the llm_planners interface that answers with pre-generated plans instead of calling an LLM."""
+
+    def __init__(self, plans: list[list[str]]):
+        self.plans = plans
+        self.calls = 0
+
+    def set_context(self, context, domain_name, task_name):
+        pass
+
+    def set_response_model_generator(self, name):
+        pass
+
+    def run_planner(self, init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl):
+        plan = self.plans[self.calls % len(self.plans)]
+        self.calls += 1
+        return SimpleNamespace(plan_json=None, task_pddl=None, plan_pddl="\n".join(plan))
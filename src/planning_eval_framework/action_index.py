@@ -0,0 +1,106 @@
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+from . import shared_arrays
+from .config import SHARE_ACTION_INDEXES
+from .grounding import GroundTask, try_ground
+from .profiling import profiler
+
+class GroundedActionIndex:
+    """All ground actions of a problem with their texts and embeddings, computed once.
+
+    Applicability of every action in a state is a single mask over the precondition
+    matrices of the GroundTask, and the similarity of a plan step to the applicable actions
+    is a single masked product against the precomputed action embeddings.
+
+    With a shared_key, the texts and the embeddings are read-only arrays shared by all the
+    processes of the host (see shared_arrays.py); embeddings are only shared for models
+    with a cache_key, which identifies the embeddings they compute. The texts normalized for
+    lexical matching are only computed per process, on first use."""
+
+    def __init__(self, task: GroundTask, embedding_model, shared_key=None):
+        self.task = task
+        self.embedding_model = embedding_model
+        self.shared_key = shared_key
+        if shared_key is not None:
+            self.texts = shared_arrays.get_or_publish(f"{shared_key}-texts", lambda: np.array(self._action_texts(), dtype=str))
+        else:
+            self.texts = self._action_texts()
+        self._embeddings = None
+
+    def _action_texts(self):
+        # same text as PlanMatcher._action_text, e.g. "pick guitar bedroom"
+        return [" ".join((name,) + tuple(args)) for name, args in zip(self.task.action_names, self.task.action_args)]
+
+    @property
+    def embeddings(self):
+        # encoded on first use, since lexical matching often makes them unnecessary
+        if self._embeddings is None:
+            model_key = getattr(self.embedding_model, "cache_key", None)
+            if self.shared_key is not None and model_key is not None:
+                self.set_embeddings(shared_arrays.get_or_publish(shared_arrays.array_key(self.shared_key, model_key), self._encode))
+            else:
+                self.set_embeddings(self._encode())
+        return self._embeddings
+
+    def _encode(self):
+        with profiler.span("embedding_encode"):
+            embeddings = _normalize_rows(np.asarray(self.embedding_model.encode([str(text) for text in self.texts]), dtype=np.float32))
+        profiler.count("embedding_encodes", len(self.texts))
+        return embeddings
+
+    def set_embeddings(self, embeddings):
+        self._embeddings = embeddings
+
+    @cached_property
+    def normalized_texts(self):
+        return [normalize_symbols(str(text)) for text in self.texts]
+
+    @cached_property
+    def exact_actions(self):
+        """Actions by normalized text, in index order."""
+        actions = {}
+        for a, text in enumerate(self.normalized_texts):
+            actions.setdefault(text, []).append(a)
+        return actions
+
+    def exact_match(self, normalized_text, actions):
+        """Position in actions, e.g. the sorted applicable ones, of the first of them whose
+        normalized text is normalized_text, or None."""
+        for a in self.exact_actions.get(normalized_text, ()):
+            i = int(np.searchsorted(actions, a))
+            if i < len(actions) and actions[i] == a:
+                return i
+        return None
+
+    def applicable(self, state):
+        return np.flatnonzero(self.task.applicable(state))
+
+    def similarities(self, text, actions):
+        """Cosine similarity of text to each of the given actions."""
+        with profiler.span("embedding_encode"):
+            query = _normalize_rows(np.asarray(self.embedding_model.encode([text]), dtype=np.float32))[0]
+        profiler.count("embedding_encodes")
+        return self.embeddings[actions] @ query
+
+def normalize_symbols(text):
+    """Text compared by lexical matching, ignoring case, parentheses and "_" vs "-"."""
+    return " ".join(text.lower().replace("(", " ").replace(")", " ").replace("_", "-").split())
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+@lru_cache(maxsize=32)
+def _action_index(domain_pddl, problem_pddl, embedding_model):
+    task = try_ground(domain_pddl, problem_pddl)
+    if task is None:
+        return None
+    shared_key = shared_arrays.array_key(domain_pddl, problem_pddl) if SHARE_ACTION_INDEXES else None
+    return GroundedActionIndex(task, embedding_model, shared_key)
+
+def get_action_index(domain_pddl, problem_pddl, embedding_model):
+    """Cached action index of the problem, or None when the domain cannot be grounded in Python."""
+    return _action_index(domain_pddl, problem_pddl, embedding_model)
@@ -1,14 +1,27 @@
 import juliacall
 import argparse
+import json
 import os
+import re
+import signal
+import subprocess
+import sys
 from collections import namedtuple
 
-from .config import DEFAULT_PYD_GENERATORS, DEFAULT_PLAN_MATCHER
+from .config import DEFAULT_PYD_GENERATORS, DEFAULT_PLAN_MATCHER, DEFAULT_EVALUATOR_BACKEND, LLM_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES, EVALUATION_CHUNK_SIZE, DEFAULT_BATCH_SERVICE, BATCH_POLL_INTERVAL, PIPELINE_QUEUE_SIZE, PIPELINE_PERTURBATION_WORKERS, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS, WORKER_MAX_UNITS, WORKER_MAX_RSS_MB, WORKER_MEMORY_CHECK_INTERVAL, METRICS_PORT, EVALUATION_MEMO_FILE, LEXICAL_MATCHING, TRAJECTORY_MODE, DEFAULT_EMBEDDING_BACKEND, EMBEDDING_THREADS, ADAPTIVE_ROUND_SIZE, ADAPTIVE_TARGET_INTERVAL_WIDTH, ADAPTIVE_MAX_PERTURBATIONS
 from .domains import available_domains
 from .experiment_runner import ExperimentRunner
 from .text_transformations import available_textattack_perturbations
-from llm_planners.planners import available_planners
-from .plan_evaluator import available_plan_matchers
+from .planners import available_planners
+from .plan_evaluator import available_plan_matchers, available_evaluator_backends, configure_plan_matching, configure_plan_evaluation
+from .profiling import profiler
+from .metrics import metrics
+from .batch import available_batch_services, write_jsonl
+from .stub_planner import configure_stub_planners
+from .embeddings import available_embedding_backends, configure_embedding_backend
+from .evaluation_memo import configure_evaluation_memo
+from .work_queue import WorkQueue, LeaseKeeper, allocate_run, default_worker_id
+from .worker_lifecycle import WorkerLifecycle, RECYCLE_EXIT_CODE, supervise_workers
 from llm_planners.pydantic_generator import available_pydantic_generators
 
 PlannerPydModelTuple = namedtuple("PlannerPydModelTuple", ["planner", "pyd_gen"])
@@ -64,15 +77,59 @@ def range_or_single_value_pct(values):
         except ValueError:
             raise argparse.ArgumentTypeError(f"Invalid float value: {values}. Expected a single float value.")
 
+def probability(value):
+    fvalue = float(value)
+    if not (0 <= fvalue <= 1):
+        raise argparse.ArgumentTypeError(f"Invalid value: {value}. It must be between 0 and 1.")
+    return fvalue
+
 def create_common_args():
     common_args = argparse.ArgumentParser(add_help=False)
     common_group = common_args.add_argument_group('common arguments')
     common_group.add_argument('--domain', type=str, choices=available_domains.keys())
     common_group.add_argument('--plan-matcher', type=str, choices=available_plan_matchers.keys(), default=DEFAULT_PLAN_MATCHER)
+    common_group.add_argument('--lexical-matching', action='store_true', default=LEXICAL_MATCHING,
+                              help='Match plan steps lexically first and only use embeddings to break ties (not comparable with embedding-only runs).')
+    common_group.add_argument('--evaluator-backend', type=str, choices=["auto", *available_evaluator_backends.keys()], default=DEFAULT_EVALUATOR_BACKEND,
+                              help='Plan simulation backend. "auto" uses numpy for STRIPS domains and julia otherwise.')
+    common_group.add_argument('--trajectory-mode', type=str, choices=["full", "compact"], default=TRAJECTORY_MODE,
+                              help='"compact" only keeps the initial and final states of simulated plans and rebuilds the others when the constraints are checked.')
+    common_group.add_argument('--evaluation-memo-file', type=str, default=EVALUATION_MEMO_FILE,
+                              help='SQLite file in which evaluations of closest plans are memoized across processes and runs (default: in memory only).')
+    common_group.add_argument('--no-evaluation-memo', action='store_true', help='Evaluate every closest plan, also duplicate ones.')
+    common_group.add_argument('--embedding-backend', type=str, choices=available_embedding_backends.keys(), default=DEFAULT_EMBEDDING_BACKEND,
+                              help='Embedding model backend of the plan matchers. "onnx_int8" runs an int8 quantized ONNX export of the model (requires onnxruntime).')
+    common_group.add_argument('--embedding-threads', type=positive_int, default=EMBEDDING_THREADS, help='Threads used to compute embeddings (default: library default).')
     # common_group.add_argument('--time-limit', type=int, default=200)
     common_group.add_argument('--task', type=positive_int, )
+    common_group.add_argument('--tasks-dir', type=str, default=None,
+                              help='Directory of additional problems of the domain, e.g. generated ones, numbered after its own tasks.')
     common_group.add_argument('--run', type=int, default=-1)
     common_group.add_argument('--method', type=method_tuple, nargs="+", help=method_tuple_help_text)
+    common_group.add_argument('--profile-trace', action='store_true', help='Also export the run profile as a Chrome trace (profile_trace.json in the run directory).')
+    common_group.add_argument('--metrics-port', type=positive_int, default=METRICS_PORT, help='Serve live metrics in the Prometheus text format on this local port.')
+    common_group.add_argument('--seed', type=int, default=None)
+
+    engine_group = common_args.add_argument_group('LLM request arguments')
+    engine_group.add_argument('--llm-concurrency', type=positive_int, default=LLM_CONCURRENCY, help='Maximum number of planner requests in flight in robustness experiments.')
+    engine_group.add_argument('--llm-rpm', type=positive_int, default=LLM_REQUESTS_PER_MINUTE, help='Maximum planner requests per minute (default: unlimited).')
+    engine_group.add_argument('--llm-tpm', type=positive_int, default=LLM_TOKENS_PER_MINUTE, help='Maximum LLM tokens per minute (default: unlimited).')
+    engine_group.add_argument('--llm-max-retries', type=int, default=LLM_MAX_RETRIES, help='Retries of requests failing with a 429 or 5xx error.')
+    engine_group.add_argument('--evaluation-chunk-size', type=positive_int, default=EVALUATION_CHUNK_SIZE,
+                              help='Perturbed tasks planned concurrently, then matched, evaluated and written, before the next ones.')
+    engine_group.add_argument('--batch', action='store_true',
+                              help='Write all the planner requests to a batch file and submit it to the batch service instead of calling the planners. Collect the results with the batch-collect command.')
+    engine_group.add_argument('--batch-service', type=str, choices=available_batch_services.keys(), default=DEFAULT_BATCH_SERVICE)
+    engine_group.add_argument('--enqueue', action='store_true',
+                              help='Write the work units of the sweep to the work queue of the run instead of running them. Run them with any number of worker commands.')
+
+    stub_group = common_args.add_argument_group('stub planner arguments')
+    stub_group.add_argument('--stub-latency', type=float, default=0.0, help='Seconds the stub planners wait before answering.')
+    stub_group.add_argument('--stub-latency-jitter', type=float, default=0.0, help='Maximum random extra latency in seconds.')
+    stub_group.add_argument('--stub-error-rate', type=probability, default=0.0, help='Probability that a stub planner returns no plan.')
+    stub_group.add_argument('--stub-rate-limit-rate', type=probability, default=0.0, help='Probability that a stub planner call fails with a retryable 429 error.')
+    stub_group.add_argument('--stub-corruption-rate', type=probability, default=0.3, help='Corruption rate of the stub_corrupted planner.')
+    stub_group.add_argument('--stub-replay-dir', type=str, default=None, help='plans/<planner>/<domain> directory replayed by the stub_replay planner.')
     return common_args
 
 def create_parser():
@@ -96,8 +153,49 @@ def create_parser():
     robustness_parser.add_argument('--perturbation-targets', type=str, choices=['init', 'goal', 'constraints'], nargs='+',
         help='Parts of the natural language problem description that will be perturbed. Acceptable values are "init", "goal", and "constraints".',
         default=['init', 'goal', 'constraints'])
+    robustness_parser.add_argument('--adaptive', action='store_true',
+        help='Produce and evaluate perturbations in rounds until the confidence intervals of the successful and safe rates are narrow enough, instead of a fixed --perturbations-number.')
+    robustness_parser.add_argument('--perturbation-round-size', type=positive_int, default=ADAPTIVE_ROUND_SIZE, help='Perturbations produced per round with --adaptive.')
+    robustness_parser.add_argument('--target-interval-width', type=probability, default=ADAPTIVE_TARGET_INTERVAL_WIDTH,
+        help='Width of the 95%% Wilson score intervals at which --adaptive stops.')
+    robustness_parser.add_argument('--max-perturbations', type=positive_int, default=ADAPTIVE_MAX_PERTURBATIONS, help='Maximum number of perturbations per problem with --adaptive.')
+    robustness_parser.add_argument('--pipeline', action='store_true',
+        help='Run all the swap percentages and methods as one streaming pipeline, which matches and evaluates plans while later planner requests are in flight.')
+    robustness_parser.add_argument('--perturbation-workers', type=positive_int, default=PIPELINE_PERTURBATION_WORKERS, help='Threads producing perturbations with --pipeline.')
+    robustness_parser.add_argument('--pipeline-queue-size', type=positive_int, default=PIPELINE_QUEUE_SIZE, help='Maximum number of items waiting between two pipeline stages.')
 
 
+    # Collect the results of a batch submitted with --batch
+    collect_parser = subparsers.add_parser('batch-collect',
+                                           help='Ingest and evaluate the results of a submitted batch')
+    collect_parser.add_argument('--run', type=int, required=True, help='Run in which the batch was submitted.')
+    collect_parser.add_argument('--wait', action='store_true', help='Wait for the batch to complete instead of only reporting its status.')
+    collect_parser.add_argument('--poll-interval', type=float, default=BATCH_POLL_INTERVAL, help='Seconds between status checks with --wait.')
+
+    # Run the work units of a sweep enqueued with --enqueue
+    worker_parser = subparsers.add_parser('worker',
+                                          help='Run work units of an enqueued sweep until its work queue is drained')
+    worker_parser.add_argument('--run', type=int, required=True, help='Run in which the sweep was enqueued.')
+    worker_parser.add_argument('--worker-id', type=str, default=None, help='Name of the worker in the work queue (default: host:pid).')
+    worker_parser.add_argument('--lease-seconds', type=positive_int, default=WORK_QUEUE_LEASE_SECONDS, help='Lease of a claimed unit, renewed while the unit runs.')
+    worker_parser.add_argument('--max-attempts', type=positive_int, default=WORK_QUEUE_MAX_ATTEMPTS, help='Attempts of a failing unit before it is given up.')
+    worker_parser.add_argument('--max-units', type=positive_int, default=WORKER_MAX_UNITS, help='Units after which the worker process is recycled.')
+    worker_parser.add_argument('--max-rss-mb', type=positive_int, default=WORKER_MAX_RSS_MB,
+        help='Resident memory in MB above which the worker process is recycled, giving its current unit back to the queue.')
+    worker_parser.add_argument('--memory-check-interval', type=float, default=WORKER_MEMORY_CHECK_INTERVAL, help='Seconds between memory checks while a unit runs.')
+    worker_parser.add_argument('--metrics-port', type=positive_int, default=METRICS_PORT,
+        help='Serve live metrics in the Prometheus text format on this local port (the i-th of --processes uses port + i).')
+    worker_parser.add_argument('--processes', type=positive_int, default=None,
+        help='Run this many worker processes and start recycled ones again until the queue is drained.')
+
+    # Match and evaluate the stored plans of a run again, without planning
+    replay_parser = subparsers.add_parser('replay',
+                                          help='Match and evaluate the stored plans of a run again, e.g. with another plan matcher or evaluator backend',
+                                          parents=[common_args])
+    replay_parser.add_argument('--name', type=str, default=None,
+        help='Evaluations are written to evaluation_<name> directories next to the original ones (default: <plan matcher>_<evaluator backend>).')
+    replay_parser.add_argument('--processes', type=positive_int, default=1, help='Processes sharing the stored plans.')
+    replay_parser.add_argument('--shard', type=int, default=None, help=argparse.SUPPRESS)
     return parser
 
 def save_args_to_file(args, filename):
@@ -109,54 +207,304 @@ def save_args_to_file(args, filename):
         for key, value in args_dict.items():
             f.write(f"{key}: {value}\n")
 
-def find_next_missing_run(directory):
-    # List all items in the directory
-    items = os.listdir(directory)
-    
-    # Filter out directories that start with 'run' and extract the numbers
-    run_numbers = []
-    for item in items:
-        if item.startswith('run') and item[3:].isdigit():
-            run_numbers.append(int(item[3:]))
-    
-    # Find the next missing number
-    if run_numbers:
-        next_run = max(run_numbers) + 1
+def submit_batch(args, batch_requests):
+    requests_file = f"./experiments/run{args.run}/batch_requests.jsonl"
+    write_jsonl(requests_file, batch_requests)
+    batch_service = available_batch_services[args.batch_service]()
+    stub_settings = {key: value for key, value in vars(args).items() if key.startswith("stub_") or key == "seed"}
+    batch_id = batch_service.submit(requests_file, stub_settings)
+
+    # everything needed to ingest and evaluate the results later on
+    with open(f"./experiments/run{args.run}/batch.json", "w") as f:
+        json.dump({"service": args.batch_service, "batch_id": batch_id, "args": vars(args)}, f, indent=4)
+    print(f"[info] {len(batch_requests)} planner requests submitted as {batch_id}, collect them with 'planning-eval batch-collect --run {args.run}'")
+
+def collect_batch(args):
+    with open(f"./experiments/run{args.run}/batch.json", "r") as f:
+        submitted = json.load(f)
+    batch_service = available_batch_services[submitted["service"]]()
+    batch_id = submitted["batch_id"]
+
+    if args.wait:
+        status = batch_service.wait(batch_id, args.poll_interval)
     else:
-        next_run = 0  # If no 'run' directories exist, start with 0
-    
-    return next_run
+        status = batch_service.status(batch_id)
+    print(f"[info] batch {batch_id} is {status['status']}")
+    if status["status"] == "failed":
+        raise RuntimeError(f"Batch {batch_id} failed: {status.get('error')}")
+    elif status["status"] != "completed":
+        return
+    results = {row["custom_id"]: row for row in batch_service.results(batch_id)}
+
+    # the experiments are set up again as they were when the batch was submitted
+    experiment_args = argparse.Namespace(**submitted["args"])
+    experiment_args.method = [PlannerPydModelTuple(*method) for method in experiment_args.method]
+    configure_embedding_backend(experiment_args)
+    configure_plan_matching(experiment_args)
+    configure_plan_evaluation(experiment_args)
+    configure_evaluation_memo(experiment_args)
+    domain = load_domain(experiment_args)
+    exp_runner = ExperimentRunner(experiment_args, domain)
+    pcts = experiment_args.pct_words_to_swap if experiment_args.command == "robustness-experiment" else [None]
+    for pct in pcts:
+        for (planner_name, pyd_generator) in experiment_args.method:
+            exp_runner.set_experiment(planner_name, pyd_generator, experiment_args.plan_matcher, pct)
+            exp_runner.ingest_batch_results(results)
+
+    profiler.write_report(f"./experiments/run{args.run}/profile.json")
+
+def load_domain(args):
+    domain = available_domains[args.domain]
+    tasks_dir = getattr(args, "tasks_dir", None)
+    if tasks_dir is not None and not any(task.directory == tasks_dir for task in domain.tasks):
+        domain.register_tasks(tasks_dir)
+    return domain
+
+def work_queue_file(run):
+    return f"./experiments/run{run}/work_queue.sqlite"
+
+def enqueue_sweep(args, work_units):
+    # workers set the experiments up again from the arguments of the sweep
+    with open(f"./experiments/run{args.run}/sweep.json", "w") as f:
+        json.dump({"args": vars(args)}, f, indent=4)
+    added = WorkQueue(work_queue_file(args.run)).enqueue(work_units)
+    print(f"[info] {added} work units enqueued in {work_queue_file(args.run)}, run them with 'planning-eval worker --run {args.run}'")
+
+def worker_command(args, i):
+    command = [sys.executable, "-c", "from planning_eval_framework.app import main; main()", "worker", "--run", str(args.run),
+               "--lease-seconds", str(args.lease_seconds), "--max-attempts", str(args.max_attempts),
+               "--memory-check-interval", str(args.memory_check_interval)]
+    if args.worker_id is not None:
+        command += ["--worker-id", f"{args.worker_id}-{i}"]
+    if args.max_units is not None:
+        command += ["--max-units", str(args.max_units)]
+    if args.max_rss_mb is not None:
+        command += ["--max-rss-mb", str(args.max_rss_mb)]
+    if args.metrics_port is not None:
+        command += ["--metrics-port", str(args.metrics_port + i)]
+    return command
+
+def _stop_worker(signum, frame):
+    raise SystemExit(128 + signum)
+
+def run_worker(args):
+    if args.processes is not None:
+        work_queue = WorkQueue(work_queue_file(args.run), args.lease_seconds, args.max_attempts)
+        supervise_workers(lambda i: worker_command(args, i), args.processes, work_queue.is_drained)
+        return
+
+    with open(f"./experiments/run{args.run}/sweep.json", "r") as f:
+        sweep = json.load(f)
+    experiment_args = argparse.Namespace(**sweep["args"])
+    experiment_args.method = [PlannerPydModelTuple(*method) for method in experiment_args.method]
+    configure_stub_planners(experiment_args)
+    configure_embedding_backend(experiment_args)
+    configure_plan_matching(experiment_args)
+    configure_plan_evaluation(experiment_args)
+    configure_evaluation_memo(experiment_args)
+    domain = load_domain(experiment_args)
+    exp_runner = ExperimentRunner(experiment_args, domain)
+    exp_runner.warm_up()
+
+    worker_id = args.worker_id or default_worker_id()
+    work_queue = WorkQueue(work_queue_file(args.run), args.lease_seconds, args.max_attempts)
+    lifecycle = WorkerLifecycle(args.max_units, args.max_rss_mb, args.memory_check_interval)
+    if lifecycle.over_memory_ceiling():
+        raise RuntimeError(f"Worker {worker_id} already exceeds {args.max_rss_mb} MB after its warm-up, raise --max-rss-mb")
+
+    def queue_progress():
+        counts = work_queue.counts()
+        return counts.get("done", 0) + counts.get("failed", 0), counts.get("pending", 0) + counts.get("leased", 0)
+    metrics.set_progress_source(queue_progress)
+    metrics.start(f"./experiments/run{args.run}/status/{worker_id.replace('/', '_')}.json", args.metrics_port)
+    # stopped workers give their unit back to the queue
+    signal.signal(signal.SIGTERM, _stop_worker)
+
+    def over_memory_ceiling(unit):
+        print(f"[error] worker {worker_id} exceeded {args.max_rss_mb} MB while running work unit {unit.key}, recycling it")
+        work_queue.fail(unit, worker_id, f"worker exceeded {args.max_rss_mb} MB")
+        metrics.stop("recycled")
+        os._exit(RECYCLE_EXIT_CODE)
+
+    done = 0
+    recycle_reason = None
+    while recycle_reason is None:
+        unit = work_queue.claim(worker_id)
+        if unit is None:
+            break
+        print(f"[info] worker {worker_id} runs work unit {unit.key} (attempt {unit.attempts})")
+        try:
+            with LeaseKeeper(work_queue, unit, worker_id), lifecycle.watch(lambda: over_memory_ceiling(unit)):
+                exp_runner.run_work_unit(unit.payload)
+        except (KeyboardInterrupt, SystemExit):
+            print(f"[info] worker {worker_id} stopped, work unit {unit.key} is given back to the queue")
+            work_queue.release(unit, worker_id)
+            raise
+        except Exception as e:
+            print(f"[error] work unit {unit.key} failed: {type(e).__name__}: {e}")
+            profiler.count("work_unit_errors")
+            work_queue.fail(unit, worker_id, f"{type(e).__name__}: {e}")
+        else:
+            work_queue.complete(unit, worker_id)
+            done += 1
+        recycle_reason = lifecycle.unit_done()
+    print(f"[info] worker {worker_id} ran {done} work units, queue: {work_queue.counts()}")
+
+    # units leased by other workers may still be running, in which case the last of them summarizes
+    drained = work_queue.is_drained()
+    if drained:
+        exp_runner.summarize_work_units(work_queue.payloads())
+    os.makedirs(f"./experiments/run{args.run}/profiles", exist_ok=True)
+    profiler.write_report(f"./experiments/run{args.run}/profiles/{worker_id.replace('/', '_')}.json")
+    if recycle_reason is not None and not drained:
+        print(f"[info] worker {worker_id} {recycle_reason}, recycling it")
+        metrics.stop("recycled")
+        sys.exit(RECYCLE_EXIT_CODE)
+    metrics.stop()
+
+def _run_cli_args(run):
+    # the domain and tasks of a run are read back from its logged cli arguments
+    cli_args = {}
+    with open(f"./experiments/run{run}/cli_args", "r") as f:
+        for line in f:
+            key, _, value = line.rstrip("\n").partition(": ")
+            cli_args[key] = value
+    return cli_args
+
+def _run_pyd_generators(cli_args):
+    """Response model generators of the planners of a run, from its logged methods."""
+    return dict(re.findall(r"planner='([^']*)', pyd_gen='([^']*)'", cli_args.get("method", "")))
+
+def run_replay(args):
+    cli_args = _run_cli_args(args.run)
+    if args.domain is None:
+        args.domain = cli_args["domain"]
+    if args.tasks_dir is None and cli_args.get("tasks_dir", "None") != "None":
+        args.tasks_dir = cli_args["tasks_dir"]
+    configure_embedding_backend(args)
+    configure_plan_matching(args)
+    configure_plan_evaluation(args)
+    configure_evaluation_memo(args)
+    domain = load_domain(args)
+    exp_runner = ExperimentRunner(args, domain)
+    namespace = args.name or f"{args.plan_matcher}_{args.evaluator_backend}"
+    experiments = exp_runner.replay_experiments(namespace, _run_pyd_generators(cli_args))
+
+    if args.processes > 1 and args.shard is None:
+        # Julia does not survive a fork, so every shard runs in a fresh process
+        command = [sys.executable, "-c", "from planning_eval_framework.app import main; main()", *sys.argv[1:]]
+        shards = [subprocess.Popen([*command, "--shard", str(i)]) for i in range(args.processes)]
+        failed = [i for i, shard in enumerate(shards) if shard.wait() != 0]
+        if failed:
+            raise RuntimeError(f"Replay shards {failed} failed")
+    else:
+        shard = args.shard or 0
+        for experiment, task_names in experiments:
+            print(f"[info] replaying {len(task_names[shard::args.processes])} plans of {experiment.plan_dir} into {experiment.evaluation_dir}")
+            experiment.replay_plans(task_names[shard::args.processes])
+        profile_suffix = f"_{shard}" if args.shard is not None else ""
+        profiler.write_report(f"./experiments/run{args.run}/profile_replay_{namespace}{profile_suffix}.json")
+        if args.shard is not None:
+            return
+
+    for experiment, _ in experiments:
+        experiment._summarize_results()
 
 def main():
 
     parser = create_parser()
     args = parser.parse_args()
+    if getattr(args, "adaptive", False) and (args.pipeline or args.batch or args.enqueue):
+        parser.error("--adaptive cannot be combined with --pipeline, --batch or --enqueue")
+
+    if args.command == "batch-collect":
+        collect_batch(args)
+        return
+    elif args.command == "worker":
+        run_worker(args)
+        return
+    elif args.command == "replay":
+        if args.run == -1:
+            parser.error("replay requires the --run of the stored plans")
+        run_replay(args)
+        return
     
-    # if run number is not set, compute next one
+    # if run number is not set, allocate the next one
     if args.run == -1:
-        args.run = find_next_missing_run("./experiments")
+        args.run = allocate_run("./experiments")
+    else:
+        os.makedirs(f"./experiments/run{args.run}")
 
     # log cli arguments
     args_filepath = f"./experiments/run{args.run}/cli_args"
-    os.makedirs(os.path.dirname(args_filepath))
     save_args_to_file(args, args_filepath)
 
+    if args.profile_trace:
+        profiler.enable_trace()
+
+    configure_stub_planners(args)
+    configure_embedding_backend(args)
+    configure_plan_matching(args)
+    configure_plan_evaluation(args)
+    configure_evaluation_memo(args)
+
     # initialize problem domain
-    domain = available_domains[args.domain]
+    domain = load_domain(args)
     
     # initialize experiment runner
     exp_runner = ExperimentRunner(args, domain)
 
+    # progress of the run, in results written, is reported in status.json while it runs
+    if not (args.batch or args.enqueue):
+        if args.command == "robustness-experiment":
+            perturbations_number = args.max_perturbations if args.adaptive else args.perturbations_number
+            metrics.set_expected_units(len(args.pct_words_to_swap) * len(args.method) * perturbations_number)
+        else:
+            metrics.set_expected_units(len(args.method))
+        metrics.start(f"./experiments/run{args.run}/status.json", args.metrics_port)
+
+    # with --batch the planner requests of every experiment are collected and submitted together,
+    # and with --enqueue their work units are added to the work queue of the run
+    batch_requests = []
+    work_units = {}
+
     # Robustness experiment
-    if args.command == "robustness-experiment":
+    if args.command == "robustness-experiment" and args.pipeline and not (args.batch or args.enqueue):
+        exp_runner.run_pipeline(args.pct_words_to_swap, args.method)
+    elif args.command == "robustness-experiment" and args.adaptive:
+        for pct in args.pct_words_to_swap:
+            exp_runner.run_adaptive_experiments(pct, args.method)
+    elif args.command == "robustness-experiment":
         for pct in args.pct_words_to_swap:
             exp_runner.produce_perturbations(args.perturbation_recipe, pct, args.perturbations_number, args.perturbation_targets, args.jailbreak_text)
             # execute the llm planner
             for (planner_name, pyd_generator) in args.method:
                 exp_runner.set_experiment(planner_name, pyd_generator, args.plan_matcher, pct)
-                exp_runner.run_experiment()
+                if args.batch:
+                    batch_requests.extend(exp_runner.batch_requests())
+                elif args.enqueue:
+                    work_units.update(exp_runner.work_units())
+                else:
+                    exp_runner.run_experiment()
     else:
         # Non robustness experiment
         for (planner_name, pyd_generator) in args.method:
             exp_runner.set_experiment(planner_name, pyd_generator, args.plan_matcher)
-            exp_runner.run_experiment()
+            if args.batch:
+                batch_requests.extend(exp_runner.batch_requests())
+            elif args.enqueue:
+                work_units.update(exp_runner.work_units())
+            else:
+                exp_runner.run_experiment()
+
+    if args.batch:
+        submit_batch(args, batch_requests)
+    elif args.enqueue:
+        enqueue_sweep(args, work_units)
+    else:
+        metrics.stop()
+
+    profiler.write_report(f"./experiments/run{args.run}/profile.json")
+    if args.profile_trace:
+        profiler.export_chrome_trace(f"./experiments/run{args.run}/profile_trace.json")
+
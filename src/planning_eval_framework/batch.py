@@ -0,0 +1,211 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from types import SimpleNamespace
+
+from .config import BATCH_FINAL_STATUSES, BATCH_POLL_INTERVAL, DEFAULT_OPENAI_BASE_URL
+
+###############################################################################
+#
+# Batch submission of planner requests
+#
+# Instead of calling the planners interactively, all the planner requests of a
+# sweep are written to a JSONL batch file with the layout of provider batch
+# APIs ({"custom_id", "method", "url", "body"} per line, the body being a chat
+# completions request), submitted to a batch service, and their results are
+# ingested once the batch completes. Planners take part in batches by building
+# the chat completions request of a task (batch_request) and by parsing the
+# chat completion answering it (parse_batch_response).
+#
+###############################################################################
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+def make_request(custom_id, planner, init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl):
+    """Batch request of a planner configured for the task (set_context and set_response_model_generator)."""
+    if not hasattr(planner, "batch_request"):
+        raise ValueError(f"Planner {type(planner).__name__} does not build chat completions requests and cannot be run in batches")
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": CHAT_COMPLETIONS_URL,
+        "body": planner.batch_request(init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl)
+    }
+
+def parse_result(planner, row):
+    """Planner result of an output row of a batch, raising a RuntimeError for failed requests."""
+    if row.get("error") is not None:
+        raise RuntimeError(row["error"].get("message", "unknown error"))
+    response = row["response"]
+    if response["status_code"] != 200:
+        raise RuntimeError(f"status {response['status_code']}: {response['body'].get('error', {}).get('message')}")
+    return planner.parse_batch_response(response["body"])
+
+def write_jsonl(file_name, rows):
+    tmp_file_name = f"{file_name}.tmp"
+    with open(tmp_file_name, "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    os.replace(tmp_file_name, file_name)
+
+def read_jsonl(file_name):
+    with open(file_name, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+class OpenAIBatchService:
+    """OpenAI Batch API: the requests file is uploaded, run as a batch of chat completions
+    within 24 hours, and the output and error files are downloaded once it completes."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI()
+        self.client = client
+
+    def submit(self, requests_file, stub_settings=None):
+        with open(requests_file, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        submitted = self.client.batches.create(input_file_id=input_file.id, endpoint=CHAT_COMPLETIONS_URL,
+                                               completion_window="24h")
+        return submitted.id
+
+    def status(self, batch_id):
+        submitted = self.client.batches.retrieve(batch_id)
+        counts = submitted.request_counts
+        status = {"status": submitted.status}
+        if counts is not None:
+            status.update(total=counts.total, completed=counts.completed, failed=counts.failed)
+        if submitted.errors is not None and submitted.errors.data:
+            status["error"] = "; ".join(error.message for error in submitted.errors.data)
+        return status
+
+    def results(self, batch_id):
+        submitted = self.client.batches.retrieve(batch_id)
+        rows = []
+        for file_id in (submitted.output_file_id, submitted.error_file_id):
+            if file_id is not None:
+                content = self.client.files.content(file_id).text
+                rows.extend(json.loads(line) for line in content.splitlines() if line.strip())
+        return rows
+
+    def wait(self, batch_id, poll_interval=BATCH_POLL_INTERVAL):
+        return _wait(self, batch_id, poll_interval)
+
+class LocalBatchService:
+    """Stand-in for a provider batch API. Each batch is a directory holding the input file,
+    the output file and a status file, processed by a detached subprocess that sends the
+    chat completions requests to the API at OPENAI_BASE_URL one by one (through the request
+    engine), so that submitting, polling and ingesting can be tested end to end offline.
+    Requests to the models of the stub planners are answered by the stub planners, configured
+    with stub_settings, the stub planner arguments of the submitting run."""
+
+    def __init__(self, root="./experiments/batches"):
+        self.root = root
+
+    def submit(self, requests_file, stub_settings=None):
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        batch_dir = os.path.join(self.root, batch_id)
+        os.makedirs(batch_dir)
+        write_jsonl(os.path.join(batch_dir, "input.jsonl"), read_jsonl(requests_file))
+        if stub_settings is not None:
+            with open(os.path.join(batch_dir, "stub_settings.json"), "w") as f:
+                json.dump(stub_settings, f)
+        _write_status(batch_dir, "validating")
+        with open(os.path.join(batch_dir, "worker.log"), "w") as log:
+            subprocess.Popen([sys.executable, "-m", "planning_eval_framework.batch", batch_dir],
+                             stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        return batch_id
+
+    def status(self, batch_id):
+        with open(os.path.join(self.root, batch_id, "status.json"), "r") as f:
+            return json.load(f)
+
+    def results(self, batch_id):
+        return read_jsonl(os.path.join(self.root, batch_id, "output.jsonl"))
+
+    def wait(self, batch_id, poll_interval=BATCH_POLL_INTERVAL):
+        return _wait(self, batch_id, poll_interval)
+
+available_batch_services = {
+    "local": LocalBatchService,
+    "openai": OpenAIBatchService
+}
+
+def _wait(batch_service, batch_id, poll_interval):
+    while True:
+        status = batch_service.status(batch_id)
+        if status["status"] in BATCH_FINAL_STATUSES:
+            return status
+        time.sleep(poll_interval)
+
+def _write_status(batch_dir, status, **counts):
+    tmp_file_name = os.path.join(batch_dir, "status.json.tmp")
+    with open(tmp_file_name, "w") as f:
+        json.dump({"status": status, **counts}, f)
+    os.replace(tmp_file_name, os.path.join(batch_dir, "status.json"))
+
+def chat_completions_request(body):
+    """Send a chat completions request to the API at OPENAI_BASE_URL."""
+    base_url = os.environ.get("OPENAI_BASE_URL", DEFAULT_OPENAI_BASE_URL).rstrip("/")
+    headers = {"Content-Type": "application/json"}
+    if "OPENAI_API_KEY" in os.environ:
+        headers["Authorization"] = f"Bearer {os.environ['OPENAI_API_KEY']}"
+    http_request = urllib.request.Request(f"{base_url}/chat/completions", data=json.dumps(body).encode(), headers=headers)
+    with urllib.request.urlopen(http_request, timeout=600) as response:
+        return json.loads(response.read())
+
+def process_batch(batch_dir):
+    """Run the chat completions requests of a local batch and write their results."""
+    from .request_engine import RequestEngine
+    from .stub_planner import available_stub_planners, configure_stub_planners
+
+    stub_settings_file = os.path.join(batch_dir, "stub_settings.json")
+    if os.path.exists(stub_settings_file):
+        with open(stub_settings_file, "r") as f:
+            configure_stub_planners(SimpleNamespace(**json.load(f)))
+
+    requests = read_jsonl(os.path.join(batch_dir, "input.jsonl"))
+    _write_status(batch_dir, "in_progress", total=len(requests))
+
+    def run_request(request):
+        if request["url"] != CHAT_COMPLETIONS_URL:
+            raise ValueError(f"Unsupported batch endpoint {request['url']}")
+        body = request["body"]
+        if body["model"] in available_stub_planners:
+            return available_stub_planners[body["model"]].complete(body)
+        return chat_completions_request(body)
+
+    in_thread = all(getattr(available_stub_planners.get(r["body"]["model"]), "thread_safe", True) for r in requests)
+    results = RequestEngine().map(run_request, requests, in_thread=in_thread)
+
+    rows = []
+    for request, result in zip(requests, results):
+        row = {"id": f"batch_req_{uuid.uuid4().hex[:16]}", "custom_id": request["custom_id"]}
+        if isinstance(result, Exception):
+            rows.append({**row, "response": None, "error": {"message": f"{type(result).__name__}: {result}"}})
+        else:
+            rows.append({**row, "response": {"status_code": 200, "body": result}, "error": None})
+    write_jsonl(os.path.join(batch_dir, "output.jsonl"), rows)
+
+    failed = sum(row["error"] is not None for row in rows)
+    _write_status(batch_dir, "completed", total=len(rows), completed=len(rows) - failed, failed=failed)
+
+def main():
+    batch_dir = sys.argv[1]
+    # the ground truth and corrupted stub planners solve the tasks with Julia, which has to
+    # be initialized before torch is imported
+    models = {request["body"]["model"] for request in read_jsonl(os.path.join(batch_dir, "input.jsonl"))}
+    if models & {"stub_ground_truth", "stub_corrupted"}:
+        import juliacall
+    try:
+        process_batch(batch_dir)
+    except Exception as e:
+        _write_status(batch_dir, "failed", error=f"{type(e).__name__}: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,128 @@
+import os
+
 DEFAULT_PYD_GENERATORS = {
     "llm_ic_pddl"   : "none",
     "llm_pddl"      : "none",
     "llm"           : "sentence_actions",
     "llm_ic"        : "sentence_actions",
-    "llm_stepbystep": "sentence_actions"
+    "llm_stepbystep": "sentence_actions",
+    "stub_ground_truth": "none",
+    "stub_corrupted": "none",
+    "stub_replay": "none"
 }
 DEFAULT_PLAN_MATCHER = "greedy_action"
+# "numpy" evaluates STRIPS domains without PDDL.jl, "julia" uses PDDL.jl for every domain,
+# and "auto" picks numpy whenever the domain can be grounded as a STRIPS task. Check a
+# domain with tools/check_evaluator_parity.py before evaluating it with numpy or auto.
+DEFAULT_EVALUATOR_BACKEND = "julia"
+# "full" keeps every state of a simulated plan. "compact" keeps the initial state, the
+# executed actions and the final state, and rebuilds intermediate states when a check
+# needs them, TRAJECTORY_CHUNK_SIZE states at a time with the numpy backend.
+TRAJECTORY_MODE = "full"
+TRAJECTORY_CHUNK_SIZE = 1024
 OPENAI_MODEL = "gpt-4o-2024-08-06"
-# OPENAI_MODEL = "gpt-4o-mini-2024-07-18"
\ No newline at end of file
+# OPENAI_MODEL = "gpt-4o-mini-2024-07-18"
+
+# LLM requests of a robustness experiment (see request_engine.py). Requests and tokens
+# per minute are not limited when set to None. Failed requests are retried after
+# min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2^attempt) seconds at most, with full jitter.
+LLM_CONCURRENCY = 16
+LLM_REQUESTS_PER_MINUTE = None
+LLM_TOKENS_PER_MINUTE = None
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE = 1.0
+LLM_BACKOFF_MAX = 60.0
+# Perturbed tasks of a robustness experiment are planned, matched, evaluated and written in
+# chunks of EVALUATION_CHUNK_SIZE tasks, so that an interrupted run keeps the evaluations of
+# its completed chunks. Planner requests run concurrently within a chunk.
+EVALUATION_CHUNK_SIZE = 64
+
+# Streaming pipeline of robustness experiments (see pipeline.py). Each stage hands items
+# to the next one through a queue of at most PIPELINE_QUEUE_SIZE items.
+PIPELINE_QUEUE_SIZE = 64
+PIPELINE_PERTURBATION_WORKERS = 1
+
+# Adaptive perturbation sampling: perturbations are produced and evaluated in rounds until
+# the 95% Wilson score intervals of the successful and safe rates are narrower than the
+# target width, or until the maximum number of perturbations is reached.
+ADAPTIVE_ROUND_SIZE = 5
+ADAPTIVE_TARGET_INTERVAL_WIDTH = 0.2
+ADAPTIVE_MAX_PERTURBATIONS = 50
+
+# Batch submission of planner requests (see batch.py)
+DEFAULT_BATCH_SERVICE = "local"
+BATCH_POLL_INTERVAL = 30
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+# Chat completions API used by the local batch service when OPENAI_BASE_URL is not set
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# Work queue of sweeps run by several workers (see work_queue.py). Leases of claimed units
+# are renewed while they run and expire after WORK_QUEUE_LEASE_SECONDS otherwise. A unit
+# failing WORK_QUEUE_MAX_ATTEMPTS times is given up.
+WORK_QUEUE_LEASE_SECONDS = 600
+WORK_QUEUE_MAX_ATTEMPTS = 3
+
+# Worker processes (see worker_lifecycle.py) are recycled after WORKER_MAX_UNITS units or
+# once their resident memory exceeds WORKER_MAX_RSS_MB (None: no limit), which is checked
+# every WORKER_MEMORY_CHECK_INTERVAL seconds while a unit runs.
+WORKER_MAX_UNITS = None
+WORKER_MAX_RSS_MB = None
+WORKER_MEMORY_CHECK_INTERVAL = 5
+
+# Live metrics of a running sweep (see metrics.py): experiments/runN/status.json is
+# rewritten every METRICS_INTERVAL seconds, the valid/successful/safe rates of each
+# method are computed over its last METRICS_ROLLING_WINDOW results, and a Prometheus
+# text endpoint is served on METRICS_PORT (None: no endpoint).
+METRICS_INTERVAL = 10
+METRICS_ROLLING_WINDOW = 50
+METRICS_PORT = None
+
+# Evaluation server (see server.py). The PLANNING_EVAL_SERVER environment variable
+# overrides the address, and setting it to "off" disables the server lookup.
+EVAL_SERVER_HOST = "127.0.0.1"
+EVAL_SERVER_PORT = 8765
+EVAL_SERVER_QUEUE_SIZE = 256
+EVAL_SERVER_BATCH_SIZE = 16
+
+# Per-sentence outputs of the back_trans and back_transcription recipes are kept in
+# TRANSLATION_CACHE_FILE (see translation_cache.py). The PLANNING_EVAL_TRANSLATION_CACHE
+# environment variable overrides the file, and setting it to "off" disables the cache.
+# The models stop being run for a sentence after TRANSLATION_MAX_IDLE_RUNS runs in a row
+# that give no new output.
+TRANSLATION_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "planning_eval_framework", "translations.sqlite")
+TRANSLATION_MAX_IDLE_RUNS = 3
+
+# Evaluation results are memoized by domain, problem, evaluator backend and normalized
+# plan (see evaluation_memo.py), in memory and, when EVALUATION_MEMO_FILE is set, in a
+# SQLite file shared across runs.
+EVALUATION_MEMO = True
+EVALUATION_MEMO_FILE = None
+
+# Embedding model of the plan matchers (see embeddings.py). "onnx_int8" runs an int8
+# quantized ONNX export of the model, cached in EMBEDDING_CACHE_DIR. Inference uses
+# EMBEDDING_THREADS threads, or the library default when None.
+DEFAULT_EMBEDDING_BACKEND = "sentence_transformers"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_THREADS = None
+EMBEDDING_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "planning_eval_framework", "embeddings")
+EMBEDDING_BATCH_SIZE = 64
+
+# Embeddings and texts of ground actions are published once per host as memory mapped
+# files in SHARED_ARRAYS_DIR (see shared_arrays.py) and shared by all the processes. The
+# least recently used files are removed once they take more than SHARED_ARRAYS_MAX_MB.
+SHARE_ACTION_INDEXES = True
+SHARED_ARRAYS_DIR = "/dev/shm/planning_eval_framework" if os.path.isdir("/dev/shm") else os.path.join(os.path.expanduser("~"), ".cache", "planning_eval_framework", "shared_arrays")
+SHARED_ARRAYS_MAX_MB = 1024
+
+# Number of partial plans kept by the beam_search plan matcher
+BEAM_SEARCH_WIDTH = 5
+
+# With LEXICAL_MATCHING (--lexical-matching), plan matchers first look for exact matches,
+# then rank candidates lexically. A lexical match is accepted when its score reaches the
+# threshold and beats the runner-up by the margin; otherwise embeddings break the tie among
+# the top-k lexical candidates. Without it, every candidate is ranked by embeddings alone,
+# so that results stay comparable with runs made before the lexical tiers existed.
+LEXICAL_MATCHING = False
+LEXICAL_PREFILTER_TOP_K = 10
+LEXICAL_MATCH_THRESHOLD = 0.85
+LEXICAL_MATCH_MARGIN = 0.1
@@ -9,8 +9,10 @@ from .utils import postprocess
 ###############################################################################
 
 class Task:
-    def __init__(self, name: str):
+    def __init__(self, name: str, directory: str = None):
         self.name = name
+        # directory of the task's files, the domain directory by default
+        self.directory = directory
 
     def get_init_filename(self):
         return f"{self.name}.init.nl"
@@ -48,7 +50,22 @@ class Domain:
         self.grab_tasks()
 
     def grab_tasks(self):
-        path = f"./domains/{self.name}"
+        self.tasks = [Task(p_name) for p_name in self._find_problems(f"./domains/{self.name}")]
+
+    def register_tasks(self, directory):
+        """Add the problems of another directory, e.g. generated ones, after the domain's own
+        tasks, so that the numbers of the existing tasks do not change."""
+        problem_name_list = self._find_problems(directory)
+        if not problem_name_list:
+            raise RuntimeError(f"No problem found in {directory}")
+        known_names = {task.name for task in self.tasks}
+        for p_name in problem_name_list:
+            if p_name in known_names:
+                raise RuntimeError(f"Problem {p_name} of {directory} is already a task of domain {self.name}")
+            self.tasks.append(Task(p_name, directory))
+        print(f"[info] registered {len(problem_name_list)} tasks of {directory} as tasks {len(self.tasks) - len(problem_name_list) + 1} to {len(self.tasks)} of domain {self.name}")
+
+    def _find_problems(self, path):
         problem_name_list = []
         for fn in glob.glob(f"{path}/*.init.nl"):
             file_base_name = os.path.basename(fn)
@@ -62,8 +79,7 @@ class Domain:
                     raise RuntimeError(f"Ground truth PDDL file not present for problem {problem_name} of domain {self.name}")
                 else:
                     problem_name_list.append(problem_name)
-        problem_name_list = sorted(problem_name_list)
-        self.tasks = [Task(p_name) for p_name in problem_name_list]
+        return sorted(problem_name_list)
 
     def __len__(self):
         return len(self.tasks)
@@ -73,34 +89,37 @@ class Domain:
     def get_task_name(self, i) -> str:
         return self.tasks[i-1].name
 
+    def get_task_dir(self, i) -> str:
+        return self.tasks[i-1].directory or self.domain_dir
+
     def get_task_suffix(self, i) -> str:
         pddl = self.tasks[i-1].get_ground_truth_pddl_filename()
         return f"{self.name}/{pddl}"
 
     def get_task_init_nl(self, i):
         init_nl_f = self.tasks[i-1].get_init_filename()
-        with open(os.path.join(self.domain_dir, init_nl_f), 'r') as f:
+        with open(os.path.join(self.get_task_dir(i), init_nl_f), 'r') as f:
             init_nl = f.read()
         
         return postprocess(init_nl)
 
     def get_task_goal_nl(self, i):
         goal_nl_f = self.tasks[i-1].get_goal_filename()
-        with open(os.path.join(self.domain_dir, goal_nl_f), 'r') as f:
+        with open(os.path.join(self.get_task_dir(i), goal_nl_f), 'r') as f:
             goal_nl = f.read()
         
         return postprocess(goal_nl)
 
     def get_task_constraints_nl(self, i):
         constraints_nl_f = self.tasks[i-1].get_constraints_filename()
-        with open(os.path.join(self.domain_dir, constraints_nl_f), 'r') as f:
+        with open(os.path.join(self.get_task_dir(i), constraints_nl_f), 'r') as f:
             constraints_nl = f.read()
         
         return postprocess(constraints_nl)
 
     def get_task_pddl(self, i):
         pddl_f = self.tasks[i-1].get_ground_truth_pddl_filename()
-        with open(os.path.join(self.domain_dir, pddl_f), 'r') as f:
+        with open(os.path.join(self.get_task_dir(i), pddl_f), 'r') as f:
             pddl = f.read()
         
         return postprocess(pddl)
@@ -195,6 +214,13 @@ class Blocksworld(Domain):
 class Manipulation(Domain):
     name = "manipulation" # this should match the directory name
 
+class Overcooked(Domain):
+    name = "overcooked" # this should match the directory name
+
+    def grab_tasks(self):
+        # the overcooked domain has no problems of its own, only generated ones (see problem_generator)
+        self.tasks = []
+
 available_domains = {
     # "barman": Barman(),
     # "blocksworld": Blocksworld(),
@@ -203,5 +229,7 @@ available_domains = {
     # "storage": Storage(),
     # "termes": Termes(),
     # "tyreworld": Tyreworld(),
-    "manipulation": Manipulation()
+    "manipulation": Manipulation(),
+    # generated problems only (--tasks-dir), without in-context example for the LLM planners
+    "overcooked": Overcooked()
 }
\ No newline at end of file
@@ -0,0 +1,150 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .config import DEFAULT_EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_THREADS, EMBEDDING_CACHE_DIR, EMBEDDING_BATCH_SIZE
+
+###############################################################################
+#
+# Embedding backends of the plan matchers
+#
+# Every backend exposes the encode/similarity interface of SentenceTransformer
+# (cosine similarities), so backends can replace each other in PlanMatcher and
+# GroundedActionIndex. "onnx_int8" runs the same model exported to ONNX with
+# dynamically quantized int8 weights on ONNX Runtime: the model is exported and
+# quantized once with PyTorch, then workers only need onnxruntime and the
+# tokenizer. check_parity compares the similarities of a backend with the ones
+# of the PyTorch model, so that quantization does not change matching results.
+#
+###############################################################################
+
+class SentenceTransformerBackend:
+    def __init__(self, model_name=EMBEDDING_MODEL, threads=EMBEDDING_THREADS):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads is not None:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name)
+        # identifies the embeddings of the model, e.g. when they are shared between processes
+        self.cache_key = f"sentence_transformers:{model_name}"
+
+    def encode(self, sentences):
+        return self.model.encode(sentences)
+
+    def similarity(self, embeddings1, embeddings2):
+        return _cosine_similarity(embeddings1, embeddings2)
+
+class OnnxInt8Backend:
+    """Mean pooled, normalized embeddings of the model's transformer, as computed by
+    SentenceTransformer for all-MiniLM-L6-v2, from an int8 quantized ONNX export."""
+
+    def __init__(self, model_name=EMBEDDING_MODEL, threads=EMBEDDING_THREADS, cache_dir=EMBEDDING_CACHE_DIR):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("The onnx_int8 embedding backend requires onnxruntime (pip install planning-eval-framework[onnx])")
+        from transformers import AutoTokenizer
+
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "_"))
+        model_file = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(model_file):
+            export_int8_model(model_name, model_dir)
+
+        options = onnxruntime.SessionOptions()
+        if threads is not None:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.cache_key = f"onnx_int8:{model_name}"
+
+    def encode(self, sentences):
+        if isinstance(sentences, str):
+            return self.encode([sentences])[0]
+        batches = [self._encode_batch(sentences[i:i + EMBEDDING_BATCH_SIZE]) for i in range(0, len(sentences), EMBEDDING_BATCH_SIZE)]
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+    def similarity(self, embeddings1, embeddings2):
+        return _cosine_similarity(embeddings1, embeddings2)
+
+    def _encode_batch(self, sentences):
+        inputs = self.tokenizer(list(sentences), padding=True, truncation=True, return_tensors="np")
+        inputs = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return _normalize_rows(embeddings.astype(np.float32))
+
+def export_int8_model(model_name, model_dir):
+    """Export the transformer of a SentenceTransformer model to ONNX, quantize its weights to
+    int8 and save it with its tokenizer in model_dir."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    print(f"[info] exporting {model_name} to an int8 ONNX model in {model_dir}")
+    os.makedirs(model_dir, exist_ok=True)
+    transformer = SentenceTransformer(model_name, device="cpu")[0]
+    transformer.tokenizer.save_pretrained(model_dir)
+
+    sample = transformer.tokenizer(["pick guitar bedroom"], return_tensors="pt")
+    input_names = list(sample.keys())
+    # both files are written under temporary names, so that concurrent workers exporting the
+    # model never overwrite each other's files nor load a partial model
+    fp32_file = os.path.join(model_dir, f"model.onnx.{os.getpid()}.tmp")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(transformer.auto_model, tuple(sample[name] for name in input_names), fp32_file,
+                          input_names=input_names, output_names=["token_embeddings"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+    tmp_file = os.path.join(model_dir, f"model.int8.onnx.{os.getpid()}.tmp")
+    quantize_dynamic(fp32_file, tmp_file, weight_type=QuantType.QInt8)
+    os.remove(fp32_file)
+    os.replace(tmp_file, os.path.join(model_dir, "model.int8.onnx"))
+
+available_embedding_backends = {
+    "sentence_transformers": SentenceTransformerBackend,
+    "onnx_int8": OnnxInt8Backend
+}
+
+# backend and threads of the models loaded by get_embedding_model, set from the command line
+_settings = {"backend": DEFAULT_EMBEDDING_BACKEND, "threads": EMBEDDING_THREADS}
+
+def configure_embedding_backend(args):
+    _settings["backend"] = getattr(args, "embedding_backend", DEFAULT_EMBEDDING_BACKEND)
+    _settings["threads"] = getattr(args, "embedding_threads", EMBEDDING_THREADS)
+
+# Models are loaded once per process and shared by all matchers
+@lru_cache(maxsize=None)
+def _load_embedding_model(backend, threads):
+    if backend not in available_embedding_backends:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+    return available_embedding_backends[backend](threads=threads)
+
+def get_embedding_model(backend=None, threads=None):
+    return _load_embedding_model(backend or _settings["backend"], threads or _settings["threads"])
+
+def check_parity(model, reference_model, queries, candidates):
+    """Compare the query x candidate similarities of a model with the ones of a reference model.
+    Returns the largest absolute difference of similarities and the fraction of queries whose
+    most similar candidate is the same with both models."""
+    similarities = np.asarray(model.similarity(model.encode(queries), model.encode(candidates)))
+    reference = np.asarray(reference_model.similarity(reference_model.encode(queries), reference_model.encode(candidates)))
+    max_difference = float(np.abs(similarities - reference).max())
+    top1_agreement = float((similarities.argmax(axis=1) == reference.argmax(axis=1)).mean())
+    return max_difference, top1_agreement
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def _cosine_similarity(embeddings1, embeddings2):
+    embeddings1 = _normalize_rows(np.atleast_2d(np.asarray(embeddings1, dtype=np.float32)))
+    embeddings2 = _normalize_rows(np.atleast_2d(np.asarray(embeddings2, dtype=np.float32)))
+    return embeddings1 @ embeddings2.T
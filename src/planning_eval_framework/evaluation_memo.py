@@ -0,0 +1,107 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+from .config import EVALUATION_MEMO, EVALUATION_MEMO_FILE
+from .profiling import profiler
+from .utils import connect_sqlite
+
+###############################################################################
+#
+# Memoized plan evaluations
+#
+# Perturbation sweeps often match many perturbed descriptions to the same
+# closest plan, and evaluating a plan only depends on the domain, the ground
+# truth problem, the evaluator backend and the plan itself. Results are kept
+# by a hash of these, the plan being normalized first (case, whitespace,
+# blank and comment lines), so duplicate plans get their results without
+# being simulated again. The key also holds a hash of the evaluator code, so
+# that results persisted by an older version of the evaluators are not
+# reused. The memo lives in memory for the whole run and can also be
+# persisted in a SQLite file, to be shared by workers and later runs.
+#
+###############################################################################
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    key TEXT PRIMARY KEY,
+    results TEXT NOT NULL
+)
+"""
+
+def _sha1(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+# modules whose code the evaluation results depend on
+_EVALUATOR_MODULES = ("plan_evaluator.py", "strips_evaluator.py", "grounding.py")
+
+@lru_cache(maxsize=None)
+def evaluator_version():
+    """Hash of the source of the evaluator modules."""
+    source_hash = hashlib.sha1()
+    for module in _EVALUATOR_MODULES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), "rb") as f:
+            source_hash.update(f.read())
+    return source_hash.hexdigest()[:12]
+
+def normalize_plan(plan_pddl):
+    lines = (" ".join(line.lower().split()) for line in plan_pddl.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith(";"))
+
+class EvaluationMemo:
+    def __init__(self, path=None):
+        self.path = path
+        self.results = {}
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return connect_sqlite(self.path)
+
+    def key(self, domain_pddl, problem_pddl, plan_pddl, backend):
+        return ":".join([evaluator_version(), _sha1(domain_pddl), _sha1(problem_pddl), backend, _sha1(normalize_plan(plan_pddl))])
+
+    def get(self, key):
+        """Copy of the memoized results, or None."""
+        with self._lock:
+            results = self.results.get(key)
+        if results is None and self.path is not None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT results FROM evaluations WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                results = json.loads(row[0])
+                with self._lock:
+                    self.results[key] = results
+        profiler.count("evaluation_memo_hits" if results is not None else "evaluation_memo_misses")
+        # results are completed in place by their writers, e.g. with their profile
+        return copy.deepcopy(results)
+
+    def put(self, key, results):
+        results = copy.deepcopy(results)
+        with self._lock:
+            self.results[key] = results
+        if self.path is not None:
+            with self._connect() as conn:
+                conn.execute("INSERT OR REPLACE INTO evaluations (key, results) VALUES (?, ?)", (key, json.dumps(results)))
+
+# memo of the process, set from the command line
+_settings = {"memo": EvaluationMemo(EVALUATION_MEMO_FILE) if EVALUATION_MEMO else None}
+
+def configure_evaluation_memo(args):
+    enabled = not getattr(args, "no_evaluation_memo", not EVALUATION_MEMO)
+    path = getattr(args, "evaluation_memo_file", EVALUATION_MEMO_FILE)
+    memo = _settings["memo"]
+    if not enabled:
+        _settings["memo"] = None
+    elif memo is None or memo.path != path:
+        _settings["memo"] = EvaluationMemo(path)
+
+def get_evaluation_memo():
+    """Evaluation memo of the process, or None when it is disabled."""
+    return _settings["memo"]
@@ -1,18 +1,69 @@
+import copy
 import glob
 import json
 import os
 import time
+from types import SimpleNamespace
 from typing import Literal
 
-from . import text_transformations
+from . import batch, server, text_transformations
 from .domains import Domain
-from llm_planners.planners import available_planners, PlannerResult
-from .plan_evaluator import PlanEvaluator, available_plan_matchers
+from llm_planners.planners import PlannerResult
+from .pipeline import Pipeline, Stage, StageError
+from .planners import available_planners
+from .plan_evaluator import evaluate_plan, evaluate_plans, resolve_evaluator_backend, available_plan_matchers, load_word_embedding_model
+from .profiling import profiler, merge_plan_records
+from .metrics import metrics
+from .evaluation_memo import get_evaluation_memo
+from .config import EVALUATION_CHUNK_SIZE
+from .request_engine import RequestEngine
+from .utils import wilson_score_interval
+
+def _llm_usage(planner_result: PlannerResult):
+    # token usage is only reported by planners that expose it
+    usage = getattr(planner_result, "usage", None)
+    if usage is None:
+        return {}
+    if not isinstance(usage, dict):
+        usage = vars(usage)
+    return usage
+
+def _count_llm_tokens(planner_result: PlannerResult):
+    usage = _llm_usage(planner_result)
+    for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+        if usage.get(key) is not None:
+            profiler.count(f"llm_{key}", usage[key])
+
+def _estimate_llm_tokens(texts):
+    # about 4 characters per token for English text, before the planner adds its own prompt
+    return sum(len(text) for text in texts) // 4
+
+def _request_planner(planner):
+    """Copy of a planner for a single request, so that concurrent requests do not share their
+    state. set_context and set_response_model_generator rebind attributes of the copy, and
+    the containers of the planner (e.g. message histories) are copied as well. Other
+    attributes, like the API client, stay shared: the OpenAI client is thread safe. Planners
+    that are not, like the ground truth stub, set thread_safe = False and are run one request
+    at a time in the main thread instead."""
+    planner_copy = copy.copy(planner)
+    for name, value in list(getattr(planner_copy, "__dict__", {}).items()):
+        if isinstance(value, (list, dict, set)):
+            setattr(planner_copy, name, copy.copy(value))
+    return planner_copy
+
+def _interval_width(count, total):
+    if total == 0:
+        return 1.0
+    lower_bound, upper_bound = wilson_score_interval(count / total, total)
+    return upper_bound - lower_bound
 
 class ExperimentRunner():
     def __init__(self, args, domain: Domain):
         self.args = args
         self.domain = domain
+        # matching, evaluation and perturbations go through a running evaluation server when there is one
+        self.eval_client = server.connect()
+        self.request_engine = RequestEngine(args.llm_concurrency, args.llm_rpm, args.llm_tpm, args.llm_max_retries, seed=args.seed)
 
     def set_experiment(self, planner_name: str, 
                              response_model_generator_name: str, 
@@ -21,6 +72,8 @@ class ExperimentRunner():
         self.planner_name = planner_name
         self.response_model_generator_name = response_model_generator_name
         self.plan_matcher_name = plan_matcher_name
+        self.pct_words_to_swap = pct_words_to_swap
+        self.experiment_id = f"{planner_name},{response_model_generator_name}|{pct_words_to_swap}"
 
         swap_subdir_name = ""
         if pct_words_to_swap is not None:
@@ -36,7 +89,9 @@ class ExperimentRunner():
         os.makedirs(self.plan_dir, exist_ok=True)
         os.makedirs(self.evaluation_dir, exist_ok=True)
 
-    def run_experiment(self):
+    def run_experiment(self, perturbed_task_names=None):
+        """Run the current experiment. Robustness experiments run on the perturbed tasks named in
+        perturbed_task_names, or on all of them, and return their results summary."""
         task = self.args.task
         init_nl = self.domain.get_task_init_nl(task)
         goal_nl = self.domain.get_task_goal_nl(task)
@@ -46,13 +101,320 @@ class ExperimentRunner():
         task_suffix = self.domain.get_task_suffix(task)
 
         if(self.args.command == "robustness-experiment"):
-            for perturbed_task_name, perturbed_task in self._grab_perturbed_tasks(task_name).items():
-                produced_plan: PlannerResult = self.run_planner(perturbed_task["init_nl"], perturbed_task["goal_nl"], perturbed_task["constraints_nl"], perturbed_task_name, task)
-                self.run_evaluator(produced_plan, task, perturbed_task_name)
+            perturbed_tasks = self._grab_perturbed_tasks(task_name)
+            if perturbed_task_names is not None:
+                perturbed_tasks = {name: perturbed_tasks[name] for name in perturbed_task_names if name in perturbed_tasks}
+            # the planner runs on the perturbed tasks of a chunk concurrently, then their plans are
+            # matched here (Julia only runs in the main thread), evaluated together and written
+            # before the next chunk, so an interrupted run only loses the chunk in progress
+            chunk_size = getattr(self.args, "evaluation_chunk_size", EVALUATION_CHUNK_SIZE)
+            items = list(perturbed_tasks.items())
+            for start in range(0, len(items), chunk_size):
+                self._run_robustness_chunk(dict(items[start:start + chunk_size]), task)
+            return self._summarize_results()
+        else:
+            with profiler.plan(task_name):
+                planner_result: PlannerResult = self.run_planner(init_nl, goal_nl, constraints_nl, task_name, task)
+                self.run_evaluator(planner_result, task, task_name)
+
+    def _run_robustness_chunk(self, perturbed_tasks, task):
+        planner_outputs = self.run_planners(perturbed_tasks, task)
+        closest_plans = {}
+        plan_profiles = {}
+        for perturbed_task_name, (produced_plan, planner_profile) in planner_outputs.items():
+            if isinstance(produced_plan, Exception):
+                print(f"[error] planner failed on {perturbed_task_name}: {type(produced_plan).__name__}: {produced_plan}")
+                closest_plans[perturbed_task_name] = None
+                continue
+            with profiler.plan(perturbed_task_name):
+                closest_plans[perturbed_task_name] = self.match_plan(produced_plan, task, perturbed_task_name)
+                plan_profiles[perturbed_task_name] = merge_plan_records(planner_profile, profiler.plan_record())
+        self.run_batch_evaluator(closest_plans, task, plan_profiles)
+
+    def run_adaptive_experiments(self, pct_words_to_swap, methods):
+        """Robustness experiments of the methods at one swap percentage, on perturbations produced
+        in rounds of --perturbation-round-size. A method stops once the Wilson score intervals of
+        its successful and safe rates are narrower than --target-interval-width, or once
+        --max-perturbations perturbations were evaluated."""
+        args = self.args
+        task_name = self.domain.get_task_name(args.task)
+        pending_methods = list(methods)
+        produced = 0
+        while pending_methods:
+            round_size = min(args.perturbation_round_size, args.max_perturbations - produced)
+            round_size = self.produce_perturbations(args.perturbation_recipe, pct_words_to_swap, round_size, args.perturbation_targets, args.jailbreak_text, start_index=produced)
+            if round_size == 0:
+                print(f"[warning] no more perturbations of {task_name}, stopping after {produced} perturbations")
+                return
+            round_task_names = [f"{task_name}_{i+1}" for i in range(produced, produced + round_size)]
+            produced += round_size
+
+            still_pending = []
+            for (planner_name, pyd_generator) in pending_methods:
+                self.set_experiment(planner_name, pyd_generator, args.plan_matcher, pct_words_to_swap)
+                summary = self.run_experiment(round_task_names)
+                widths = {metric: _interval_width(summary[metric], summary["total"]) for metric in ("successful", "safe")}
+                widths_text = ", ".join(f"{metric} interval width {width:.3f}" for metric, width in widths.items())
+                if max(widths.values()) <= args.target_interval_width:
+                    print(f"[info] {self.experiment_id} converged after {summary['total']} perturbations ({widths_text})")
+                elif produced >= args.max_perturbations:
+                    print(f"[info] {self.experiment_id} reached the budget of {args.max_perturbations} perturbations ({widths_text})")
+                else:
+                    still_pending.append((planner_name, pyd_generator))
+            pending_methods = still_pending
+
+    def run_pipeline(self, pcts, methods):
+        """Robustness experiments of every swap percentage and method as one streaming pipeline
+        (perturb -> plan -> match -> simulate -> record), so that plans are matched and evaluated
+        while later planner requests are still in flight. Perturbation and planning run in worker
+        threads; matching, simulation and recording run in this thread, as Julia requires."""
+        args = self.args
+        task = args.task
+        task_name = self.domain.get_task_name(task)
+        # experiments share the request engine and evaluation client, but each has its own directories
+        experiments = {}
+
+        def perturb(pct):
+            perturbed = copy.copy(self)
+            perturbed.produce_perturbations(args.perturbation_recipe, pct, args.perturbations_number, args.perturbation_targets, args.jailbreak_text)
+            for (planner_name, pyd_generator) in methods:
+                experiment = copy.copy(perturbed)
+                experiment.set_experiment(planner_name, pyd_generator, args.plan_matcher, pct)
+                experiments[experiment.experiment_id] = experiment
+                for perturbed_task_name, task_nl in experiment._grab_perturbed_tasks(task_name).items():
+                    yield experiment, perturbed_task_name, task_nl
+
+        def plan(item):
+            experiment, perturbed_task_name, task_nl = item
+            planner = _request_planner(available_planners[experiment.planner_name])
+            with profiler.plan(perturbed_task_name):
+                try:
+                    planner_result = self.request_engine.call(
+                        lambda task_nl: experiment.run_planner(task_nl["init_nl"], task_nl["goal_nl"], task_nl["constraints_nl"], perturbed_task_name, task, planner),
+                        task_nl,
+                        estimate_tokens=lambda task_nl: _estimate_llm_tokens(task_nl.values()),
+                        used_tokens=lambda planner_result: _llm_usage(planner_result).get("total_tokens"))
+                except Exception as e:
+                    print(f"[error] planner failed on {perturbed_task_name}: {type(e).__name__}: {e}")
+                    planner_result = None
+                return experiment, perturbed_task_name, planner_result, profiler.plan_record()
+
+        def match(item):
+            experiment, perturbed_task_name, planner_result, profile = item
+            with profiler.plan(perturbed_task_name):
+                closest_plan = None
+                if planner_result is not None:
+                    closest_plan = experiment.match_plan(planner_result, task, perturbed_task_name)
+                return experiment, perturbed_task_name, closest_plan, merge_plan_records(profile, profiler.plan_record())
+
+        def simulate(item):
+            experiment, perturbed_task_name, closest_plan, profile = item
+            with profiler.plan(perturbed_task_name):
+                results = {"valid": False}
+                if closest_plan is not None:
+                    results = experiment.evaluate_closest_plan(closest_plan, task)
+                return experiment, perturbed_task_name, results, merge_plan_records(profile, profiler.plan_record())
+
+        def record(item):
+            experiment, perturbed_task_name, results, profile = item
+            experiment._write_results(results, perturbed_task_name, profile)
+
+        plan_in_thread = all(getattr(available_planners[planner_name], "thread_safe", True) for planner_name, _ in methods)
+        pipeline = Pipeline([
+            Stage("perturb", perturb, workers=args.perturbation_workers, queue_size=args.pipeline_queue_size, fan_out=True),
+            Stage("plan", plan, workers=args.llm_concurrency, queue_size=args.pipeline_queue_size, main_thread=not plan_in_thread),
+            Stage("match", match, queue_size=args.pipeline_queue_size, main_thread=True),
+            Stage("simulate", simulate, main_thread=True),
+            Stage("record", record, main_thread=True)
+        ])
+        for result in pipeline.run(pcts):
+            if isinstance(result, StageError):
+                print(f"[error] pipeline stage {result.stage} failed: {type(result.error).__name__}: {result.error}")
+        for experiment in experiments.values():
+            experiment._summarize_results()
+
+    def batch_requests(self):
+        """Planner requests of the current experiment, to be submitted as a batch instead of run_experiment."""
+        tasks_nl = self._batch_tasks_nl()
+        return [batch.make_request(f"{self.experiment_id}|{name}", self._task_planner(name), task_nl["init_nl"], task_nl["goal_nl"],
+                                   task_nl["constraints_nl"], self.domain.get_domain_nl(), self.domain.get_domain_pddl())
+                for name, task_nl in tasks_nl.items()]
+
+    def ingest_batch_results(self, results):
+        """Write the planner results of the current experiment from a completed batch into the
+        plans/ and problems/ directories and evaluate them. results maps custom ids to output rows."""
+        task = self.args.task
+        closest_plans = {}
+        plan_profiles = {}
+        for task_name in self._batch_tasks_nl():
+            row = results.get(f"{self.experiment_id}|{task_name}")
+            try:
+                if row is None:
+                    raise RuntimeError("missing from the batch output")
+                planner_result = batch.parse_result(self._task_planner(task_name), row)
+            except Exception as e:
+                print(f"[error] planner failed on {task_name}: {e}")
+                closest_plans[task_name] = None
+                continue
+            with profiler.plan(task_name):
+                with profiler.span("file_io"):
+                    self._write_planner_result(planner_result, task_name)
+                closest_plans[task_name] = self.match_plan(planner_result, task, task_name)
+                plan_profiles[task_name] = profiler.plan_record()
+        self.run_batch_evaluator(closest_plans, task, plan_profiles)
+        if(self.args.command == "robustness-experiment"):
             self._summarize_results()
+
+    def _batch_tasks_nl(self):
+        task = self.args.task
+        task_name = self.domain.get_task_name(task)
+        if(self.args.command == "robustness-experiment"):
+            return self._grab_perturbed_tasks(task_name)
+        return {task_name: {
+            "init_nl": self.domain.get_task_init_nl(task),
+            "goal_nl": self.domain.get_task_goal_nl(task),
+            "constraints_nl": self.domain.get_task_constraints_nl(task)
+        }}
+
+    def _task_planner(self, task_name):
+        """Copy of the planner of the current experiment, configured for the task."""
+        planner = _request_planner(available_planners[self.planner_name])
+        planner.set_context(self.domain.get_context(), self.domain.name, task_name)
+        planner.set_response_model_generator(self.response_model_generator_name)
+        return planner
+
+    def work_units(self):
+        """Work units of the current experiment, one per (perturbed) task, as {key: payload}
+        for the work queue."""
+        task = self.args.task
+        task_name = self.domain.get_task_name(task)
+        if(self.args.command == "robustness-experiment"):
+            task_names = sorted(self._grab_perturbed_tasks(task_name))
+        else:
+            task_names = [task_name]
+        return {f"{self.experiment_id}|{name}": {"task": task, "pct_words_to_swap": self.pct_words_to_swap, "planner": self.planner_name,
+                                                 "pyd_generator": self.response_model_generator_name, "task_name": name}
+                for name in task_names}
+
+    def run_work_unit(self, unit):
+        """Plan and evaluate the task of a work unit payload (see work_units)."""
+        experiment = copy.copy(self)
+        experiment.args = copy.copy(self.args)
+        experiment.args.task = task = unit["task"]
+        experiment.set_experiment(unit["planner"], unit["pyd_generator"], self.args.plan_matcher, unit["pct_words_to_swap"])
+        task_name = unit["task_name"]
+        if(self.args.command == "robustness-experiment"):
+            task_nl = experiment._grab_perturbed_tasks(self.domain.get_task_name(task))[task_name]
         else:
-            planner_result: PlannerResult = self.run_planner(init_nl, goal_nl, constraints_nl, task_name, task)
-            self.run_evaluator(planner_result, task, task_name)
+            task_nl = {
+                "init_nl": self.domain.get_task_init_nl(task),
+                "goal_nl": self.domain.get_task_goal_nl(task),
+                "constraints_nl": self.domain.get_task_constraints_nl(task)
+            }
+
+        with profiler.plan(task_name):
+            try:
+                planner_result = self.request_engine.call(
+                    lambda task_nl: experiment.run_planner(task_nl["init_nl"], task_nl["goal_nl"], task_nl["constraints_nl"], task_name, task),
+                    task_nl,
+                    estimate_tokens=lambda task_nl: _estimate_llm_tokens(task_nl.values()),
+                    used_tokens=lambda planner_result: _llm_usage(planner_result).get("total_tokens"))
+            except Exception as e:
+                print(f"[error] planner failed on {task_name}: {type(e).__name__}: {e}")
+                experiment._write_results({"valid": False}, task_name)
+                return
+            experiment.run_evaluator(planner_result, task, task_name)
+
+    def replay_experiments(self, namespace, pyd_generators):
+        """Experiments of the plans stored in the run, with the names of their tasks, set up to write
+        their evaluation to evaluation_<namespace> directories next to the original evaluation.
+        pyd_generators maps the planners of the run to their response model generators."""
+        run_dir = f"./experiments/run{self.args.run}"
+        pcts = [None]
+        for item in os.listdir(run_dir):
+            if item.endswith("_swap"):
+                try:
+                    pcts.append(float(item[:-len("_swap")]))
+                except ValueError:
+                    continue
+
+        experiments = []
+        for pct in pcts:
+            swap_dir = f"{run_dir}/{pct}_swap" if pct is not None else run_dir
+            # tasks whose planner produced no plan only have results, which are replayed as invalid plans
+            planner_names = set()
+            for subdir in ("plans", "evaluation"):
+                if os.path.isdir(f"{swap_dir}/{subdir}"):
+                    planner_names.update(os.listdir(f"{swap_dir}/{subdir}"))
+            for planner_name in sorted(planner_names):
+                task_names = set()
+                for subdir, extensions in (("plans", (".json", ".pddl")), ("evaluation", (".results.json",))):
+                    directory = f"{swap_dir}/{subdir}/{planner_name}/{self.domain.name}"
+                    if os.path.isdir(directory):
+                        task_names.update(fn[:-len(extension)] for fn in os.listdir(directory)
+                                          for extension in extensions if fn.endswith(extension))
+                if not task_names:
+                    continue
+                if planner_name not in pyd_generators:
+                    print(f"[warning] response model generator of {planner_name} not found in the run arguments")
+                experiment = copy.copy(self)
+                experiment.args = copy.copy(self.args)
+                experiment.set_experiment(planner_name, pyd_generators.get(planner_name, "none"), self.args.plan_matcher, pct)
+                experiment.evaluation_dir = f"{swap_dir}/evaluation_{namespace}/{planner_name}/{self.domain.name}"
+                os.makedirs(experiment.evaluation_dir, exist_ok=True)
+                experiments.append((experiment, sorted(task_names)))
+        return experiments
+
+    def replay_plans(self, task_names):
+        """Match and evaluate stored plans of the current experiment again, without running the planner."""
+        # perturbed tasks are named <task>_<i>
+        task_numbers = {task.name: i + 1 for i, task in enumerate(self.domain.tasks)}
+        closest_plans = {}
+        plan_profiles = {}
+        for task_name in task_names:
+            base_task_name = task_name if task_name in task_numbers else task_name.rpartition("_")[0]
+            if base_task_name not in task_numbers:
+                print(f"[warning] no task of domain {self.domain.name} matches the stored plan {task_name}, skipping it")
+                continue
+            task = task_numbers[base_task_name]
+            with profiler.plan(task_name):
+                closest_plans.setdefault(task, {})[task_name] = self.match_plan(self._read_planner_result(task_name), task, task_name)
+                plan_profiles[task_name] = profiler.plan_record()
+        for task, task_closest_plans in closest_plans.items():
+            self.run_batch_evaluator(task_closest_plans, task, plan_profiles)
+
+    def _read_planner_result(self, task_name):
+        planner_result = SimpleNamespace(plan_json=None, plan_pddl=None, task_pddl=None)
+        for attribute, file_name in (("plan_json", f"{self.plan_dir}/{task_name}.json"),
+                                     ("plan_pddl", f"{self.plan_dir}/{task_name}.pddl"),
+                                     ("task_pddl", f"{self.problem_dir}/{task_name}.pddl")):
+            if os.path.exists(file_name):
+                with profiler.span("file_io"):
+                    with open(file_name, "r") as f:
+                        setattr(planner_result, attribute, f.read())
+        return planner_result
+
+    def warm_up(self):
+        """Load once, before the first unit of a worker, what every unit uses: the embedding model,
+        the parsed domain and ground truth problem, and the compiled code of the evaluator."""
+        if self.eval_client is not None:
+            return
+        with profiler.span("worker_warm_up"):
+            load_word_embedding_model()
+            _, ground_truth_task_pddl = self.domain.get_task(self.args.task)
+            evaluate_plan(self.domain.get_domain_pddl(), ground_truth_task_pddl, "", self.args.evaluator_backend)
+
+    def summarize_work_units(self, units):
+        """Results summaries of the robustness experiments of a set of work unit payloads."""
+        if(self.args.command != "robustness-experiment"):
+            return
+        experiments = {(unit["task"], unit["pct_words_to_swap"], unit["planner"], unit["pyd_generator"]) for unit in units}
+        for (task, pct, planner_name, pyd_generator) in sorted(experiments, key=str):
+            experiment = copy.copy(self)
+            experiment.args = copy.copy(self.args)
+            experiment.args.task = task
+            experiment.set_experiment(planner_name, pyd_generator, self.args.plan_matcher, pct)
+            experiment._summarize_results()
 
     def _grab_perturbed_tasks(self, task_name):
         perturbed_tasks = {}
@@ -79,22 +441,55 @@ class ExperimentRunner():
                 }
         return perturbed_tasks
 
-    def run_planner(self, init_nl, goal_nl, constraints_nl, task_name, task):
+    def run_planners(self, tasks_nl, task):
+        """Run the planner on each of the {task name: {"init_nl", "goal_nl", "constraints_nl"}}
+        tasks through the request engine. Returns {task name: (planner result, plan profile)},
+        with the exception in place of the result for requests that failed."""
+        planner = available_planners[self.planner_name]
+
+        def plan_task(item):
+            task_name, task_nl = item
+            with profiler.plan(task_name):
+                planner_result = self.run_planner(task_nl["init_nl"], task_nl["goal_nl"], task_nl["constraints_nl"], task_name, task, _request_planner(planner))
+                return planner_result, profiler.plan_record()
+
+        items = list(tasks_nl.items())
+        results = self.request_engine.map(plan_task, items,
+                                          estimate_tokens=lambda item: _estimate_llm_tokens(item[1].values()),
+                                          used_tokens=lambda result: _llm_usage(result[0]).get("total_tokens"),
+                                          in_thread=getattr(planner, "thread_safe", True))
+        outputs = {}
+        for (task_name, _), result in zip(items, results):
+            outputs[task_name] = (result, None) if isinstance(result, Exception) else result
+        return outputs
+
+    def run_planner(self, init_nl, goal_nl, constraints_nl, task_name, task, planner=None):
 
         # get domain, task and planner information
         context = self.domain.get_context()
         domain_pddl = self.domain.get_domain_pddl()
         domain_nl = self.domain.get_domain_nl()
-        planner = available_planners[self.planner_name]
+        if planner is None:
+            planner = available_planners[self.planner_name]
 
         start_time = time.time()
 
-        planner.set_context(context, self.domain.name, task_name)
-        planner.set_response_model_generator(self.response_model_generator_name)
-        planner_result = planner.run_planner(init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl)
+        with profiler.span("planner_call"):
+            planner.set_context(context, self.domain.name, task_name)
+            planner.set_response_model_generator(self.response_model_generator_name)
+            planner_result = planner.run_planner(init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl)
 
         end_time = time.time()
+        profiler.count("llm_calls")
+        _count_llm_tokens(planner_result)
+
+        with profiler.span("file_io"):
+            self._write_planner_result(planner_result, task_name)
+
+        print(f"[info] task {task} takes {end_time - start_time} sec")
+        return planner_result
 
+    def _write_planner_result(self, planner_result: PlannerResult, task_name):
         if (planner_result.plan_json is not None):
             plan_json_file_name = f"{self.plan_dir}/{task_name}.json"
             with open(plan_json_file_name, "w") as f:
@@ -110,40 +505,115 @@ class ExperimentRunner():
             with open(plan_pddl_file_name, "w") as f:
                 f.write(planner_result.plan_pddl)
 
-        print(f"[info] task {task} takes {end_time - start_time} sec")
-        return planner_result
-
     def run_evaluator(self, planner_result: PlannerResult, task, task_name):
 
+        closest_plan = self.match_plan(planner_result, task, task_name)
+        if closest_plan is None:
+            # the planner did not produce a plan at all
+            self._write_results({"valid": False}, task_name)
+            return
+
+        self._write_results(self.evaluate_closest_plan(closest_plan, task), task_name)
+
+    def evaluate_closest_plan(self, closest_plan, task):
         domain_pddl = self.domain.get_domain_pddl()
         _, ground_truth_task_pddl = self.domain.get_task(task)
+        # duplicate plans, e.g. of different perturbations, are only simulated once
+        memo = get_evaluation_memo()
+        if memo is not None:
+            backend = resolve_evaluator_backend(domain_pddl, ground_truth_task_pddl, self.args.evaluator_backend)
+            key = memo.key(domain_pddl, ground_truth_task_pddl, closest_plan, backend)
+            results = memo.get(key)
+            if results is not None:
+                return results
+        if self.eval_client is not None:
+            results = self.eval_client.evaluate(domain_pddl, ground_truth_task_pddl, closest_plan, self.args.evaluator_backend)
+        else:
+            results = evaluate_plan(domain_pddl, ground_truth_task_pddl, closest_plan, self.args.evaluator_backend)
+        if memo is not None:
+            memo.put(key, results)
+        return results
 
-        plan_matcher = available_plan_matchers[self.plan_matcher_name](domain_pddl, ground_truth_task_pddl)
-        closest_plan = plan_matcher.plan_closest_match(planner_result)
-        closest_plan_pddl_file_name = f"{self.evaluation_dir}/{task_name}.pddl.closest"
-        with open(closest_plan_pddl_file_name, "w") as f:
-            f.write(closest_plan)
-
-        evaluator = PlanEvaluator(domain_pddl,ground_truth_task_pddl,closest_plan)
-        evaluator.try_simulation()
+    def run_batch_evaluator(self, closest_plans, task, plan_profiles):
+        domain_pddl = self.domain.get_domain_pddl()
+        _, ground_truth_task_pddl = self.domain.get_task(task)
 
+        backend = resolve_evaluator_backend(domain_pddl, ground_truth_task_pddl, self.args.evaluator_backend)
         results = {}
+        # memoized plans are not simulated again, and duplicate plans of the batch only once
+        memo = get_evaluation_memo()
+        keys = {}
+        if memo is not None:
+            for name, plan in closest_plans.items():
+                if plan is None:
+                    continue
+                keys[name] = memo.key(domain_pddl, ground_truth_task_pddl, plan, backend)
+                memoized = memo.get(keys[name])
+                if memoized is not None:
+                    results[name] = memoized
+        pending = {}
+        for name, plan in closest_plans.items():
+            if plan is not None and name not in results:
+                pending.setdefault(keys.get(name, name), []).append(name)
+        plans = [closest_plans[names[0]] for names in pending.values()]
+
+        if self.eval_client is not None and backend != "numpy":
+            evaluated = [self.eval_client.evaluate(domain_pddl, ground_truth_task_pddl, plan, backend) for plan in plans]
+        else:
+            # batch simulation with the numpy backend does not need the server's Julia session
+            evaluated = evaluate_plans(domain_pddl, ground_truth_task_pddl, plans, backend)
+        for (key, names), plan_results in zip(pending.items(), evaluated):
+            if memo is not None:
+                memo.put(key, plan_results)
+            for name in names:
+                results[name] = copy.deepcopy(plan_results)
+
+        for task_name in closest_plans:
+            self._write_results(results.get(task_name, {"valid": False}), task_name, plan_profiles.get(task_name))
+
+    def match_plan(self, planner_result: PlannerResult, task, task_name):
+        """Closest plan to the planner result that is executable in the ground truth problem, also
+        written next to the evaluation results, or None if the planner produced no plan."""
+        domain_pddl = self.domain.get_domain_pddl()
+        _, ground_truth_task_pddl = self.domain.get_task(task)
+
+        if planner_result.plan_pddl is None and planner_result.plan_json is None:
+            return None
+
+        with profiler.span("plan_matching"):
+            if self.eval_client is not None:
+                closest_plan = self.eval_client.match(self.plan_matcher_name, domain_pddl, ground_truth_task_pddl, planner_result,
+                                                      getattr(self.args, "lexical_matching", None))
+            else:
+                plan_matcher = available_plan_matchers[self.plan_matcher_name](domain_pddl, ground_truth_task_pddl)
+                closest_plan = plan_matcher.plan_closest_match(planner_result)
+        closest_plan_pddl_file_name = f"{self.evaluation_dir}/{task_name}.pddl.closest"
+        with profiler.span("file_io"):
+            with open(closest_plan_pddl_file_name, "w") as f:
+                f.write(closest_plan)
+        return closest_plan
 
-        results["valid"] = evaluator.is_valid()
-        if(results["valid"]):
-            results["successful"] = evaluator.is_successful()
-            results["safe"] = evaluator.is_safe()
+    def _write_results(self, results, task_name, plan_profile=None):
+        if plan_profile is None:
+            plan_profile = profiler.plan_record()
+        if plan_profile is not None:
+            results["profile"] = plan_profile
 
         results_file_name = f"{self.evaluation_dir}/{task_name}.results.json"
-        with open(results_file_name, 'w') as json_file:
-            json.dump(results, json_file, indent=4)
+        with profiler.span("file_io"):
+            with open(results_file_name, 'w') as json_file:
+                json.dump(results, json_file, indent=4)
+        metrics.record_result(self.experiment_id, results)
 
     def produce_perturbations(self, perturbation_recipe: str, 
                                     pct_words_to_swap: float, 
                                     perturbations_number: int = 10,
                                     perturbation_targets: list[Literal["init", "goal", "constraints"]] = ["init", "goal", "constraints"],
-                                    jailbreak_text: str = None
-                                    ):
+                                    jailbreak_text: str = None,
+                                    start_index: int = 0
+                                    ) -> int:
+        """Write perturbed descriptions start_index + 1 to start_index + perturbations_number of the
+        task and return how many could be produced."""
 
         self.perturbations_dir = f"./experiments/run{self.args.run}/{pct_words_to_swap}_swap/perturbed_descriptions/"
         os.makedirs(f"{self.perturbations_dir}/{self.domain.name}", exist_ok=True)
@@ -154,24 +624,37 @@ class ExperimentRunner():
         perturbed_tasks = {}
         task_init_nl = self.domain.get_task_init_nl(task_number)
         if "init" in perturbation_targets:
-            perturbed_tasks["init"] = text_transformations.produce_perturbations(task_init_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text)
+            perturbed_tasks["init"] = self._produce_text_perturbations(task_init_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
         else:
             perturbed_tasks["init"] = [task_init_nl] * perturbations_number
         task_goal_nl = self.domain.get_task_goal_nl(task_number)
         if "goal" in perturbation_targets:
-            perturbed_tasks["goal"] = text_transformations.produce_perturbations(task_goal_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text)
+            perturbed_tasks["goal"] = self._produce_text_perturbations(task_goal_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
         else:
             perturbed_tasks["goal"] = [task_goal_nl] * perturbations_number
         task_constraints_nl = self.domain.get_task_constraints_nl(task_number)
         if "constraints" in perturbation_targets:
-            perturbed_tasks["constraints"] = text_transformations.produce_perturbations(task_constraints_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text)
+            perturbed_tasks["constraints"] = self._produce_text_perturbations(task_constraints_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
         else:
             perturbed_tasks["constraints"] = [task_constraints_nl] * perturbations_number
 
-        for component_name in perturbed_tasks:
-            for i in range(0, len(perturbed_tasks[component_name])):
-                with open(f"{self.perturbations_dir}/{self.domain.name}/{task_name}_{i+1}.{component_name}.nl", "w") as f:
-                    f.write(perturbed_tasks[component_name][i])
+        # sentence level recipes may run out of distinct perturbations, every component is cut
+        # to the same number so that each perturbed task has all its components
+        produced = min(len(perturbations) for perturbations in perturbed_tasks.values())
+        if produced < perturbations_number:
+            print(f"[warning] only {produced} of the {perturbations_number} perturbations of {task_name} from {start_index+1} on could be produced with {perturbation_recipe}")
+        with profiler.span("file_io"):
+            for component_name in perturbed_tasks:
+                for i in range(produced):
+                    with open(f"{self.perturbations_dir}/{self.domain.name}/{task_name}_{start_index+i+1}.{component_name}.nl", "w") as f:
+                        f.write(perturbed_tasks[component_name][i])
+        return produced
+
+    def _produce_text_perturbations(self, text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index=0):
+        with profiler.span("perturbation_generation"):
+            if self.eval_client is not None:
+                return self.eval_client.perturb(text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
+            return text_transformations.produce_perturbations(text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
 
     def _summarize_results(self):
         # Initialize counters for each category
@@ -179,6 +662,8 @@ class ExperimentRunner():
         valid_count = 0
         successful_count = 0
         safe_count = 0
+        # number of plans violating each rule of the constraints
+        rule_violation_counts = {}
         
         # Traverse through all files in the evaluation dir
         for filename in os.listdir(self.evaluation_dir):
@@ -199,13 +684,18 @@ class ExperimentRunner():
                         successful_count += 1
                     if data.get("safe"):
                         safe_count += 1
+                    for rule, step in data.get("constraint_violations", {}).items():
+                        rule_violation_counts.setdefault(rule, 0)
+                        if step is not None:
+                            rule_violation_counts[rule] += 1
         
         # Prepare the result dictionary
         result = {
             "total": total_count,
             "valid": valid_count,
             "successful": successful_count,
-            "safe": safe_count
+            "safe": safe_count,
+            "constraint_violations": rule_violation_counts
         }
 
         # Write the result to a JSON file in the same directory
@@ -213,4 +703,5 @@ class ExperimentRunner():
         with open(output_file_path, 'w') as output_file:
             json.dump(result, output_file, indent=4)
         
-        print(f"[info] results summary written to {output_file_path}")
\ No newline at end of file
+        print(f"[info] results summary written to {output_file_path}")
+        return result
\ No newline at end of file
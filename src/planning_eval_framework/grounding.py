@@ -0,0 +1,270 @@
+import itertools
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .profiling import profiler
+
+###############################################################################
+#
+# Pure Python PDDL parsing and STRIPS grounding
+#
+# Domains using only :strips, :typing, :negative-preconditions and :equality
+# are grounded into a GroundTask: the list of ground atoms and ground actions,
+# with preconditions and effects encoded as boolean matrices over the atoms.
+# States are boolean vectors over the same atoms, so applicability checks and
+# state updates are plain NumPy operations. Any other PDDL feature raises
+# UnsupportedPDDLError, and callers fall back to PDDL.jl.
+#
+###############################################################################
+
+SUPPORTED_REQUIREMENTS = {":strips", ":typing", ":negative-preconditions", ":equality"}
+
+class UnsupportedPDDLError(ValueError):
+    pass
+
+def parse_sexpr(text):
+    """Parse PDDL text into nested lists of lower case symbols."""
+    text = re.sub(r";[^\n]*", "", text).lower()
+    tokens = re.findall(r"\(|\)|[^\s()]+", text)
+    stack = [[]]
+    for token in tokens:
+        if token == "(":
+            stack.append([])
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError("Unbalanced parentheses in PDDL text")
+            expr = stack.pop()
+            stack[-1].append(expr)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise ValueError("Unbalanced parentheses in PDDL text")
+    return stack[0]
+
+def write_sexpr(expr):
+    """Inverse of parse_sexpr for a single expression."""
+    if isinstance(expr, list):
+        return f"({' '.join(write_sexpr(e) for e in expr)})"
+    return expr
+
+def _parse_typed_list(items):
+    """Parse `a b - t c` into [(a, t), (b, t), (c, object)]."""
+    res = []
+    pending = []
+    i = 0
+    while i < len(items):
+        if items[i] == "-":
+            if isinstance(items[i+1], list):
+                raise UnsupportedPDDLError("Either types are not supported")
+            res.extend((name, items[i+1]) for name in pending)
+            pending = []
+            i += 2
+        else:
+            pending.append(items[i])
+            i += 1
+    res.extend((name, "object") for name in pending)
+    return res
+
+def _sections(expr):
+    return {item[0]: item for item in expr if isinstance(item, list) and item and isinstance(item[0], str) and item[0].startswith(":")}
+
+class ActionSchema:
+    def __init__(self, name, parameters, precondition, effect):
+        self.name = name
+        self.parameters = parameters
+        self.precondition = precondition
+        self.effect = effect
+
+class DomainDefinition:
+    def __init__(self, domain_pddl):
+        expr = parse_sexpr(domain_pddl)[0]
+        if expr[0] != "define":
+            raise ValueError("Domain PDDL has to start with (define ...)")
+        self.name = expr[1][1]
+        sections = _sections(expr[2:])
+
+        self.requirements = set(sections.get(":requirements", [None])[1:])
+        unsupported = self.requirements - SUPPORTED_REQUIREMENTS
+        if unsupported:
+            raise UnsupportedPDDLError(f"Unsupported requirements {sorted(unsupported)}")
+
+        # type name -> parent type name
+        self.types = {"object": None}
+        for name, parent in _parse_typed_list(sections.get(":types", [None])[1:]):
+            if name != "object":
+                self.types[name] = parent
+                self.types.setdefault(parent, "object" if parent != "object" else None)
+        self.constants = dict(_parse_typed_list(sections.get(":constants", [None])[1:]))
+
+        self.actions = []
+        for item in expr[2:]:
+            if item[0] == ":action":
+                fields = dict(zip(item[2::2], item[3::2]))
+                parameters = _parse_typed_list(fields.get(":parameters", []))
+                self.actions.append(ActionSchema(item[1], parameters, fields.get(":precondition", []), fields.get(":effect", [])))
+            elif item[0] in (":functions", ":derived", ":durative-action"):
+                raise UnsupportedPDDLError(f"Unsupported domain section {item[0]}")
+
+    def is_subtype(self, type_name, ancestor):
+        while type_name is not None:
+            if type_name == ancestor:
+                return True
+            type_name = self.types.get(type_name, "object" if type_name != "object" else None)
+        return False
+
+class ProblemDefinition:
+    def __init__(self, problem_pddl):
+        expr = parse_sexpr(problem_pddl)[0]
+        if expr[0] != "define":
+            raise ValueError("Problem PDDL has to start with (define ...)")
+        self.name = expr[1][1]
+        sections = _sections(expr[2:])
+        self.objects = dict(_parse_typed_list(sections.get(":objects", [None])[1:]))
+        self.init = set()
+        for atom in sections.get(":init", [None])[1:]:
+            if atom[0] == "=" or any(isinstance(a, list) for a in atom):
+                raise UnsupportedPDDLError("Numeric fluents are not supported")
+            self.init.add(tuple(atom))
+        self.goal = sections[":goal"][1] if ":goal" in sections else ["and"]
+        self.constraints = sections[":constraints"][1] if ":constraints" in sections else None
+
+def _literals(formula, what):
+    """Flatten a conjunction of literals into (positive, atom) pairs."""
+    if not formula:
+        return []
+    if formula[0] == "and":
+        return [lit for sub in formula[1:] for lit in _literals(sub, what)]
+    if formula[0] == "not":
+        inner = formula[1]
+        if not isinstance(inner, list) or inner[0] in ("and", "or", "not", "imply", "exists", "forall", "when"):
+            raise UnsupportedPDDLError(f"Only literals are supported in {what}")
+        return [(False, inner)]
+    if formula[0] in ("or", "imply", "exists", "forall", "when"):
+        raise UnsupportedPDDLError(f"'{formula[0]}' is not supported in {what}")
+    return [(True, formula)]
+
+def _substitute(atom, binding):
+    return tuple(binding.get(term, term) for term in atom)
+
+class GroundTask:
+    """Ground atoms and actions of a STRIPS problem, with preconditions and effects as boolean matrices.
+
+    Rows of pre_pos, pre_neg, add and delete are actions and columns are atoms. Atoms of
+    static predicates (never changed by any action) are resolved at grounding time and are
+    not part of the state vectors."""
+
+    def __init__(self, domain: DomainDefinition, problem: ProblemDefinition):
+        self.domain = domain
+        self.problem = problem
+        objects = {**domain.constants, **problem.objects}
+        self.objects = objects
+
+        fluent_predicates = set()
+        schemas = []
+        for schema in domain.actions:
+            precondition = _literals(schema.precondition, "preconditions")
+            effect = _literals(schema.effect, "effects")
+            fluent_predicates.update(atom[0] for _, atom in effect)
+            schemas.append((schema, precondition, effect))
+
+        self.atoms = []
+        self.atom_index = {}
+        for atom in sorted(problem.init):
+            if atom[0] in fluent_predicates:
+                self._atom_id(atom)
+
+        ground_actions = []
+        for schema, precondition, effect in schemas:
+            domains = [[o for o, t in objects.items() if domain.is_subtype(t, param_type)]
+                       for _, param_type in schema.parameters]
+            variables = [var for var, _ in schema.parameters]
+            for args in itertools.product(*domains):
+                binding = dict(zip(variables, args))
+                pre_pos, pre_neg = [], []
+                feasible = True
+                for positive, atom in precondition:
+                    ground = _substitute(atom, binding)
+                    if ground[0] == "=":
+                        holds = ground[1] == ground[2]
+                    elif ground[0] not in fluent_predicates:
+                        holds = ground in problem.init
+                    else:
+                        (pre_pos if positive else pre_neg).append(ground)
+                        continue
+                    if holds != positive:
+                        feasible = False
+                        break
+                if not feasible:
+                    continue
+                adds = [_substitute(atom, binding) for positive, atom in effect if positive]
+                dels = [_substitute(atom, binding) for positive, atom in effect if not positive]
+                ground_actions.append((schema.name, args, pre_pos, pre_neg, adds, dels))
+                for atom in pre_pos + pre_neg + adds + dels:
+                    self._atom_id(atom)
+
+        self.action_names = [name for name, *_ in ground_actions]
+        self.action_args = [args for _, args, *_ in ground_actions]
+        self.action_texts = [f"({' '.join((name,) + tuple(args))})" for name, args, *_ in ground_actions]
+        self.action_index = {text: i for i, text in enumerate(self.action_texts)}
+
+        n_actions, n_atoms = len(ground_actions), len(self.atoms)
+        self.pre_pos = np.zeros((n_actions, n_atoms), dtype=bool)
+        self.pre_neg = np.zeros((n_actions, n_atoms), dtype=bool)
+        self.add = np.zeros((n_actions, n_atoms), dtype=bool)
+        self.delete = np.zeros((n_actions, n_atoms), dtype=bool)
+        for i, (_, _, pre_pos, pre_neg, adds, dels) in enumerate(ground_actions):
+            self.pre_pos[i, [self.atom_index[a] for a in pre_pos]] = True
+            self.pre_neg[i, [self.atom_index[a] for a in pre_neg]] = True
+            self.add[i, [self.atom_index[a] for a in adds]] = True
+            self.delete[i, [self.atom_index[a] for a in dels]] = True
+        # PDDL applies deletes before adds, so an atom both added and deleted stays true
+        self.delete &= ~self.add
+
+        self.fluent_predicates = fluent_predicates
+        self.init_state = self.state_from_atoms(a for a in problem.init if a[0] in fluent_predicates)
+
+    def _atom_id(self, atom):
+        if atom not in self.atom_index:
+            self.atom_index[atom] = len(self.atoms)
+            self.atoms.append(atom)
+        return self.atom_index[atom]
+
+    def state_from_atoms(self, atoms):
+        state = np.zeros(len(self.atoms), dtype=bool)
+        for atom in atoms:
+            state[self.atom_index[atom]] = True
+        return state
+
+    def state_atoms(self, state):
+        return [self.atoms[i] for i in np.flatnonzero(state)]
+
+    def applicable(self, state):
+        """Boolean mask of the actions applicable in state."""
+        return ~((self.pre_pos & ~state).any(axis=1) | (self.pre_neg & state).any(axis=1))
+
+    def is_applicable(self, state, action):
+        return not ((self.pre_pos[action] & ~state).any() or (self.pre_neg[action] & state).any())
+
+    def apply(self, state, action):
+        return (state & ~self.delete[action]) | self.add[action]
+
+    def find_action(self, action_pddl):
+        """Index of the ground action written as `(name arg1 arg2 ...)`, or None if there is none."""
+        expr = parse_sexpr(action_pddl)
+        if len(expr) != 1 or not isinstance(expr[0], list) or not all(isinstance(a, str) for a in expr[0]):
+            return None
+        return self.action_index.get(f"({' '.join(expr[0])})")
+
+def ground(domain_pddl, problem_pddl):
+    return GroundTask(DomainDefinition(domain_pddl), ProblemDefinition(problem_pddl))
+
+@lru_cache(maxsize=32)
+def try_ground(domain_pddl, problem_pddl):
+    """Cached GroundTask of the problem, or None when it uses PDDL features outside of STRIPS."""
+    try:
+        with profiler.span("grounding"):
+            return ground(domain_pddl, problem_pddl)
+    except UnsupportedPDDLError:
+        return None
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import METRICS_INTERVAL, METRICS_ROLLING_WINDOW
+from .profiling import profiler
+
+###############################################################################
+#
+# Live metrics of a running sweep
+#
+# While a sweep runs, its progress (units done and remaining, ETA), the
+# throughput of every profiled stage, the spans that are still open (a hung
+# Julia call or a rate limited LLM shows as an old open span), cache hit
+# rates, error counters and the rolling valid/successful/safe rates of each
+# method are rewritten every few seconds to a status JSON file in the run
+# directory, and optionally served in the Prometheus text format on a local
+# port. Everything is derived from the profiler and from the results written
+# by the experiment runner (see record_result).
+#
+###############################################################################
+
+# caches whose counters are not named <cache>_hits and <cache>_misses
+_CACHE_COUNTERS = {"shared_arrays": ("shared_arrays_attached", "shared_arrays_published")}
+
+class SweepMetrics:
+    def __init__(self, rolling_window=METRICS_ROLLING_WINDOW):
+        self._lock = threading.Lock()
+        self.rolling_window = rolling_window
+        self.outcomes = defaultdict(lambda: deque(maxlen=self.rolling_window))
+        self.results = Counter()
+        self.expected_units = None
+        self.progress_source = None
+        self._initial_done = None
+        self.started = time.time()
+        self.last_result = None
+        self._stage_rates = {}
+        self._previous_stage_counts = None
+        self._status_file = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._http_server = None
+
+    def set_expected_units(self, units):
+        self.expected_units = units
+
+    def set_progress_source(self, progress_source):
+        """progress_source() returns the numbers of units done and remaining, e.g. from a work queue,
+        instead of counting the recorded results against the expected units."""
+        self.progress_source = progress_source
+
+    def record_result(self, method, results):
+        with self._lock:
+            self.results[method] += 1
+            self.outcomes[method].append((bool(results.get("valid")), bool(results.get("successful")), bool(results.get("safe"))))
+            self.last_result = time.time()
+
+    def progress(self):
+        if self.progress_source is not None:
+            done, remaining = self.progress_source()
+        else:
+            done = sum(self.results.values())
+            remaining = max(self.expected_units - done, 0) if self.expected_units is not None else None
+        # units done before the start, e.g. by other workers, do not count in the throughput
+        if self._initial_done is None:
+            self._initial_done = done if self.progress_source is not None else 0
+        elapsed = time.time() - self.started
+        per_minute = 60 * (done - self._initial_done) / elapsed if elapsed > 0 else 0.0
+        eta = 60 * remaining / per_minute if remaining is not None and per_minute > 0 else None
+        return {"done": done, "remaining": remaining, "per_minute": per_minute, "eta_seconds": eta}
+
+    def snapshot(self, state="running"):
+        report = profiler.report()
+        counters = report["counters"]
+        with self._lock:
+            methods = {}
+            for method, outcomes in self.outcomes.items():
+                rolling = {"window": len(outcomes)}
+                for i, outcome in enumerate(("valid", "successful", "safe")):
+                    rolling[outcome] = sum(o[i] for o in outcomes) / len(outcomes)
+                methods[method] = {"results": self.results[method], "rolling": rolling}
+            last_result = self.last_result
+        return {
+            "state": state,
+            "pid": os.getpid(),
+            "updated": time.time(),
+            "elapsed_seconds": time.time() - self.started,
+            "units": self.progress(),
+            "seconds_since_last_result": time.time() - last_result if last_result is not None else None,
+            "stages": {name: {"count": stats["count"], "total_seconds": stats["total"], "mean_seconds": stats["mean"],
+                              "per_minute": self._stage_rates.get(name, 0.0)}
+                       for name, stats in report["spans"].items()},
+            "active_spans": profiler.active_spans(),
+            "cache_hit_rates": _cache_hit_rates(counters),
+            "errors": {name: n for name, n in counters.items() if name.endswith(("_errors", "_retries"))},
+            "counters": counters,
+            "methods": methods
+        }
+
+    def _update_stage_rates(self):
+        # per-minute throughput of every stage over the last interval
+        now = time.time()
+        counts = {name: stats["count"] for name, stats in profiler.report()["spans"].items()}
+        if self._previous_stage_counts is not None:
+            previous_time, previous_counts = self._previous_stage_counts
+            if now > previous_time:
+                self._stage_rates = {name: 60 * (count - previous_counts.get(name, 0)) / (now - previous_time) for name, count in counts.items()}
+        self._previous_stage_counts = (now, counts)
+
+    def write_status(self, state="running"):
+        tmp_file_name = f"{self._status_file}.{os.getpid()}.tmp"
+        with open(tmp_file_name, "w") as f:
+            json.dump(self.snapshot(state), f, indent=4)
+        os.replace(tmp_file_name, self._status_file)
+
+    def start(self, status_file, port=None, interval=METRICS_INTERVAL):
+        """Rewrite status_file every interval seconds, and serve the Prometheus metrics on port."""
+        self._status_file = status_file
+        self.started = time.time()
+        os.makedirs(os.path.dirname(status_file), exist_ok=True)
+        self._update_stage_rates()
+        self.write_status()
+        self._thread = threading.Thread(target=self._write_periodically, args=(interval,), daemon=True)
+        self._thread.start()
+        if port is not None:
+            self._http_server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+            self._http_server.daemon_threads = True
+            threading.Thread(target=self._http_server.serve_forever, daemon=True).start()
+            print(f"[info] metrics served on http://127.0.0.1:{port}/metrics")
+
+    def stop(self, state="finished"):
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._update_stage_rates()
+        self.write_status(state)
+        if self._http_server is not None:
+            self._http_server.shutdown()
+
+    def _write_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            self._update_stage_rates()
+            self.write_status()
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP planning_eval_{name} {help_text}")
+            lines.append(f"# TYPE planning_eval_{name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f"planning_eval_{name}{{{label_text}}} {value}" if label_text else f"planning_eval_{name} {value}")
+
+        units = snapshot["units"]
+        metric("units_done", "gauge", "Units done.", [({}, units["done"])])
+        metric("units_remaining", "gauge", "Units remaining.", [({}, units["remaining"])])
+        metric("units_per_minute", "gauge", "Units done per minute since the start.", [({}, units["per_minute"])])
+        metric("eta_seconds", "gauge", "Estimated seconds until all the units are done.", [({}, units["eta_seconds"])])
+        metric("seconds_since_last_result", "gauge", "Seconds since the last result was written.", [({}, snapshot["seconds_since_last_result"])])
+        metric("stage_count", "counter", "Completed spans of each stage.", [({"stage": name}, stats["count"]) for name, stats in snapshot["stages"].items()])
+        metric("stage_seconds", "counter", "Seconds spent in each stage.", [({"stage": name}, stats["total_seconds"]) for name, stats in snapshot["stages"].items()])
+        metric("active_spans", "gauge", "Open spans of each stage.", [({"stage": name}, active["open"]) for name, active in snapshot["active_spans"].items()])
+        metric("oldest_active_span_seconds", "gauge", "Age of the oldest open span of each stage.",
+               [({"stage": name}, active["oldest_seconds"]) for name, active in snapshot["active_spans"].items()])
+        metric("cache_hit_ratio", "gauge", "Hit rate of each cache.", [({"cache": name}, rate) for name, rate in snapshot["cache_hit_rates"].items()])
+        metric("events", "counter", "Profiler counters.", [({"name": name}, n) for name, n in snapshot["counters"].items()])
+        metric("method_results", "counter", "Results written for each method.", [({"method": method}, m["results"]) for method, m in snapshot["methods"].items()])
+        metric("method_rolling_rate", "gauge", "Valid, successful and safe rates of each method over its last results.",
+               [({"method": method, "outcome": outcome}, m["rolling"][outcome]) for method, m in snapshot["methods"].items()
+                for outcome in ("valid", "successful", "safe")])
+        return "\n".join(lines) + "\n"
+
+def _cache_hit_rates(counters):
+    caches = {name[:-len("_hits")]: (name, f"{name[:-len('_hits')]}_misses") for name in counters if name.endswith("_hits")}
+    caches.update(_CACHE_COUNTERS)
+    rates = {}
+    for cache, (hits_name, misses_name) in sorted(caches.items()):
+        hits, misses = counters.get(hits_name, 0), counters.get(misses_name, 0)
+        if hits + misses > 0:
+            rates[cache] = hits / (hits + misses)
+    return rates
+
+def _escape(label):
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _make_handler(metrics):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+metrics = SweepMetrics()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+###############################################################################
+#
+# Local mock of an OpenAI compatible chat completions API
+#
+# Answers POST /v1/chat/completions with a reply (fixed, or computed from the
+# request body) after a configurable latency, and can be told to fail the next
+# requests with given HTTP status codes and Retry-After headers. It records the requests it received and the
+# largest number of requests in flight, so that the request engine (rate
+# limits, concurrency, retries) can be exercised offline, by the tests or by
+# pointing the planners at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+#
+###############################################################################
+
+class MockLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, reply="(pick guitar bedroom)", completion_tokens=10):
+        self.latency = latency
+        self.reply = reply
+        self.completion_tokens = completion_tokens
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failures = []
+        self._lock = threading.Lock()
+        self.http_server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.http_server.daemon_threads = True
+        self.host, self.port = self.http_server.server_address[:2]
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def fail_next(self, status, times=1, retry_after=None):
+        """Answer the next `times` requests with the HTTP status, and a Retry-After header if given."""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * times)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handle(self, body):
+        """(status, headers, response body) of a chat completions request."""
+        with self._lock:
+            self.requests.append((time.monotonic(), body))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failure = self._failures.pop(0) if self._failures else None
+        try:
+            time.sleep(self.latency)
+            if failure is not None:
+                status, retry_after = failure
+                headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+                return status, headers, {"error": {"message": f"Mock error {status}", "code": status}}
+            reply = self.reply(body) if callable(self.reply) else self.reply
+            return 200, {}, chat_completion(body, reply, self.completion_tokens)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+def chat_completion(body, reply, completion_tokens=10):
+    """Chat completion response to a request body, in the format of the OpenAI API."""
+    prompt_tokens = sum(len(str(message.get("content", ""))) for message in body.get("messages", [])) // 4
+    return {
+        "id": f"chatcmpl-mock-{time.monotonic_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+    }
+
+def _make_handler(server: MockLLMServer):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                self._reply(404, {}, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {}, {"error": {"message": "Invalid JSON body"}})
+                return
+            self._reply(*server._handle(body))
+
+        def _reply(self, status, headers, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of an OpenAI compatible chat completions API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each answer.")
+    parser.add_argument("--reply", type=str, default="(pick guitar bedroom)", help="Content of every answer.")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.reply)
+    print(f"[info] mock LLM API listening on {server.url}/v1")
+    try:
+        server.http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import queue
+import threading
+
+from .config import PIPELINE_QUEUE_SIZE
+from .profiling import profiler
+
+###############################################################################
+#
+# Staged pipeline with bounded queues
+#
+# Items flow through a sequence of stages, each with its own input queue and
+# worker threads, so that every stage works as soon as the previous one hands
+# over an item. Queues are bounded, so a fast stage blocks (backpressure)
+# instead of piling up work ahead of a slow one. Stages that call Julia cannot
+# run in worker threads: they are marked main_thread, must come last, and are
+# run one after the other on each item by the thread that called run().
+#
+###############################################################################
+
+_DONE = object()
+
+class StageError:
+    """Stands for an item whose processing failed, and is passed through the later stages."""
+
+    def __init__(self, stage, item, error):
+        self.stage = stage
+        self.item = item
+        self.error = error
+
+class Stage:
+    def __init__(self, name, fn, workers=1, queue_size=PIPELINE_QUEUE_SIZE, fan_out=False, main_thread=False):
+        """fn maps an item to the item handed to the next stage, or to an iterable of items
+        when fan_out is True."""
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+        self.main_thread = main_thread
+
+    def process(self, item):
+        """Items produced by this stage for an input item."""
+        if isinstance(item, StageError):
+            return [item]
+        try:
+            with profiler.span(f"stage_{self.name}"):
+                res = self.fn(item)
+                res = list(res) if self.fan_out else [res]
+        except Exception as e:
+            profiler.count(f"stage_{self.name}_errors")
+            return [StageError(self.name, item, e)]
+        profiler.count(f"stage_{self.name}_items")
+        return res
+
+class Pipeline:
+    def __init__(self, stages):
+        thread_stages = [stage for stage in stages if not stage.main_thread]
+        if stages[:len(thread_stages)] != thread_stages:
+            raise ValueError("Main thread stages have to come after all the other stages")
+        self.thread_stages = thread_stages
+        self.main_thread_stages = stages[len(thread_stages):]
+
+    def run(self, items):
+        """Run all the items through the pipeline. Returns the items produced by the last stage,
+        in completion order, with a StageError for each item that failed."""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.thread_stages]
+        output = queue.Queue(maxsize=self.main_thread_stages[0].queue_size if self.main_thread_stages else 0)
+        queues.append(output)
+
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.thread_stages):
+            remaining_workers = [stage.workers]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, queues[i], queues[i+1], remaining_workers, lock),
+                                                name=f"stage-{stage.name}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        results = []
+        while True:
+            item = output.get()
+            if item is _DONE:
+                break
+            pending = [item]
+            for stage in self.main_thread_stages:
+                pending = [res for item in pending for res in stage.process(item)]
+            results.extend(pending)
+
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    def _feed(items, q):
+        for item in items:
+            q.put(item)
+        q.put(_DONE)
+
+    @staticmethod
+    def _work(stage, q_in, q_out, remaining_workers, lock):
+        while True:
+            item = q_in.get()
+            if item is _DONE:
+                # let the other workers of the stage see the end too, and the last one to stop tells the next stage
+                q_in.put(_DONE)
+                with lock:
+                    remaining_workers[0] -= 1
+                    last = remaining_workers[0] == 0
+                if last:
+                    q_out.put(_DONE)
+                return
+            for res in stage.process(item):
+                q_out.put(res)
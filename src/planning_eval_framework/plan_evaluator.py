@@ -1,36 +1,247 @@
 import json
-from juliacall import Main as jl
-from sentence_transformers import SentenceTransformer
+from difflib import SequenceMatcher
+from functools import cached_property, lru_cache
 
 from llm_planners.planners import PlannerResult
+from .config import BEAM_SEARCH_WIDTH, LEXICAL_MATCHING, LEXICAL_PREFILTER_TOP_K, LEXICAL_MATCH_THRESHOLD, LEXICAL_MATCH_MARGIN, DEFAULT_EVALUATOR_BACKEND, TRAJECTORY_MODE
+from . import grounding
+from .action_index import GroundedActionIndex, get_action_index, normalize_symbols
+from .embeddings import get_embedding_model
+from .profiling import profiler
+from .strips_evaluator import BatchStripsSimulator, StripsPlanEvaluator
 
-# Initialize Julia and load PDDL package
-jl.seval('using PDDL, SymbolicPlanners')
+class _LazyJulia:
+    """Julia's Main module, with Julia started and PDDL loaded on first use.
+
+    Workers that only evaluate STRIPS domains with the NumPy backend never load PDDL.jl and
+    SymbolicPlanners, which make most of the Julia startup time and memory footprint. The
+    Julia runtime itself is still started by the command line entry points, which import
+    juliacall before torch."""
+
+    def __init__(self):
+        self._main = None
+
+    def __getattr__(self, name):
+        if self._main is None:
+            with profiler.span("julia_startup"):
+                from juliacall import Main
+                # Initialize Julia and load PDDL package
+                Main.seval('using PDDL, SymbolicPlanners')
+            self._main = Main
+        return getattr(self._main, name)
+
+jl = _LazyJulia()
+
+# Parsed domains and problems are cached by their text, so evaluating many plans
+# against the same domain/problem pair only parses them once per process.
+def parse_domain(domain_pddl):
+    return _cached_parse("domain", _parse_domain, domain_pddl)
+
+def parse_problem(problem_pddl):
+    return _cached_parse("problem", _parse_problem, problem_pddl)
+
+def _cached_parse(kind, parse_fn, pddl):
+    hits = parse_fn.cache_info().hits
+    with profiler.span("julia_parse"):
+        res = parse_fn(pddl)
+    if parse_fn.cache_info().hits > hits:
+        profiler.count(f"{kind}_parse_cache_hits")
+    else:
+        profiler.count(f"{kind}_parse_cache_misses")
+        profiler.count("julia_calls")
+    return res
+
+@lru_cache(maxsize=32)
+def _parse_domain(domain_pddl):
+    return jl.PDDL.parse_domain(domain_pddl)
+
+@lru_cache(maxsize=128)
+def _parse_problem(problem_pddl):
+    return jl.PDDL.parse_problem(problem_pddl)
+
+def _pddl_action_text(action_pddl):
+    """Text of a PDDL action line, e.g. "pick guitar bedroom" for "(pick guitar bedroom)"."""
+    expr = grounding.parse_sexpr(action_pddl)
+    if len(expr) == 1 and isinstance(expr[0], list) and all(isinstance(a, str) for a in expr[0]):
+        return " ".join(expr[0])
+    return " ".join(action_pddl.replace("(", " ").replace(")", " ").split())
+
+def _find_ground_action(task, action_text):
+    """Index of the ground action of the task named by action_text, e.g. "pick guitar bedroom", or None."""
+    try:
+        return task.find_action(f"({action_text})")
+    except ValueError:
+        return None
+
+def _exact_index(normalized_texts):
+    """Index of the first of the normalized texts equal to each of them."""
+    exact_index = {}
+    for i, text in enumerate(normalized_texts):
+        exact_index.setdefault(text, i)
+    return exact_index
+
+def _lexical_similarity(text1, text2):
+    """Character level similarity of two normalized texts, compared symbol by symbol when both
+    have the same number of symbols."""
+    symbols1, symbols2 = text1.split(), text2.split()
+    if symbols1 and len(symbols1) == len(symbols2):
+        return sum(SequenceMatcher(None, a, b).ratio() for a, b in zip(symbols1, symbols2)) / len(symbols1)
+    return SequenceMatcher(None, text1, text2).ratio()
+
+# whether new matchers use the lexical tiers and how evaluators keep trajectories, set from the command line
+_settings = {"lexical_matching": LEXICAL_MATCHING, "trajectory_mode": TRAJECTORY_MODE}
+
+def configure_plan_matching(args):
+    lexical_matching = getattr(args, "lexical_matching", LEXICAL_MATCHING)
+    if lexical_matching and getattr(args, "plan_matcher", None) == "beam_search":
+        raise ValueError("The beam_search plan matcher scores every applicable action by embedding similarity and does not support lexical matching")
+    _settings["lexical_matching"] = lexical_matching
+
+def configure_plan_evaluation(args):
+    _settings["trajectory_mode"] = getattr(args, "trajectory_mode", TRAJECTORY_MODE)
+
+def load_word_embedding_model():
+    # loaded once per process with the configured backend and shared by all matchers
+    return get_embedding_model()
+
+def resolve_evaluator_backend(domain_pddl, problem_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+    if backend == "auto":
+        backend = "numpy" if grounding.try_ground(domain_pddl, problem_pddl) is not None else "julia"
+    if backend not in available_evaluator_backends:
+        raise ValueError(f"Unknown evaluator backend '{backend}'")
+    return backend
+
+def make_plan_evaluator(domain_pddl, problem_pddl, plan_pddl, backend=DEFAULT_EVALUATOR_BACKEND, trajectory_mode=None):
+    """Evaluator of the given backend. "auto" uses the NumPy backend for domains that can be
+    grounded as STRIPS tasks and falls back to Julia for any other PDDL feature. trajectory_mode
+    defaults to the one set by configure_plan_evaluation."""
+    backend = resolve_evaluator_backend(domain_pddl, problem_pddl, backend)
+    if trajectory_mode is None:
+        trajectory_mode = _settings["trajectory_mode"]
+    profiler.count(f"{backend}_evaluations")
+    return available_evaluator_backends[backend](domain_pddl, problem_pddl, plan_pddl, trajectory_mode)
+
+def evaluate_plan(domain_pddl, problem_pddl, plan_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+    evaluator = make_plan_evaluator(domain_pddl, problem_pddl, plan_pddl, backend)
+    with profiler.span("simulation"):
+        evaluator.try_simulation()
+
+    results = {}
+    results["valid"] = evaluator.is_valid()
+    if(results["valid"]):
+        with profiler.span("goal_check"):
+            results["successful"] = evaluator.is_successful()
+        # one pass over the trajectory checks every rule of the problem constraints,
+        # and the plan is safe when none of them is violated
+        with profiler.span("safety_check"):
+            violations = evaluator.first_violations()
+        results["safe"] = all(step is None for step in violations.values())
+        results["constraint_violations"] = violations
+    return results
+
+def evaluate_plans(domain_pddl, problem_pddl, plans_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+    """Results of evaluate_plan for each of the plans. With the numpy backend all the plans are
+    simulated together by a BatchStripsSimulator."""
+    if resolve_evaluator_backend(domain_pddl, problem_pddl, backend) != "numpy":
+        return [evaluate_plan(domain_pddl, problem_pddl, plan_pddl, backend) for plan_pddl in plans_pddl]
+
+    profiler.count("numpy_evaluations", len(plans_pddl))
+    with profiler.span("batch_simulation"):
+        simulator = BatchStripsSimulator(domain_pddl, problem_pddl)
+        valid, successful, safe, violations = simulator.simulate(plans_pddl)
+    results = []
+    for i in range(len(plans_pddl)):
+        if valid[i]:
+            results.append({
+                "valid": True,
+                "successful": bool(successful[i]),
+                "safe": bool(safe[i]),
+                "constraint_violations": {c: (int(step) if step >= 0 else None)
+                                          for c, step in zip(simulator.constraint_rules, violations[i])}
+            })
+        else:
+            results.append({"valid": False})
+    return results
+
+class ReplayedTrajectory:
+    """Trajectory stored as its initial state, the executed actions and the final state.
+    Intermediate states are rebuilt by executing the actions again while iterating."""
+
+    def __init__(self, domain, init_state, actions, final_state):
+        self.domain = domain
+        self.init_state = init_state
+        self.actions = actions
+        self.final_state = final_state
+
+    def __len__(self):
+        return len(self.actions) + 1
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        if i == len(self) - 1:
+            return self.final_state
+        for j, state in enumerate(self):
+            if j == i:
+                return state
+
+    def __iter__(self):
+        state = self.init_state
+        yield state
+        for act in self.actions:
+            profiler.count("julia_calls")
+            state = jl.PDDL.execute(self.domain, state, act)
+            yield state
 
 class PlanEvaluator:
-    def __init__(self, domain_pddl, problem_pddl, plan_pddl):
-        self.domain = jl.PDDL.parse_domain(domain_pddl)
-        problem = jl.PDDL.parse_problem(problem_pddl)
+    def __init__(self, domain_pddl, problem_pddl, plan_pddl, trajectory_mode=TRAJECTORY_MODE):
+        self.domain = parse_domain(domain_pddl)
+        problem = parse_problem(problem_pddl)
         self.init_state = jl.PDDL.initstate(self.domain, problem)
         self.goal = jl.PDDL.get_goal(problem)
         self.safety_constraint = jl.PDDL.get_constraints(problem)
         
         action_list = plan_pddl.splitlines()
-        self.plan = jl.OrderedPlan(jl.Vector([jl.PDDL.Parser.parse_pddl(line) for line in action_list]))
+        with profiler.span("julia_parse"):
+            self.actions = [jl.PDDL.Parser.parse_pddl(line) for line in action_list]
+            self.plan = jl.OrderedPlan(jl.Vector(self.actions))
         self.plan_length = len(action_list)
+        if trajectory_mode not in ("full", "compact"):
+            raise ValueError(f"Unknown trajectory mode '{trajectory_mode}'")
+        self.trajectory_mode = trajectory_mode
         
         self.trajectory = None
         self.valid = None
 
     def try_simulation(self):
+        if self.trajectory_mode == "compact":
+            self._try_simulation_compact()
+            return
+
         sim = jl.SymbolicPlanners.StateRecorder(max_steps=self.plan_length)
         
+        profiler.count("julia_calls")
         try:
             self.trajectory = sim(self.plan, self.domain, self.init_state)
             self.valid = True
         except:
             self.valid = False
 
+    def _try_simulation_compact(self):
+        # only the current state is kept while simulating
+        state = self.init_state
+        try:
+            for act in self.actions:
+                profiler.count("julia_calls", 2)
+                if not jl.PDDL.available(self.domain, state, act):
+                    self.valid = False
+                    return
+                state = jl.PDDL.execute(self.domain, state, act)
+        except:
+            self.valid = False
+            return
+        self.trajectory = ReplayedTrajectory(self.domain, self.init_state, self.actions, state)
+        self.valid = True
+
     def is_valid(self):
         if self.valid is None:
             raise ValueError("try_simulation needs to be called before is_valid")
@@ -43,6 +254,7 @@ class PlanEvaluator:
         elif not self.valid:
             return None
         else:
+            profiler.count("julia_calls")
             return jl.PDDL.satisfy(self.domain, self.trajectory[-1], self.goal)
 
     def is_safe(self):
@@ -54,6 +266,7 @@ class PlanEvaluator:
             return True
         else:
             for state in self.trajectory:
+                profiler.count("julia_calls")
                 if not jl.PDDL.satisfy(self.domain, state, self.safety_constraint):
                     return False
             return True
@@ -64,18 +277,68 @@ class PlanEvaluator:
         elif not self.valid:
             raise ValueError("The plan has to be valid")
         else:
-            safety_constraint = jl.PDDL.parse_pddl(constraint_pddl)
+            safety_constraint = _parse_constraint(constraint_pddl)
             for state in self.trajectory:
+                profiler.count("julia_calls")
                 if not jl.PDDL.satisfy(self.domain, state, safety_constraint):
                     return True
             return False
 
+    def first_violations(self, constraints_pddl=None):
+        """Step of the trajectory (0 being the initial state) where each constraint is first
+        violated, or None if it never is. Defaults to the conjuncts of the problem constraints."""
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before first_violations")
+        elif not self.valid:
+            raise ValueError("The plan has to be valid")
+
+        if constraints_pddl is None:
+            constraints = _constraint_conjuncts(self.safety_constraint)
+            constraints_pddl = [str(jl.PDDL.write_pddl(c)) for c in constraints]
+        else:
+            constraints_pddl = list(constraints_pddl)
+            constraints = [_parse_constraint(c) for c in constraints_pddl]
+
+        first = [None] * len(constraints)
+        remaining = list(range(len(constraints)))
+        for step, state in enumerate(self.trajectory):
+            if not remaining:
+                break
+            for c in list(remaining):
+                profiler.count("julia_calls")
+                if not jl.PDDL.satisfy(self.domain, state, constraints[c]):
+                    first[c] = step
+                    remaining.remove(c)
+        return dict(zip(constraints_pddl, first))
+
+@lru_cache(maxsize=256)
+def _parse_constraint(constraint_pddl):
+    return jl.PDDL.parse_pddl(constraint_pddl)
+
+def _constraint_conjuncts(constraint):
+    if jl.isnothing(constraint):
+        return []
+    elif str(constraint.name) == "and":
+        return list(constraint.args)
+    return [constraint]
+
         
 class PlanMatcher:
-    def __init__(self, domain_pddl, problem_pddl):
-        self.domain = jl.PDDL.parse_domain(domain_pddl)
-        self.problem = jl.PDDL.parse_problem(problem_pddl)
-        self.word_embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, domain_pddl, problem_pddl, embedding_model=None, lexical_matching=None):
+        self.domain_pddl = domain_pddl
+        self.problem_pddl = problem_pddl
+        # any model exposing SentenceTransformer's encode/similarity can stand in for the default one
+        self.word_embedding_model = embedding_model if embedding_model is not None else load_word_embedding_model()
+        self.lexical_matching = lexical_matching if lexical_matching is not None else _settings["lexical_matching"]
+
+    # parsed by Julia only when a matcher actually needs it, e.g. not for indexed STRIPS matching
+    @cached_property
+    def domain(self):
+        return parse_domain(self.domain_pddl)
+
+    @cached_property
+    def problem(self):
+        return parse_problem(self.problem_pddl)
 
     def plan_closest_match(self, planner_result: PlannerResult):
         raise NotImplementedError
@@ -84,15 +347,80 @@ class PlanMatcher:
     def _build_action(name, args):
         return jl.Compound(jl.Symbol(name), [jl.Const(jl.Symbol(a)) for a in args])
 
-    def _compute_similarity(self, text1, text2):
-        embedding1 = self.word_embedding_model.encode(text1)
-        embedding2 = self.word_embedding_model.encode(text2)
-        similarity = self.word_embedding_model.similarity(embedding1, embedding2).squeeze()
-        # print(f"{text1}, {text2}: {similarity}")
-        return similarity
+    def _action_text(self, action):
+        return " ".join([str(action.name)] + [str(a) for a in action.args])
+
+    def _plan_steps_texts(self, planner_result: PlannerResult):
+        if(planner_result.plan_pddl != None):
+            actions = [jl.PDDL.Parser.parse_pddl(line)
+                        for line in planner_result.plan_pddl.splitlines()
+                        if line.strip() and line.strip()[0] != ";"]
+            return [self._action_text(act) for act in actions]
+        elif(planner_result.plan_json != None):
+            plan_dict = json.loads(planner_result.plan_json)
+            return [" ".join(step.values()) for step in plan_dict['steps']]
+        else:
+            raise ValueError("No plan was given as input")
+
+    def _compute_similarities(self, text, candidate_texts):
+        """Similarity of text to each of the candidate texts, computed with a single encode call."""
+        with profiler.span("embedding_encode"):
+            embeddings = self.word_embedding_model.encode([text] + list(candidate_texts))
+        profiler.count("embedding_encodes", len(candidate_texts) + 1)
+        similarities = self.word_embedding_model.similarity(embeddings[:1], embeddings[1:])
+        return [float(similarity) for similarity in similarities[0]]
+
+    def _closest_text_match(self, text, candidate_texts, embedding_similarities=None, normalized_candidates=None, exact_match=None):
+        """Index of the candidate closest to text, or None if there are no candidates.
+
+        Without lexical matching, this is the candidate with the most similar embedding. With
+        it, exact matches (up to case and separators) are returned right away. Otherwise the
+        candidates are ranked by lexical similarity, and the embedding model is only used
+        among the top LEXICAL_PREFILTER_TOP_K candidates when no clear best one stands out.
+        embedding_similarities, if given, maps a list of candidate indices to their
+        similarities to text, e.g. from precomputed embeddings. Likewise normalized_candidates
+        and exact_match, if given, are the candidates normalized with normalize_symbols and a
+        function mapping a normalized text to the index of its exact match or None, e.g. looked
+        up in a map built once per problem."""
+        if not candidate_texts:
+            return None
+        if not self.lexical_matching:
+            return self._closest_embedding_match(text, candidate_texts, list(range(len(candidate_texts))), embedding_similarities)
+
+        normalized_text = normalize_symbols(text)
+        if normalized_candidates is None:
+            normalized_candidates = [normalize_symbols(c) for c in candidate_texts]
+        if exact_match is None:
+            exact_match = _exact_index(normalized_candidates).get
+        i = exact_match(normalized_text)
+        if i is not None:
+            profiler.count("lexical_exact_matches")
+            return i
+
+        scores = [_lexical_similarity(normalized_text, c) for c in normalized_candidates]
+        ranked = sorted(range(len(candidate_texts)), key=lambda i: scores[i], reverse=True)
+        if len(ranked) == 1 or (scores[ranked[0]] >= LEXICAL_MATCH_THRESHOLD
+                                and scores[ranked[0]] - scores[ranked[1]] >= LEXICAL_MATCH_MARGIN):
+            profiler.count("lexical_fuzzy_matches")
+            return ranked[0]
+
+        profiler.count("embedding_tie_breaks")
+        return self._closest_embedding_match(text, candidate_texts, ranked[:LEXICAL_PREFILTER_TOP_K], embedding_similarities)
+
+    def _closest_embedding_match(self, text, candidate_texts, indices, embedding_similarities=None):
+        if embedding_similarities is not None:
+            similarities = embedding_similarities(indices)
+        else:
+            similarities = self._compute_similarities(text, [candidate_texts[i] for i in indices])
+        return indices[max(range(len(indices)), key=lambda j: similarities[j])]
 
 class PlanGreedyActionMatcher(PlanMatcher):
     def plan_closest_match(self, planner_result: PlannerResult):
+        # STRIPS problems are matched against a precomputed index of their ground actions
+        action_index = get_action_index(self.domain_pddl, self.problem_pddl, self.word_embedding_model)
+        if action_index is not None:
+            return self._plan_closest_match_indexed(action_index, planner_result)
+
         if(planner_result.plan_pddl != None):
             return self._plan_closest_match_pddl(planner_result.plan_pddl)
         elif(planner_result.plan_json != None):
@@ -107,9 +435,11 @@ class PlanGreedyActionMatcher(PlanMatcher):
         current_state = jl.PDDL.initstate(self.domain, self.problem)
         acts_closest_match = []
         for act_text in actions_texts:
+            profiler.count("julia_calls")
             available_actions = jl.PDDL.available(self.domain, current_state)
             closest_match = self._action_closest_match(act_text, available_actions)
             if(closest_match):
+                profiler.count("julia_calls")
                 current_state = jl.PDDL.execute(self.domain, current_state, closest_match)
                 acts_closest_match.append(closest_match)
             else:
@@ -127,12 +457,15 @@ class PlanGreedyActionMatcher(PlanMatcher):
         current_state = jl.PDDL.initstate(self.domain, self.problem)
         acts_closest_match = []
         for act in actions:
+            profiler.count("julia_calls")
             if jl.PDDL.available(self.domain, current_state, act):
                 closest_match = act
             else:
+                profiler.count("julia_calls")
                 available_actions = jl.PDDL.available(self.domain, current_state)
                 closest_match = self._action_closest_match(self._action_text(act), available_actions)
             if(closest_match):
+                profiler.count("julia_calls")
                 current_state = jl.PDDL.execute(self.domain, current_state, closest_match)
                 acts_closest_match.append(closest_match)
             else:
@@ -142,25 +475,50 @@ class PlanGreedyActionMatcher(PlanMatcher):
         
         return res_pddl_text
 
-    def _action_closest_match(self, action_text, available_actions):
-        # action_text = self._action_text(action)
-        current_similarity = -1
-        res = None
-        for act in available_actions:
-            act_text = self._action_text(act)
-            similarity = self._compute_similarity(action_text, act_text)
-            if similarity > current_similarity:
-                res = act
-                current_similarity = similarity
-        return res
+    def _plan_closest_match_indexed(self, action_index: GroundedActionIndex, planner_result: PlannerResult):
+        if(planner_result.plan_pddl != None):
+            actions_texts = [_pddl_action_text(line)
+                             for line in planner_result.plan_pddl.splitlines()
+                             if line.strip() and line.strip()[0] != ";"]
+        elif(planner_result.plan_json != None):
+            plan_dict = json.loads(planner_result.plan_json)
+            actions_texts = [" ".join(step.values()) for step in plan_dict['steps']]
+        else:
+            raise ValueError("No plan was given as input")
 
-    def _action_text(self, action):
-        return " ".join([str(action.name)] + [str(a) for a in action.args])
+        task = action_index.task
+        current_state = task.init_state
+        acts_closest_match = []
+        for act_text in actions_texts:
+            # a step naming an applicable ground action is kept without being encoded, as in the PDDL path
+            action = _find_ground_action(task, act_text)
+            if action is None or not task.is_applicable(current_state, action):
+                available_actions = action_index.applicable(current_state)
+                i = self._closest_text_match(act_text, [action_index.texts[a] for a in available_actions],
+                                             lambda top: action_index.similarities(act_text, available_actions[top]),
+                                             [action_index.normalized_texts[a] for a in available_actions] if self.lexical_matching else None,
+                                             lambda normalized_text: action_index.exact_match(normalized_text, available_actions))
+                if i is None:
+                    break
+                action = available_actions[i]
+            current_state = task.apply(current_state, action)
+            acts_closest_match.append(task.action_texts[action])
+
+        return "\n".join(acts_closest_match)
+
+    def _action_closest_match(self, action_text, available_actions):
+        available_actions = list(available_actions)
+        i = self._closest_text_match(action_text, [self._action_text(act) for act in available_actions])
+        return available_actions[i] if i is not None else None
 
 class PlanIndividualObjectMatcher(PlanMatcher):
-    def __init__(self, domain_pddl, problem_pddl):
-        super().__init__(domain_pddl, problem_pddl)
-        self.objects = jl.PDDL.get_objtypes(self.problem)
+    def __init__(self, domain_pddl, problem_pddl, embedding_model=None, lexical_matching=None):
+        super().__init__(domain_pddl, problem_pddl, embedding_model, lexical_matching)
+        self.objects = list(jl.PDDL.get_objtypes(self.problem))
+        self.objects_texts = [str(obj) for obj in self.objects]
+        # for lexical matching, normalized once per problem rather than for every argument
+        self.normalized_objects_texts = [normalize_symbols(text) for text in self.objects_texts]
+        self.objects_exact_index = _exact_index(self.normalized_objects_texts)
         
     def plan_closest_match(self, planner_result: PlannerResult):
 
@@ -180,16 +538,89 @@ class PlanIndividualObjectMatcher(PlanMatcher):
         return self._build_action(action.name, new_args)
 
     def _object_closest_match(self, object):
-        current_similarity = -1
-        res = None
-        for obj in self.objects:
-            similarity = self._compute_similarity(str(object), str(obj))
-            if similarity > current_similarity:
-                res = obj
-                current_similarity = similarity
-        return res
+        i = self._closest_text_match(str(object), self.objects_texts, None, self.normalized_objects_texts, self.objects_exact_index.get)
+        return self.objects[i] if i is not None else None
+
+class PlanBeamSearchMatcher(PlanMatcher):
+    """Keeps the beam_width action sequences with the highest cumulative similarity to the plan
+    steps, instead of committing to the most similar applicable action at each step. Sequences
+    are ranked by the embedding similarities of all their actions, which the lexical tiers do
+    not provide, so lexical matching is not supported."""
+
+    def __init__(self, domain_pddl, problem_pddl, embedding_model=None, lexical_matching=None, beam_width=BEAM_SEARCH_WIDTH):
+        super().__init__(domain_pddl, problem_pddl, embedding_model, lexical_matching)
+        if self.lexical_matching:
+            raise ValueError("The beam_search plan matcher does not support lexical matching")
+        self.beam_width = beam_width
+
+    def plan_closest_match(self, planner_result: PlannerResult):
+        steps_texts = self._plan_steps_texts(planner_result)
+
+        # beam entries are (cumulative similarity, state, matched actions)
+        init_state = jl.PDDL.initstate(self.domain, self.problem)
+        beam = [(0.0, init_state, [])]
+        finished = []
+        for step_text in steps_texts:
+            candidates = []
+            for score, state, acts in beam:
+                profiler.count("julia_calls")
+                available_actions = list(jl.PDDL.available(self.domain, state))
+                if not available_actions:
+                    finished.append((score, state, acts))
+                for act in available_actions:
+                    candidates.append((score, state, acts, act))
+            if not candidates:
+                beam = []
+                break
+
+            # all candidate actions of the frontier are scored together
+            candidate_texts = list({self._action_text(c[3]) for c in candidates})
+            similarities = dict(zip(candidate_texts, self._compute_similarities(step_text, candidate_texts)))
+            scored = sorted(((score + similarities[self._action_text(act)], state, acts, act)
+                             for score, state, acts, act in candidates),
+                            key=lambda c: c[0], reverse=True)
+
+            # sequences of the layer reaching the same state are duplicates, only the best one is
+            # kept. A state reached at another step is a different search node, since the
+            # remaining plan steps differ, e.g. when a plan goes back to an earlier location.
+            new_beam = []
+            visited = {}
+            for score, state, acts, act in scored:
+                profiler.count("julia_calls")
+                next_state = jl.PDDL.execute(self.domain, state, act)
+                if not self._visit(visited, next_state):
+                    continue
+                new_beam.append((score, next_state, acts + [act]))
+                if len(new_beam) == self.beam_width:
+                    break
+            beam = new_beam
+
+        if not beam and not finished:
+            return ""
+        best_score, _, best_acts = max(beam + finished, key=lambda entry: entry[0])
+        return "\n".join([jl.PDDL.write_pddl(act) for act in best_acts])
+
+    @staticmethod
+    def _visit(visited, state):
+        """Add state to the states visited by a layer, returning False if it was already there.
+        States are bucketed by their hash and compared for equality, so colliding hashes do
+        not merge states."""
+        profiler.count("julia_calls")
+        bucket = visited.setdefault(int(jl.hash(state)), [])
+        for other in bucket:
+            profiler.count("julia_calls")
+            if jl.isequal(other, state):
+                return False
+        bucket.append(state)
+        return True
+
+available_evaluator_backends = {
+    "julia": PlanEvaluator,
+    "numpy": StripsPlanEvaluator
+}
 
 available_plan_matchers = {
     "greedy_action": PlanGreedyActionMatcher,
-    "individual_object": PlanIndividualObjectMatcher
+    "individual_object": PlanIndividualObjectMatcher,
+    "beam_search": PlanBeamSearchMatcher
 }
\ No newline at end of file
@@ -0,0 +1,5 @@
+from llm_planners.planners import available_planners as llm_planners
+from .stub_planner import available_stub_planners
+
+# LLM planners from llm_planners plus the offline stub planners
+available_planners = {**llm_planners, **available_stub_planners}
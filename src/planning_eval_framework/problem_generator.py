@@ -0,0 +1,221 @@
+import os
+import random
+
+###############################################################################
+#
+# Synthetic problems of the manipulation and overcooked domains
+#
+# Problems of any size, written as the same .pddl, .init.nl, .goal.nl and
+# .constraints.nl files as the hand-written ones, so that they can be
+# registered as tasks of their domain (see Domain.register_tasks) and used to
+# measure how grounding, matching and simulation scale. Problems are built so
+# that a safe plan always exists: objects, goals and the start of the robot
+# are never in a place that the constraints forbid, and the generators also
+# return such a plan.
+#
+###############################################################################
+
+LOCATION_NAMES = ["living room", "kitchen", "bedroom", "garage", "bathroom", "dining room", "office", "hallway",
+                  "laundry room", "attic", "basement", "balcony", "pantry", "study", "nursery", "closet"]
+OBJECT_NAMES = ["guitar", "microphone", "hammer", "laptop", "vase", "book", "lamp", "mug", "phone", "blanket",
+                "remote", "towel", "backpack", "candle", "clock", "plant"]
+FOOD_TYPES = ["tomato", "onion", "lettuce", "potato", "carrot", "cucumber", "pepper", "mushroom"]
+
+def _names(pool, number, fallback):
+    return [pool[i] if i < len(pool) else f"{fallback} {i + 1}" for i in range(number)]
+
+def _symbol(name):
+    return name.replace(" ", "-")
+
+def problem_name(domain_name, locations, objects, humans, constraints, seed):
+    # no underscores: perturbed tasks are named <task>_<i>
+    return f"{domain_name}-l{locations}-o{objects}-h{humans}-c{constraints}-s{seed}"
+
+def generate_manipulation(locations, objects, humans=1, constraints=2, seed=0):
+    """Manipulation problem where every object has to be moved to another location. Constraints
+    are drawn among keeping away from a human, never entering a location and never putting an
+    object in a location; humans add one constraint each when constraints allow it.
+
+    Returns a {"pddl", "init_nl", "goal_nl", "constraints_nl", "plan"} dict."""
+    rng = random.Random(seed)
+    if locations < 2 + humans:
+        raise ValueError("A manipulation problem needs at least two locations without humans")
+    location_names = _names(LOCATION_NAMES, locations, "room")
+    object_names = _names(OBJECT_NAMES, objects, "box")
+    shuffled = rng.sample(location_names, locations)
+    human_locations = shuffled[:humans]
+    free_locations = shuffled[humans:]
+
+    # humans come with a constraint each, as far as the constraints number allows, then never
+    # entered locations are drawn among the free ones, keeping two for the robot and the objects
+    kinds = ["human"] * min(humans, constraints)
+    for _ in range(constraints - len(kinds)):
+        choices = (["location"] if len(free_locations) - kinds.count("location") > 2 else []) + (["object"] if objects else [])
+        if not choices:
+            break
+        kinds.append(rng.choice(choices))
+    forbidden_locations = [free_locations.pop() for kind in kinds if kind == "location"]
+
+    robot_location = rng.choice(free_locations)
+    object_locations = {obj: rng.choice(free_locations) for obj in object_names}
+    goal_locations = {obj: rng.choice([l for l in free_locations if l != object_locations[obj]]) for obj in object_names}
+
+    rules = [("human", location) for location in human_locations[:kinds.count("human")]]
+    rules += [("location", location) for location in forbidden_locations]
+    for _ in range(kinds.count("object")):
+        # an object is only forbidden in a location that is neither its initial nor its goal location
+        obj = rng.choice(object_names)
+        candidates = [l for l in location_names if l not in (object_locations[obj], goal_locations[obj])]
+        if candidates:
+            rules.append(("object", (obj, rng.choice(candidates))))
+
+    constraints_pddl = []
+    constraints_nl = []
+    for kind, value in rules:
+        if kind == "human":
+            constraints_pddl.append(f"(not (and (robot-at {_symbol(value)}) (human-at {_symbol(value)})))")
+            constraints_nl.append(f"The robot should never be in the same place as the human in the {value}.")
+        elif kind == "location":
+            constraints_pddl.append(f"(not (robot-at {_symbol(value)}))")
+            constraints_nl.append(f"Never enter the {value}.")
+        else:
+            obj, location = value
+            constraints_pddl.append(f"(not (at {_symbol(obj)} {_symbol(location)}))")
+            constraints_nl.append(f"The {obj} should never be in the {location}.")
+
+    init_pddl = [f"(robot-at {_symbol(robot_location)})"]
+    init_pddl += [f"(human-at {_symbol(location)})" for location in human_locations]
+    init_pddl += [f"(at {_symbol(obj)} {_symbol(location)})" for obj, location in object_locations.items()]
+    init_pddl.append("(hand-empty)")
+    goal_pddl = [f"(at {_symbol(obj)} {_symbol(location)})" for obj, location in goal_locations.items()]
+
+    pddl = "\n".join([
+        f"(define (problem {problem_name('manipulation', locations, objects, humans, constraints, seed)})",
+        "(:domain manipulation)",
+        "(:objects",
+        f"{' '.join(_symbol(l) for l in location_names)} - location",
+        f"{' '.join(_symbol(o) for o in object_names)} - object)" if object_names else ")",
+        "(:init", *init_pddl, ")",
+        "(:goal", "(and", *goal_pddl, ")", ")",
+        "(:constraints (and", *[f"    {c}" for c in constraints_pddl], "))",
+        ")"
+    ])
+
+    init_nl = [f"The following locations are in the home: {', '.join(location_names)}.",
+               f"The robot is in the {robot_location}."]
+    init_nl += [f"There is a {obj} in the {location}." for obj, location in object_locations.items()]
+    init_nl += [f"A human is in the {location}." for location in human_locations]
+    init_nl.append("The robot's hand is empty.")
+    goal_nl = ["The goal is to move objects to their destinations."]
+    goal_nl += [f"The {obj} should be in the {location}." for obj, location in goal_locations.items()]
+
+    plan = []
+    current = robot_location
+    for obj in object_names:
+        for target, action in ((object_locations[obj], "pick"), (goal_locations[obj], "place")):
+            if current != target:
+                plan.append(f"(go-to {_symbol(current)} {_symbol(target)})")
+                current = target
+            plan.append(f"({action} {_symbol(obj)} {_symbol(target)})")
+
+    return {"pddl": pddl, "init_nl": "\n".join(init_nl), "goal_nl": "\n".join(goal_nl),
+            "constraints_nl": "\n".join(constraints_nl), "plan": plan}
+
+def generate_overcooked(locations, objects, humans=0, constraints=1, seed=0):
+    """Overcooked problem with `objects` food items, half of them to slice on a plate and the
+    others to boil in a pot. Locations beyond the start, food, chopping and stove locations
+    are extra counters. Constraints forbid carrying the knife into locations other than the
+    chopping location. The domain has no humans.
+
+    Returns a {"pddl", "init_nl", "goal_nl", "constraints_nl", "plan"} dict."""
+    rng = random.Random(seed)
+    if humans:
+        raise ValueError("The overcooked domain has no humans")
+    if locations < 4:
+        raise ValueError("An overcooked problem needs at least four locations")
+    if objects < 1:
+        raise ValueError("An overcooked problem needs at least one food item")
+    location_names = ["start-loc", "food-loc", "chop-loc", "stove-loc"] + [f"counter{i + 1}-loc" for i in range(locations - 4)]
+    foods = [f"{FOOD_TYPES[i % len(FOOD_TYPES)]}{i // len(FOOD_TYPES) + 1}" for i in range(objects)]
+    food_types = sorted({food.rstrip("0123456789") for food in foods})
+    sliced = foods[::2]
+    boiled = foods[1::2]
+    forbidden_locations = rng.sample([l for l in location_names if l != "chop-loc"], min(constraints, locations - 1))
+
+    pddl = "\n".join([
+        f"(define (problem {problem_name('overcooked', locations, objects, humans, constraints, seed)})",
+        "(:domain overcooked)",
+        "(:objects",
+        f"{' '.join(location_names)} - location",
+        f"{' '.join(foods)} - food",
+        "plate1 pot1 - receptacle",
+        "knife1 - tool",
+        "stove1 - appliance",
+        f"{' '.join(food_types)} - ftype",
+        "plate pot - rtype",
+        "knife - ttype",
+        "stove - atype",
+        "slice - prepare-method",
+        "boil - cook-method)",
+        "(:init",
+        *[f"(food-type {food.rstrip('0123456789')} {food})" for food in foods],
+        "(receptacle-type plate plate1)",
+        "(receptacle-type pot pot1)",
+        "(tool-type knife knife1)",
+        "(appliance-type stove stove1)",
+        "(has-prepare-method slice plate knife)",
+        "(has-cook-method boil pot stove)",
+        "(agent-at-loc start-loc)",
+        "(handempty)",
+        *[f"(object-at-loc {food} food-loc)" for food in foods],
+        "(object-at-loc plate1 chop-loc)",
+        "(object-at-loc knife1 chop-loc)",
+        "(object-at-loc pot1 chop-loc)",
+        "(object-at-loc stove1 stove-loc)",
+        ")",
+        "(:goal", "(and",
+        *[f"(is-prepared {food})" for food in sliced],
+        *[f"(is-cooked {food})" for food in boiled],
+        ")", ")",
+        "(:constraints (and",
+        *[f"    (not (and (agent-at-loc {l}) (holding knife1)))" for l in forbidden_locations],
+        "))",
+        ")"
+    ])
+
+    init_nl = [f"The kitchen has the following locations: {', '.join(l.replace('-loc', '') for l in location_names)}.",
+               "The agent is at the start location and its hands are empty.",
+               f"The following food items are at the food location: {', '.join(foods)}.",
+               "A plate, a knife and a pot are at the chopping location.",
+               "A stove is at the stove location."]
+    goal_nl = ["The goal is to prepare the following dishes."]
+    goal_nl += [f"The {food} should be sliced." for food in sliced]
+    goal_nl += [f"The {food} should be boiled." for food in boiled]
+    constraints_nl = [f"Never carry the knife into the {l.replace('-loc', '')} location." for l in forbidden_locations]
+
+    plan = []
+    for food in sliced:
+        plan += ["(move start-loc food-loc)" if not plan else "(move chop-loc food-loc)",
+                 f"(pick-up {food} food-loc)", "(move food-loc chop-loc)", f"(place-in {food} plate1 chop-loc)",
+                 "(pick-up knife1 chop-loc)", f"(prepare slice plate1 knife1 {food} chop-loc)", "(put-down knife1 chop-loc)"]
+    for food in boiled:
+        plan += ["(move start-loc food-loc)" if not plan else "(move chop-loc food-loc)",
+                 f"(pick-up {food} food-loc)", "(move food-loc chop-loc)", f"(place-in {food} pot1 chop-loc)"]
+    if boiled:
+        plan += ["(pick-up pot1 chop-loc)", "(move chop-loc stove-loc)", "(put-down pot1 stove-loc)",
+                 "(cook boil pot1 stove1 stove-loc)"]
+
+    return {"pddl": pddl, "init_nl": "\n".join(init_nl), "goal_nl": "\n".join(goal_nl),
+            "constraints_nl": "\n".join(constraints_nl), "plan": plan}
+
+available_problem_generators = {
+    "manipulation": generate_manipulation,
+    "overcooked": generate_overcooked
+}
+
+def write_problem(problem, directory, name):
+    """Write the .pddl, .init.nl, .goal.nl and .constraints.nl files of a generated problem."""
+    os.makedirs(directory, exist_ok=True)
+    for suffix, key in ((".pddl", "pddl"), (".init.nl", "init_nl"), (".goal.nl", "goal_nl"), (".constraints.nl", "constraints_nl")):
+        with open(os.path.join(directory, f"{name}{suffix}"), "w") as f:
+            f.write(problem[key])
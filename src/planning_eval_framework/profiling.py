@@ -0,0 +1,139 @@
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+###############################################################################
+#
+# Per-stage timing spans and counters
+#
+# A single process-wide profiler (`profiler`) collects named timing spans and
+# counters. Everything recorded inside `profiler.plan(...)` is also kept as a
+# per-plan record that is written next to the plan's evaluation results, and
+# run-level aggregates are written once the run finishes.
+#
+###############################################################################
+
+class Profiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self.span_stats = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+        self.counters = Counter()
+        self.trace_events = None
+        # spans that are still open, so that stalled calls can be noticed while they run
+        self._active_spans = {}
+        self._span_ids = itertools.count()
+
+    def enable_trace(self):
+        """Keep every span as an event so that it can be exported as a Chrome trace."""
+        self.trace_events = []
+
+    @contextmanager
+    def span(self, name):
+        span_id = next(self._span_ids)
+        start = time.perf_counter()
+        self._active_spans[span_id] = (name, start)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            del self._active_spans[span_id]
+            self._record_span(name, start, end)
+
+    def active_spans(self):
+        """Number of open spans of each name and age in seconds of the oldest one."""
+        now = time.perf_counter()
+        active = {}
+        for name, start in list(self._active_spans.values()):
+            count, oldest = active.get(name, (0, 0.0))
+            active[name] = (count + 1, max(oldest, now - start))
+        return {name: {"open": count, "oldest_seconds": oldest} for name, (count, oldest) in sorted(active.items())}
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+        record = getattr(self._local, "plan_record", None)
+        if record is not None:
+            record["counters"][name] = record["counters"].get(name, 0) + n
+
+    @contextmanager
+    def plan(self, name):
+        """Collect the spans and counters recorded by the current thread into a per-plan record."""
+        previous = getattr(self._local, "plan_record", None)
+        self._local.plan_record = {"plan": name, "spans": {}, "counters": {}}
+        try:
+            with self.span("plan_total"):
+                yield self._local.plan_record
+        finally:
+            self._local.plan_record = previous
+
+    def plan_record(self):
+        record = getattr(self._local, "plan_record", None)
+        if record is None:
+            return None
+        return {"spans": dict(record["spans"]), "counters": dict(record["counters"])}
+
+    def _record_span(self, name, start, end):
+        duration = end - start
+        with self._lock:
+            stats = self.span_stats[name]
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            if self.trace_events is not None:
+                self.trace_events.append({
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self._origin) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident()
+                })
+        record = getattr(self._local, "plan_record", None)
+        if record is not None:
+            record["spans"][name] = record["spans"].get(name, 0.0) + duration
+
+    def report(self):
+        with self._lock:
+            spans = {
+                name: {
+                    "count": stats["count"],
+                    "total": stats["total"],
+                    "mean": stats["total"] / stats["count"],
+                    "max": stats["max"]
+                }
+                for name, stats in sorted(self.span_stats.items(), key=lambda item: -item[1]["total"])
+            }
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def write_report(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+        print(f"[info] profile report written to {file_name}")
+
+    def export_chrome_trace(self, file_name):
+        if self.trace_events is None:
+            raise ValueError("enable_trace needs to be called before export_chrome_trace")
+        with self._lock:
+            events = list(self.trace_events)
+        with open(file_name, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"[info] chrome trace written to {file_name}")
+
+def merge_plan_records(*records):
+    """Sum of per-plan records, e.g. of a plan's planner call and matching recorded in different threads."""
+    merged = {"spans": {}, "counters": {}}
+    for record in records:
+        if record is None:
+            continue
+        for kind in ("spans", "counters"):
+            for name, value in record[kind].items():
+                merged[kind][name] = merged[kind].get(name, 0) + value
+    return merged
+
+profiler = Profiler()
@@ -0,0 +1,163 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import LLM_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+from .profiling import profiler
+
+###############################################################################
+#
+# Concurrent LLM requests with rate limiting and retries
+#
+# The llm_planners planners are synchronous, so each request runs in a worker
+# thread of a pool that lives as long as the engine, while an asyncio loop
+# bounds the requests in flight, spaces them with token buckets for requests
+# and tokens per minute, and retries rate limit (429) and server (5xx) errors
+# with jittered exponential backoff. Planners reuse their HTTP client across
+# requests, so pointing them at a local mock server (e.g. with OPENAI_BASE_URL)
+# is enough to exercise the engine offline.
+#
+###############################################################################
+
+class TokenBucket:
+    """Holds at most capacity tokens, refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        # buckets are shared by the event loops of map() and of call() in pipeline worker threads
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # a request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def adjust(self, amount):
+        """Take (or give back, if negative) tokens once the actual usage of a request is known."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+def status_code(error):
+    """HTTP status code carried by an API error (openai.APIStatusError, an httpx or requests
+    error with a response, urllib.error.HTTPError), if any."""
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    if code is None:
+        code = getattr(error, "status", None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = status_code(error)
+    return code is not None and (code == 429 or code >= 500)
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class RequestEngine:
+    def __init__(self, concurrency=LLM_CONCURRENCY,
+                       requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                       tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                       max_retries=LLM_MAX_RETRIES,
+                       backoff_base=LLM_BACKOFF_BASE,
+                       backoff_max=LLM_BACKOFF_MAX,
+                       seed=None):
+        if concurrency < 1:
+            raise ValueError("concurrency has to be at least 1")
+        self.concurrency = concurrency
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rng = random.Random(seed)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm-request")
+
+    def map(self, fn, items, estimate_tokens=None, used_tokens=None, in_thread=True):
+        """Results of fn on each item, in order. A request that still fails after the retries
+        gives its exception in place of its result.
+
+        estimate_tokens(item) is charged to the tokens per minute bucket before a request,
+        and corrected with used_tokens(result) afterwards. With in_thread=False requests
+        run one at a time in the calling thread, for planners that are not thread safe."""
+        return asyncio.run(self._map(fn, list(items), estimate_tokens, used_tokens, in_thread))
+
+    def call(self, fn, item, estimate_tokens=None, used_tokens=None):
+        """Result of fn on a single item, with the same rate limits and retries as map(), run
+        in the calling thread. For callers that already run requests in their own worker
+        threads, like the planner stage of the streaming pipeline."""
+        return asyncio.run(self._request(fn, item, asyncio.Semaphore(1), estimate_tokens, used_tokens, False))
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def _map(self, fn, items, estimate_tokens, used_tokens, in_thread):
+        semaphore = asyncio.Semaphore(self.concurrency if in_thread else 1)
+        requests = [self._request(fn, item, semaphore, estimate_tokens, used_tokens, in_thread) for item in items]
+        return await asyncio.gather(*requests, return_exceptions=True)
+
+    async def _request(self, fn, item, semaphore, estimate_tokens, used_tokens, in_thread):
+        estimated = estimate_tokens(item) if estimate_tokens is not None else 0
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            async with semaphore:
+                if self.request_bucket is not None:
+                    await self.request_bucket.acquire()
+                if self.token_bucket is not None and estimated:
+                    await self.token_bucket.acquire(estimated)
+                profiler.count("llm_request_attempts")
+                try:
+                    if in_thread:
+                        result = await loop.run_in_executor(self.executor, fn, item)
+                    else:
+                        result = fn(item)
+                except Exception as e:
+                    error = e
+                else:
+                    if self.token_bucket is not None and used_tokens is not None:
+                        used = used_tokens(result)
+                        if used is not None:
+                            self.token_bucket.adjust(used - estimated)
+                    return result
+
+            if attempt >= self.max_retries or not is_retryable(error):
+                profiler.count("llm_errors")
+                raise error
+            delay = self._backoff(attempt, error)
+            print(f"[info] LLM request failed ({type(error).__name__}, status {status_code(error)}), retrying in {delay:.1f} sec")
+            profiler.count("llm_retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt, error):
+        # "full jitter": uniform in [0, exponential cap], but never before the server asks
+        delay = self.rng.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from .config import EVAL_SERVER_HOST, EVAL_SERVER_PORT, EVAL_SERVER_QUEUE_SIZE, EVAL_SERVER_BATCH_SIZE, DEFAULT_EVALUATOR_BACKEND, TRAJECTORY_MODE, DEFAULT_EMBEDDING_BACKEND, EMBEDDING_THREADS
+from .embeddings import available_embedding_backends, configure_embedding_backend
+
+###############################################################################
+#
+# Long-lived evaluation server
+#
+# The server keeps Julia, the embedding model and the TextAttack augmenters
+# loaded, and serves plan matching, plan evaluation and perturbations over
+# localhost HTTP. Requests are JSON objects (or lists of them, answered with a
+# list) posted to /match, /evaluate or /perturb. Requests are served one after
+# the other by the main thread; only the evaluations of a batch that share a
+# problem are simulated together.
+#
+###############################################################################
+
+SERVER_ENV_VAR = "PLANNING_EVAL_SERVER"
+
+def default_server_url():
+    return os.environ.get(SERVER_ENV_VAR, f"http://{EVAL_SERVER_HOST}:{EVAL_SERVER_PORT}")
+
+class ServerBusyError(RuntimeError):
+    pass
+
+class _PendingRequest:
+    def __init__(self, op, payload):
+        self.op = op
+        self.payload = payload
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class EvaluationServer:
+    def __init__(self, host=EVAL_SERVER_HOST, port=EVAL_SERVER_PORT,
+                       queue_size=EVAL_SERVER_QUEUE_SIZE, batch_size=EVAL_SERVER_BATCH_SIZE,
+                       max_cached_matchers=8):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.requests = queue.Queue(maxsize=queue_size)
+        self._submit_lock = threading.Lock()
+        self.max_cached_matchers = max_cached_matchers
+        self.matchers = OrderedDict()
+        self.http_server = None
+
+    def submit(self, op, payloads):
+        pending = [_PendingRequest(op, payload) for payload in payloads]
+        # a list of requests is queued whole or not at all, so that a full queue does not
+        # leave part of it running with nobody waiting for its results
+        with self._submit_lock:
+            if self.requests.maxsize - self.requests.qsize() < len(pending):
+                raise ServerBusyError(f"Request queue is full ({self.requests.qsize()} of {self.requests.maxsize} queued, {len(pending)} submitted)")
+            for request in pending:
+                self.requests.put_nowait(request)
+        for request in pending:
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+        return [request.result for request in pending]
+
+    def serve_forever(self):
+        # Julia may only be called from the main thread, so HTTP handlers run in
+        # background threads and hand their requests over to the loop below.
+        self.http_server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self.http_server.daemon_threads = True
+        http_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
+        http_thread.start()
+        print(f"[info] evaluation server listening on http://{self.host}:{self.port}")
+        try:
+            while True:
+                self._process_batch(self._next_batch())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.http_server.shutdown()
+
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _process_batch(self, batch):
+        # requests sharing a domain and problem are served back to back so that
+        # parsed PDDL and matcher instances are reused across the batch, and their
+        # evaluations are simulated together
+        batch.sort(key=lambda r: (r.op, r.payload.get("domain_pddl", ""), r.payload.get("problem_pddl", "")))
+        evaluations = OrderedDict()
+        for request in batch:
+            if request.op == "evaluate" and set(request.payload) <= {"domain_pddl", "problem_pddl", "plan_pddl", "backend"}:
+                key = (request.payload.get("domain_pddl"), request.payload.get("problem_pddl"), request.payload.get("backend", DEFAULT_EVALUATOR_BACKEND))
+                evaluations.setdefault(key, []).append(request)
+                continue
+            try:
+                request.result = self._handle(request.op, request.payload)
+            except Exception as e:
+                request.error = e
+            request.done.set()
+        for (domain_pddl, problem_pddl, backend), requests in evaluations.items():
+            try:
+                results = self.evaluate_many(domain_pddl, problem_pddl, [r.payload.get("plan_pddl") for r in requests], backend)
+            except Exception as e:
+                results = None
+                for request in requests:
+                    request.error = e
+            for i, request in enumerate(requests):
+                if results is not None:
+                    request.result = results[i]
+                request.done.set()
+
+    def _handle(self, op, payload):
+        if op == "match":
+            return {"plan": self.match(**payload)}
+        elif op == "evaluate":
+            return self.evaluate(**payload)
+        elif op == "perturb":
+            return {"perturbations": self.perturb(**payload)}
+        else:
+            raise ValueError(f"Unknown operation '{op}'")
+
+    def match(self, plan_matcher, domain_pddl, problem_pddl, plan_pddl=None, plan_json=None, lexical_matching=None):
+        planner_result = SimpleNamespace(plan_pddl=plan_pddl, plan_json=plan_json)
+        return self._get_matcher(plan_matcher, domain_pddl, problem_pddl, lexical_matching).plan_closest_match(planner_result)
+
+    def evaluate(self, domain_pddl, problem_pddl, plan_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+        from .plan_evaluator import evaluate_plan
+        return evaluate_plan(domain_pddl, problem_pddl, plan_pddl, backend)
+
+    def evaluate_many(self, domain_pddl, problem_pddl, plans_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+        from .plan_evaluator import evaluate_plans
+        return evaluate_plans(domain_pddl, problem_pddl, plans_pddl, backend)
+
+    def perturb(self, text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text=None, start_index=0):
+        from . import text_transformations
+        return text_transformations.produce_perturbations(text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text, start_index)
+
+    def _get_matcher(self, plan_matcher, domain_pddl, problem_pddl, lexical_matching=None):
+        from .plan_evaluator import available_plan_matchers
+        key = (plan_matcher, domain_pddl, problem_pddl, lexical_matching)
+        if key in self.matchers:
+            self.matchers.move_to_end(key)
+        else:
+            self.matchers[key] = available_plan_matchers[plan_matcher](domain_pddl, problem_pddl, lexical_matching=lexical_matching)
+            if len(self.matchers) > self.max_cached_matchers:
+                self.matchers.popitem(last=False)
+        return self.matchers[key]
+
+    def warm_up(self, perturbation_recipes=()):
+        from .plan_evaluator import load_word_embedding_model
+        from . import text_transformations
+        load_word_embedding_model()
+        for recipe in perturbation_recipes:
+            text_transformations.get_augmenter(recipe, 0.1, 1)
+
+def _make_handler(server: EvaluationServer):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "queued": server.requests.qsize()})
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            op = self.path.strip("/")
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length))
+                if isinstance(body, list):
+                    response = server.submit(op, body)
+                else:
+                    response = server.submit(op, [body])[0]
+                self._reply(200, response)
+            except ServerBusyError as e:
+                self._reply(503, {"error": str(e)})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+class EvaluationClient:
+    def __init__(self, url=None, timeout=600):
+        self.url = (url or default_server_url()).rstrip("/")
+        self.timeout = timeout
+
+    def is_available(self):
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=1) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+
+    def match(self, plan_matcher, domain_pddl, problem_pddl, planner_result, lexical_matching=None):
+        payload = {
+            "plan_matcher": plan_matcher,
+            "domain_pddl": domain_pddl,
+            "problem_pddl": problem_pddl,
+            "plan_pddl": planner_result.plan_pddl,
+            "plan_json": planner_result.plan_json,
+            "lexical_matching": lexical_matching
+        }
+        return self._post("match", payload)["plan"]
+
+    def evaluate(self, domain_pddl, problem_pddl, plan_pddl, backend=DEFAULT_EVALUATOR_BACKEND):
+        payload = {"domain_pddl": domain_pddl, "problem_pddl": problem_pddl, "plan_pddl": plan_pddl, "backend": backend}
+        return self._post("evaluate", payload)
+
+    def perturb(self, text, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text=None, start_index=0):
+        payload = {
+            "text": text,
+            "perturbation_recipe": perturbation_recipe,
+            "pct_words_to_swap": pct_words_to_swap,
+            "perturbations_number": perturbations_number,
+            "jailbreak_text": jailbreak_text,
+            "start_index": start_index
+        }
+        return self._post("perturb", payload)["perturbations"]
+
+    def _post(self, op, payload):
+        request = urllib.request.Request(f"{self.url}/{op}", data=json.dumps(payload).encode(),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"Evaluation server error on /{op}: {e.read().decode()}")
+
+def connect(url=None):
+    """Return a client for the evaluation server if one is running, otherwise None."""
+    if os.environ.get(SERVER_ENV_VAR, "").lower() == "off":
+        return None
+    client = EvaluationClient(url)
+    if client.is_available():
+        print(f"[info] using evaluation server at {client.url}")
+        return client
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived plan matching and evaluation server.")
+    parser.add_argument("--host", type=str, default=EVAL_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=EVAL_SERVER_PORT)
+    parser.add_argument("--queue-size", type=int, default=EVAL_SERVER_QUEUE_SIZE, help="Maximum number of queued requests before answering 503.")
+    parser.add_argument("--batch-size", type=int, default=EVAL_SERVER_BATCH_SIZE, help="Maximum number of queued requests served together.")
+    parser.add_argument("--warm-up-recipes", type=str, nargs="*", default=[], help="Perturbation recipes whose augmenters are loaded at start up.")
+    parser.add_argument("--embedding-backend", type=str, choices=available_embedding_backends.keys(), default=DEFAULT_EMBEDDING_BACKEND)
+    parser.add_argument("--embedding-threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--trajectory-mode", type=str, choices=["full", "compact"], default=TRAJECTORY_MODE, help="How evaluated plans keep their trajectories.")
+    args = parser.parse_args()
+
+    # juliacall has to be initialized before torch is imported
+    import juliacall
+    from . import plan_evaluator
+    configure_embedding_backend(args)
+    plan_evaluator.configure_plan_evaluation(args)
+
+    server = EvaluationServer(args.host, args.port, args.queue_size, args.batch_size)
+    server.warm_up(args.warm_up_recipes)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
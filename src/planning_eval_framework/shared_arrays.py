@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .config import SHARED_ARRAYS_DIR, SHARED_ARRAYS_MAX_MB
+from .profiling import profiler
+
+###############################################################################
+#
+# Read-only arrays shared by the processes of a host
+#
+# Arrays that every evaluation worker would otherwise compute and hold on its
+# own, like the embeddings and texts of the ground actions of a problem, are
+# published once as .npy files in a RAM-backed directory (/dev/shm when there
+# is one) and attached by every process as read-only memory maps, so all the
+# processes of the host read the same physical pages. Files are keyed by a
+# hash of everything their content depends on and written atomically, so
+# workers racing to publish the same array are harmless. The directory is
+# capped in size: attaching an array marks it as used, and publishing removes
+# the least recently used arrays beyond the cap. Removing a file does not
+# affect the processes that already mapped it, the memory is freed once they
+# drop it.
+#
+###############################################################################
+
+def array_key(*parts):
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+def _array_file(key):
+    return os.path.join(SHARED_ARRAYS_DIR, f"{key}.npy")
+
+def attach(key):
+    """Read-only memory map of a published array, or None if it was not published."""
+    try:
+        os.utime(_array_file(key))
+        return np.load(_array_file(key), mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+def publish(key, array):
+    os.makedirs(SHARED_ARRAYS_DIR, exist_ok=True)
+    tmp_file_name = f"{_array_file(key)}.{os.getpid()}.tmp"
+    with open(tmp_file_name, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_file_name, _array_file(key))
+    array = attach(key)
+    evict(SHARED_ARRAYS_MAX_MB * 1024 * 1024)
+    return array
+
+def evict(max_bytes):
+    """Remove the least recently used arrays until the published ones take at most max_bytes."""
+    files = []
+    for entry in os.scandir(SHARED_ARRAYS_DIR):
+        if entry.name.endswith(".npy"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            profiler.count("shared_arrays_evicted")
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def get_or_publish(key, compute):
+    """Attach the array published under key, computing and publishing it first if needed."""
+    array = attach(key)
+    if array is not None:
+        profiler.count("shared_arrays_attached")
+        return array
+    profiler.count("shared_arrays_published")
+    return publish(key, compute())
+
+def clear():
+    """Remove all the published arrays, e.g. to free their memory once a sweep is over."""
+    shutil.rmtree(SHARED_ARRAYS_DIR, ignore_errors=True)
@@ -0,0 +1,318 @@
+import itertools
+from functools import lru_cache
+
+import numpy as np
+
+from . import grounding
+from .config import TRAJECTORY_MODE, TRAJECTORY_CHUNK_SIZE
+from .grounding import GroundTask, UnsupportedPDDLError
+
+###############################################################################
+#
+# NumPy plan evaluator for STRIPS domains
+#
+# Same interface as plan_evaluator.PlanEvaluator, but plans are simulated on the
+# boolean state vectors of a GroundTask and goals and constraints are evaluated
+# on whole trajectories (one row per state) at once, without Julia.
+#
+###############################################################################
+
+def compile_formula(task: GroundTask, formula):
+    """Compile a PDDL state formula into a function from a (states x atoms) boolean matrix to a
+    boolean vector with the truth value of the formula in each state."""
+    if not formula:
+        return lambda states: np.ones(len(states), dtype=bool)
+
+    op = formula[0]
+    if op == "and":
+        subformulas = [compile_formula(task, f) for f in formula[1:]]
+        return lambda states: np.logical_and.reduce([f(states) for f in subformulas]) if subformulas else np.ones(len(states), dtype=bool)
+    elif op == "or":
+        subformulas = [compile_formula(task, f) for f in formula[1:]]
+        return lambda states: np.logical_or.reduce([f(states) for f in subformulas]) if subformulas else np.zeros(len(states), dtype=bool)
+    elif op == "not":
+        subformula = compile_formula(task, formula[1])
+        return lambda states: ~subformula(states)
+    elif op == "imply":
+        antecedent, consequent = compile_formula(task, formula[1]), compile_formula(task, formula[2])
+        return lambda states: ~antecedent(states) | consequent(states)
+    elif op in ("exists", "forall"):
+        expanded = ["or" if op == "exists" else "and"]
+        expanded += [_substitute_formula(formula[2], binding) for binding in _bindings(task, formula[1])]
+        return compile_formula(task, expanded)
+    elif op == "=":
+        holds = formula[1] == formula[2]
+        return lambda states: np.full(len(states), holds)
+    elif any(isinstance(term, list) for term in formula) or op in ("always", "sometime", "at-most-once", "sometime-after", "sometime-before", "within"):
+        raise UnsupportedPDDLError(f"'{op}' is not supported in state formulas")
+
+    atom = tuple(formula)
+    if atom[0] not in task.fluent_predicates:
+        holds = atom in task.problem.init
+        return lambda states: np.full(len(states), holds)
+    elif atom not in task.atom_index:
+        # fluent atoms that no action mentions keep their initial value
+        holds = atom in task.problem.init
+        return lambda states: np.full(len(states), holds)
+    i = task.atom_index[atom]
+    return lambda states: states[:, i]
+
+def _bindings(task: GroundTask, variables):
+    typed = grounding._parse_typed_list(variables)
+    domains = [[o for o, t in task.objects.items() if task.domain.is_subtype(t, var_type)] for _, var_type in typed]
+    for args in itertools.product(*domains):
+        yield dict(zip([var for var, _ in typed], args))
+
+def _substitute_formula(formula, binding):
+    if isinstance(formula, list):
+        return [_substitute_formula(f, binding) for f in formula]
+    return binding.get(formula, formula)
+
+def constraint_conjuncts(formula):
+    """The rules of a constraint formula: each conjunct of a conjunction, otherwise the formula itself."""
+    if formula is None:
+        return []
+    elif formula[0] == "and":
+        return formula[1:]
+    return [formula]
+
+class _CompiledProblem:
+    def __init__(self, task: GroundTask):
+        self.task = task
+        self.goal = compile_formula(task, task.problem.goal)
+        self.safety_constraint = compile_formula(task, task.problem.constraints) if task.problem.constraints is not None else None
+        self.constraint_rules = [grounding.write_sexpr(c) for c in constraint_conjuncts(task.problem.constraints)]
+
+@lru_cache(maxsize=32)
+def _compiled_problem(task: GroundTask):
+    return _CompiledProblem(task)
+
+@lru_cache(maxsize=256)
+def _compiled_constraint(task: GroundTask, constraint_pddl):
+    return compile_formula(task, grounding.parse_sexpr(constraint_pddl)[0])
+
+def first_violations(task: GroundTask, constraints_pddl, state_chunks):
+    """Index of the first state violating each constraint (-1 if none does), in a single pass
+    over the consecutive (states x atoms) matrices of state_chunks."""
+    constraints = [_compiled_constraint(task, c) for c in constraints_pddl]
+    first = np.full(len(constraints), -1)
+    offset = 0
+    for chunk in state_chunks:
+        if not constraints or (first >= 0).all():
+            break
+        violated = ~np.stack([constraint(chunk) for constraint in constraints])
+        new = (first < 0) & violated.any(axis=1)
+        first[new] = offset + violated[new].argmax(axis=1)
+        offset += len(chunk)
+    return first
+
+class CompactTrajectory:
+    """Trajectory stored as its initial state and the actions applied to it. The add and
+    delete rows of the actions are the per-step deltas, so intermediate states are rebuilt
+    on demand and memory grows with the plan length only."""
+
+    def __init__(self, task: GroundTask, init_state, actions, final_state):
+        self.task = task
+        self.init_state = init_state
+        self.actions = np.asarray(actions, dtype=np.int32)
+        self.final_state = final_state
+
+    def __len__(self):
+        return len(self.actions) + 1
+
+    def __getitem__(self, i):
+        i = range(len(self))[i]
+        if i == len(self) - 1:
+            return self.final_state
+        state = self.init_state
+        for action in self.actions[:i]:
+            state = self.task.apply(state, action)
+        return state
+
+    def __iter__(self):
+        for chunk in self.chunks(TRAJECTORY_CHUNK_SIZE):
+            yield from chunk
+
+    def chunks(self, size):
+        """Consecutive (states x atoms) matrices of at most size states covering the trajectory."""
+        state = self.init_state
+        chunk = [state]
+        for action in self.actions:
+            if len(chunk) == size:
+                yield np.stack(chunk)
+                chunk = []
+            state = self.task.apply(state, action)
+            chunk.append(state)
+        yield np.stack(chunk)
+
+class StripsPlanEvaluator:
+    def __init__(self, domain_pddl, problem_pddl, plan_pddl, trajectory_mode=TRAJECTORY_MODE):
+        task = grounding.try_ground(domain_pddl, problem_pddl)
+        if task is None:
+            raise UnsupportedPDDLError("The domain cannot be grounded as a STRIPS task")
+        self.task = task
+        compiled = _compiled_problem(task)
+        self.goal = compiled.goal
+        self.safety_constraint = compiled.safety_constraint
+        self.constraint_rules = compiled.constraint_rules
+
+        action_list = [line for line in plan_pddl.splitlines() if line.strip() and line.strip()[0] != ";"]
+        self.plan = [task.find_action(line) for line in action_list]
+        self.plan_length = len(action_list)
+        if trajectory_mode not in ("full", "compact"):
+            raise ValueError(f"Unknown trajectory mode '{trajectory_mode}'")
+        self.trajectory_mode = trajectory_mode
+
+        self.trajectory = None
+        self.valid = None
+
+    def try_simulation(self):
+        state = self.task.init_state
+        states = [state]
+        for action in self.plan:
+            if action is None or not self.task.is_applicable(state, action):
+                self.valid = False
+                return
+            state = self.task.apply(state, action)
+            if self.trajectory_mode == "full":
+                states.append(state)
+        if self.trajectory_mode == "full":
+            self.trajectory = np.stack(states)
+        else:
+            self.trajectory = CompactTrajectory(self.task, self.task.init_state, self.plan, state)
+        self.valid = True
+
+    def is_valid(self):
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before is_valid")
+        else:
+            return self.valid
+
+    def is_successful(self):
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before is_successful")
+        elif not self.valid:
+            return None
+        else:
+            return bool(self.goal(self.trajectory[-1][None])[0])
+
+    def is_safe(self):
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before is_safe")
+        elif not self.valid:
+            return None
+        elif self.safety_constraint is None:
+            return True
+        else:
+            return self._holds_in_all_states(self.safety_constraint)
+
+    def is_constraint_violated(self, constraint_pddl):
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before is_constraint_violated")
+        elif not self.valid:
+            raise ValueError("The plan has to be valid")
+        else:
+            return not self._holds_in_all_states(_compiled_constraint(self.task, constraint_pddl))
+
+    def first_violations(self, constraints_pddl=None):
+        """Step of the trajectory (0 being the initial state) where each constraint is first
+        violated, or None if it never is. Defaults to the conjuncts of the problem constraints."""
+        if self.valid is None:
+            raise ValueError("try_simulation needs to be called before first_violations")
+        elif not self.valid:
+            raise ValueError("The plan has to be valid")
+        constraints_pddl = self.constraint_rules if constraints_pddl is None else list(constraints_pddl)
+        first = first_violations(self.task, constraints_pddl, self._trajectory_chunks())
+        return {c: (int(step) if step >= 0 else None) for c, step in zip(constraints_pddl, first)}
+
+    def _trajectory_chunks(self):
+        if self.trajectory_mode == "full":
+            return [self.trajectory]
+        return self.trajectory.chunks(TRAJECTORY_CHUNK_SIZE)
+
+    def _holds_in_all_states(self, formula):
+        return all(formula(chunk).all() for chunk in self._trajectory_chunks())
+
+class BatchStripsSimulator:
+    """Simulates many plans against the same problem at once.
+
+    The plans are merged into a prefix tree, and each step is applied to all the distinct
+    prefixes of that length together, as rows of a (prefixes x atoms) state matrix, so plans
+    sharing their first actions are only simulated once up to the point where they diverge.
+    Goal and constraint checks return one value per plan."""
+
+    def __init__(self, domain_pddl, problem_pddl):
+        task = grounding.try_ground(domain_pddl, problem_pddl)
+        if task is None:
+            raise UnsupportedPDDLError("The domain cannot be grounded as a STRIPS task")
+        self.task = task
+        compiled = _compiled_problem(task)
+        self.goal = compiled.goal
+        self.constraint_rules = compiled.constraint_rules
+        self._constraints = [_compiled_constraint(task, c) for c in self.constraint_rules]
+
+    def simulate(self, plans_pddl):
+        """Return the valid, successful and safe vectors of the plans, and the (plans x rules)
+        matrix of the step where each of constraint_rules is first violated (-1 if never).
+        Everything but valid is only meaningful where valid is True."""
+        task = self.task
+        plans = [[task.find_action(line) for line in plan_pddl.splitlines() if line.strip() and line.strip()[0] != ";"]
+                 for plan_pddl in plans_pddl]
+        n_plans = len(plans)
+
+        valid = np.ones(n_plans, dtype=bool)
+        final_states = np.zeros((n_plans, len(task.atoms)), dtype=bool)
+        violations = np.full((n_plans, len(self._constraints)), -1)
+
+        # prefix tree nodes of the current depth: their states and the first violation of each rule so far
+        states = task.init_state[None]
+        first_violation = np.where(self._violated(states), 0, -1)
+        node_of_plan = np.zeros(n_plans, dtype=int)
+        for i, plan in enumerate(plans):
+            if not plan:
+                final_states[i], violations[i] = states[0], first_violation[0]
+
+        depth = 0
+        active = [i for i, plan in enumerate(plans) if plan]
+        while active:
+            children = {}
+            for i in active:
+                children.setdefault((node_of_plan[i], plans[i][depth]), len(children))
+            parents = np.array([parent for parent, _ in children], dtype=int)
+            actions = np.array([-1 if action is None else action for _, action in children], dtype=int)
+
+            applicable = actions >= 0
+            known = np.flatnonzero(applicable)
+            parent_states = states[parents[known]]
+            applicable[known] = ~((task.pre_pos[actions[known]] & ~parent_states).any(axis=1)
+                                  | (task.pre_neg[actions[known]] & parent_states).any(axis=1))
+
+            next_states = np.zeros((len(children), len(task.atoms)), dtype=bool)
+            ok = np.flatnonzero(applicable)
+            next_states[ok] = (states[parents[ok]] & ~task.delete[actions[ok]]) | task.add[actions[ok]]
+
+            depth += 1
+            next_first_violation = first_violation[parents]
+            next_first_violation[(next_first_violation < 0) & self._violated(next_states)] = depth
+
+            still_active = []
+            for i in active:
+                child = children[(node_of_plan[i], plans[i][depth - 1])]
+                if not applicable[child]:
+                    valid[i] = False
+                elif depth == len(plans[i]):
+                    final_states[i], violations[i] = next_states[child], next_first_violation[child]
+                else:
+                    node_of_plan[i] = child
+                    still_active.append(i)
+            states, first_violation, active = next_states, next_first_violation, still_active
+
+        successful = self.goal(final_states) & valid
+        safe = (violations < 0).all(axis=1) & valid
+        return valid, successful, safe, violations
+
+    def _violated(self, states):
+        """(states x rules) matrix of the constraint rules violated in each state."""
+        if not self._constraints:
+            return np.zeros((len(states), 0), dtype=bool)
+        return ~np.stack([constraint(states) for constraint in self._constraints], axis=1)
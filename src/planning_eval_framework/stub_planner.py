@@ -0,0 +1,205 @@
+import copy
+import json
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+
+###############################################################################
+#
+# Offline planner backends
+#
+# Stub planners expose the same interface as the llm_planners planners but
+# never call an LLM, so that the rest of the pipeline can be measured and load
+# tested on its own. Plans are obtained with one of these strategies:
+# - ground_truth: a plan for the ground truth problem computed with
+#   SymbolicPlanners (safety constraints are not taken into account);
+# - corrupted: the ground truth plan with misspelled, dropped and repeated steps;
+# - replay: the plans stored in a plans/ directory of a previous run.
+#
+###############################################################################
+
+class StubPlannerResult:
+    """Result with the fields of llm_planners' PlannerResult that the pipeline reads."""
+
+    def __init__(self, plan_json=None, task_pddl=None, plan_pddl=None):
+        self.plan_json = plan_json
+        self.task_pddl = task_pddl
+        self.plan_pddl = plan_pddl
+
+class StubRateLimitError(RuntimeError):
+    """Injected failure carrying an HTTP status like the errors of the OpenAI client."""
+
+    def __init__(self, status_code=429):
+        super().__init__(f"Simulated API error {status_code}")
+        self.status_code = status_code
+
+class StubPlanner:
+    def __init__(self, strategy: str):
+        if strategy not in ("ground_truth", "corrupted", "replay"):
+            raise ValueError(f"Unknown stub planner strategy '{strategy}'")
+        self.strategy = strategy
+        # ground truth plans are computed with Julia, which only runs in the main thread
+        self.thread_safe = strategy == "replay"
+        self.domain_name = None
+        self.task_name = None
+        self.configure()
+
+    def configure(self, latency: float = 0.0, latency_jitter: float = 0.0, error_rate: float = 0.0,
+                        rate_limit_rate: float = 0.0, corruption_rate: float = 0.3, replay_dir: str = None, seed: int = None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.corruption_rate = corruption_rate
+        self.replay_dir = replay_dir
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def set_context(self, context, domain_name, task_name):
+        self.domain_name = domain_name
+        self.task_name = task_name
+
+    def set_response_model_generator(self, response_model_generator_name):
+        pass
+
+    def run_planner(self, init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl):
+        with self._rng_lock:
+            delay = self.latency + self.rng.uniform(0, self.latency_jitter)
+            failed = self.rng.random() < self.error_rate
+            rate_limited = self.rng.random() < self.rate_limit_rate
+            seed = self.rng.random()
+        time.sleep(delay)
+
+        if rate_limited:
+            raise StubRateLimitError()
+
+        # an injected failure behaves like a planner that produced no plan
+        if failed:
+            return StubPlannerResult()
+
+        if self.strategy == "replay":
+            return self._replay_result()
+
+        plan = ground_truth_plan(domain_pddl, self._ground_truth_problem_pddl())
+        if self.strategy == "corrupted":
+            plan = corrupt_plan(plan, self.corruption_rate, random.Random(seed))
+        return StubPlannerResult(plan_pddl="\n".join(plan))
+
+    def batch_request(self, init_nl, goal_nl, constraints_nl, domain_nl, domain_pddl):
+        """Chat completions request of the task, answered by complete() in local batches."""
+        return {
+            "model": f"stub_{self.strategy}",
+            "messages": [
+                {"role": "system", "content": domain_nl},
+                {"role": "user", "content": f"Initial state: {init_nl}\nGoal: {goal_nl}\nConstraints: {constraints_nl}"}
+            ],
+            "metadata": {"domain": self.domain_name, "task_name": self.task_name}
+        }
+
+    def complete(self, body):
+        """Chat completion answering a request of batch_request, with the planner result as JSON content."""
+        from .domains import available_domains
+        from .mock_llm_server import chat_completion
+
+        planner = copy.copy(self)
+        planner.set_context(None, body["metadata"]["domain"], body["metadata"]["task_name"])
+        # replayed plans do not need the domain
+        domain_pddl = None if self.strategy == "replay" else available_domains[planner.domain_name].get_domain_pddl()
+        res = planner.run_planner(None, None, None, None, domain_pddl)
+        content = json.dumps({"plan_json": res.plan_json, "task_pddl": res.task_pddl, "plan_pddl": res.plan_pddl})
+        return chat_completion(body, content)
+
+    def parse_batch_response(self, body):
+        return StubPlannerResult(**json.loads(body["choices"][0]["message"]["content"]))
+
+    def _ground_truth_problem_pddl(self):
+        from .domains import available_domains
+
+        domain = available_domains[self.domain_name]
+        # perturbed tasks are named <task>_<i>
+        task_names = [task.name for task in domain.tasks]
+        task_name = self.task_name
+        if task_name not in task_names:
+            task_name = task_name.rpartition("_")[0]
+        if task_name not in task_names:
+            raise ValueError(f"Task {self.task_name} not found in domain {self.domain_name}")
+        return domain.get_task_pddl(task_names.index(task_name) + 1)
+
+    def _replay_result(self):
+        if self.replay_dir is None:
+            raise ValueError("The replay stub planner requires a replay directory")
+        plan_pddl_fn = os.path.join(self.replay_dir, f"{self.task_name}.pddl")
+        plan_json_fn = os.path.join(self.replay_dir, f"{self.task_name}.json")
+        res = StubPlannerResult()
+        if os.path.exists(plan_pddl_fn):
+            with open(plan_pddl_fn, "r") as f:
+                res.plan_pddl = f.read()
+        if os.path.exists(plan_json_fn):
+            with open(plan_json_fn, "r") as f:
+                res.plan_json = f.read()
+        return res
+
+@lru_cache(maxsize=64)
+def _solve(domain_pddl, problem_pddl):
+    from .plan_evaluator import jl, parse_domain, parse_problem
+
+    domain = parse_domain(domain_pddl)
+    problem = parse_problem(problem_pddl)
+    state = jl.PDDL.initstate(domain, problem)
+    planner = jl.SymbolicPlanners.AStarPlanner(jl.SymbolicPlanners.HAdd())
+    solution = planner(domain, state, jl.PDDL.get_goal(problem))
+    return tuple(str(jl.PDDL.write_pddl(act)) for act in jl.collect(solution))
+
+def ground_truth_plan(domain_pddl, problem_pddl):
+    """Return the ground truth plan for the problem as a list of PDDL actions."""
+    return list(_solve(domain_pddl, problem_pddl))
+
+def _misspell(symbol: str, rng: random.Random):
+    op = rng.randrange(3)
+    if op == 0 and len(symbol) > 3:
+        i = rng.randrange(len(symbol) - 1)
+        return symbol[:i] + symbol[i+1] + symbol[i] + symbol[i+2:]
+    elif op == 1 and len(symbol) > 3:
+        i = rng.randrange(len(symbol))
+        return symbol[:i] + symbol[i+1:]
+    else:
+        return symbol.replace("-", "_")
+
+def misspell_plan(plan: list[str], rate: float, rng: random.Random):
+    """Misspell each action or object symbol of the plan with probability `rate`."""
+    res = []
+    for action in plan:
+        symbols = action.strip("()").split()
+        symbols = [_misspell(s, rng) if rng.random() < rate else s for s in symbols]
+        res.append(f"({' '.join(symbols)})")
+    return res
+
+def corrupt_plan(plan: list[str], rate: float, rng: random.Random):
+    """Drop or repeat each step with probability `rate` / 4 each, then misspell symbols with probability `rate`."""
+    res = []
+    for action in plan:
+        r = rng.random()
+        if r < rate / 4:
+            continue
+        res.append(action)
+        if r > 1 - rate / 4:
+            res.append(action)
+    return misspell_plan(res, rate, rng)
+
+available_stub_planners = {
+    "stub_ground_truth": StubPlanner("ground_truth"),
+    "stub_corrupted": StubPlanner("corrupted"),
+    "stub_replay": StubPlanner("replay")
+}
+
+def configure_stub_planners(args):
+    for planner in available_stub_planners.values():
+        planner.configure(latency=args.stub_latency,
+                          latency_jitter=args.stub_latency_jitter,
+                          error_rate=args.stub_error_rate,
+                          rate_limit_rate=args.stub_rate_limit_rate,
+                          corruption_rate=args.stub_corruption_rate,
+                          replay_dir=args.stub_replay_dir,
+                          seed=args.seed)
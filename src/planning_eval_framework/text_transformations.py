@@ -1,15 +1,16 @@
 import textattack
 import warnings
+from functools import lru_cache
 from nltk.tokenize import sent_tokenize
 
+from .translation_cache import get_translation_cache
+
 whole_text_trasnformations = {"jailbreak", "no_perturbation"}
 word_level_transformations = {"wordnet", "charswap", "embedding"}
 sentence_level_transformations = {"back_trans", "back_transcription"}
 
-def produce_perturbations(task_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text: str = None) -> list[str]:
-    augmenter = available_textattack_perturbations[perturbation_recipe](
-                                                pct_words_to_swap=pct_words_to_swap, 
-                                                transformations_per_example=perturbations_number)
+def produce_perturbations(task_nl, perturbation_recipe, pct_words_to_swap, perturbations_number, jailbreak_text: str = None, start_index: int = 0) -> list[str]:
+    augmenter = get_augmenter(perturbation_recipe, pct_words_to_swap, perturbations_number)
 
     if perturbation_recipe == "jailbreak":
         res = augmenter.augment(task_nl, jailbreak_text)
@@ -18,12 +19,31 @@ def produce_perturbations(task_nl, perturbation_recipe, pct_words_to_swap, pertu
     elif perturbation_recipe in sentence_level_transformations:
         warnings.warn("There are known issues with the number of transformations produced by this recipes. See https://github.com/QData/TextAttack/issues/800")
         sentences = sent_tokenize(task_nl)
-        perturbed_sentences = [augmenter.augment(s) for s in sentences]
+        # translations are drawn from the cached candidates of each sentence, from start_index on
+        translation_cache = get_translation_cache()
+        if translation_cache is not None:
+            perturbed_sentences = [translation_cache.translate(augmenter, perturbation_recipe, s, perturbations_number, start_index) for s in sentences]
+        else:
+            perturbed_sentences = [augmenter.augment(s) for s in sentences]
         res = [" ".join(ls) for ls in zip(*perturbed_sentences)]
     else:
         raise ValueError("Transformation not recognized.")
     return res
 
+def get_augmenter(perturbation_recipe, pct_words_to_swap, perturbations_number):
+    # whole text augmenters are cheap and keep per-call state, so only TextAttack recipes are reused
+    if perturbation_recipe in whole_text_trasnformations:
+        return available_textattack_perturbations[perturbation_recipe](
+                                                pct_words_to_swap=pct_words_to_swap, 
+                                                transformations_per_example=perturbations_number)
+    return _get_textattack_augmenter(perturbation_recipe, pct_words_to_swap, perturbations_number)
+
+@lru_cache(maxsize=16)
+def _get_textattack_augmenter(perturbation_recipe, pct_words_to_swap, perturbations_number):
+    return available_textattack_perturbations[perturbation_recipe](
+                                                pct_words_to_swap=pct_words_to_swap, 
+                                                transformations_per_example=perturbations_number)
+
 class Augmenter:
     def __init__(self, pct_words_to_swap: float = 1.0, transformations_per_example: int = 1):
         self.pct_words_to_swap = pct_words_to_swap
@@ -0,0 +1,55 @@
+import argparse
+import glob
+import json
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the action similarities of an embedding backend with the ones of the PyTorch "
+                                                 "SentenceTransformer model, on the ground actions of a problem.")
+    parser.add_argument("domain_file", type=str, help="Path to the domain PDDL file.")
+    parser.add_argument("problem_file", type=str, help="Path to the problem PDDL file.")
+    parser.add_argument("--backend", type=str, default="onnx_int8", help="Embedding backend to check.")
+    parser.add_argument("--plans", type=str, nargs="+", default=None,
+                        help="Glob patterns of PDDL or JSON plans whose steps are the queries (default: the action texts themselves).")
+    parser.add_argument("--threads", type=int, default=None, help="Threads used by the checked backend.")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="Largest accepted difference of similarities.")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Smallest accepted fraction of queries with the same closest action.")
+    args = parser.parse_args()
+
+    # juliacall has to be initialized before torch is imported
+    import juliacall
+    from planning_eval_framework import grounding
+    from planning_eval_framework.embeddings import check_parity, get_embedding_model
+
+    with open(args.domain_file, "r") as f:
+        domain_pddl = f.read()
+    with open(args.problem_file, "r") as f:
+        problem_pddl = f.read()
+    task = grounding.try_ground(domain_pddl, problem_pddl)
+    if task is None:
+        raise ValueError(f"{args.domain_file} cannot be grounded as a STRIPS task")
+    candidates = [" ".join((name,) + tuple(action_args)) for name, action_args in zip(task.action_names, task.action_args)]
+
+    queries = candidates
+    if args.plans is not None:
+        queries = [step for pattern in args.plans for plan_fn in sorted(glob.glob(pattern, recursive=True)) for step in read_plan_steps(plan_fn)]
+
+    model = get_embedding_model(args.backend, args.threads)
+    reference_model = get_embedding_model("sentence_transformers")
+    max_difference, top1_agreement = check_parity(model, reference_model, queries, candidates)
+    print(f"[info] {len(queries)} queries x {len(candidates)} actions: largest similarity difference {max_difference:.4f}, "
+          f"same closest action for {top1_agreement:.2%} of the queries")
+    if max_difference > args.tolerance or top1_agreement < args.min_agreement:
+        print(f"[error] {args.backend} embeddings drift from the PyTorch model")
+        sys.exit(1)
+
+def read_plan_steps(plan_fn):
+    with open(plan_fn, "r") as f:
+        text = f.read()
+    if plan_fn.endswith(".json"):
+        return [" ".join(step.values()) for step in json.loads(text)["steps"]]
+    return [" ".join(line.replace("(", " ").replace(")", " ").split())
+            for line in text.splitlines() if line.strip() and not line.strip().startswith(";")]
+
+if __name__ == "__main__":
+    main()
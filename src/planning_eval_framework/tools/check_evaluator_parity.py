@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import random
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the evaluations of the numpy backend with the ones of the julia backend "
+                                                 "(valid, successful, safe and the first violation of each constraint rule).")
+    parser.add_argument("domain_file", type=str, help="Path to the domain PDDL file.")
+    parser.add_argument("problem_files", type=str, nargs="+", help="Paths to problem PDDL files, e.g. p01.pddl to p04.pddl or generated problems.")
+    parser.add_argument("--plans", type=str, nargs="+", default=[], help="Glob patterns of PDDL plans checked against every problem.")
+    parser.add_argument("--random-plans", type=int, default=50,
+                        help="Random walks per problem, checked together with corrupted copies of them (dropped, swapped, repeated and unknown steps).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from planning_eval_framework import grounding
+
+    with open(args.domain_file, "r") as f:
+        domain_pddl = f.read()
+    plans = []
+    for pattern in args.plans:
+        for plan_fn in sorted(glob.glob(pattern, recursive=True)):
+            with open(plan_fn, "r") as f:
+                plans.append(f.read())
+
+    rng = random.Random(args.seed)
+    failed = False
+    for problem_file in args.problem_files:
+        with open(problem_file, "r") as f:
+            problem_pddl = f.read()
+        task = grounding.try_ground(domain_pddl, problem_pddl)
+        if task is None:
+            print(f"[error] {problem_file} cannot be grounded as a STRIPS task")
+            failed = True
+            continue
+        problem_plans = plans + random_plans(task, args.random_plans, rng)
+        mismatches = check_evaluator_parity(domain_pddl, problem_pddl, problem_plans)
+        print(f"[info] {problem_file}: {len(problem_plans) - len(mismatches)} of {len(problem_plans)} plans evaluated alike")
+        for plan_pddl, numpy_results, julia_results in mismatches:
+            print(f"[error] {problem_file}: numpy {json.dumps(numpy_results)} but julia {json.dumps(julia_results)} on plan\n{plan_pddl}")
+        failed = failed or bool(mismatches)
+    if failed:
+        sys.exit(1)
+
+def check_evaluator_parity(domain_pddl, problem_pddl, plans_pddl):
+    """(plan, numpy results, julia results) of the plans that the two backends evaluate differently.
+    First violations are compared on the constraint rules of the numpy backend, so that both
+    backends check the same formulas."""
+    # juliacall has to be initialized before torch is imported
+    import juliacall
+    from planning_eval_framework.plan_evaluator import PlanEvaluator
+    from planning_eval_framework.strips_evaluator import StripsPlanEvaluator
+
+    mismatches = []
+    for plan_pddl in plans_pddl:
+        numpy_results = _evaluate(StripsPlanEvaluator, domain_pddl, problem_pddl, plan_pddl)
+        julia_results = _evaluate(PlanEvaluator, domain_pddl, problem_pddl, plan_pddl, numpy_results.get("constraint_rules"))
+        numpy_results.pop("constraint_rules", None)
+        if numpy_results != julia_results:
+            mismatches.append((plan_pddl, numpy_results, julia_results))
+    return mismatches
+
+def _evaluate(evaluator_class, domain_pddl, problem_pddl, plan_pddl, constraint_rules=None):
+    evaluator = evaluator_class(domain_pddl, problem_pddl, plan_pddl, "full")
+    evaluator.try_simulation()
+    if not evaluator.is_valid():
+        return {"valid": False}
+    results = {"valid": True, "successful": bool(evaluator.is_successful()), "safe": bool(evaluator.is_safe())}
+    if constraint_rules is None:
+        constraint_rules = list(evaluator.constraint_rules)
+        results["constraint_rules"] = constraint_rules
+    results["first_violations"] = list(evaluator.first_violations(constraint_rules).values())
+    return results
+
+def random_plans(task, number, rng):
+    """Random walks of up to 10 applicable actions of a GroundTask, each followed by copies of it
+    with a dropped, two swapped, a repeated and an unknown step."""
+    plans = [[]]
+    for _ in range(number):
+        state, plan = task.init_state, []
+        for _ in range(rng.randint(1, 10)):
+            applicable = task.applicable(state).nonzero()[0]
+            if len(applicable) == 0:
+                break
+            action = int(rng.choice(applicable))
+            state = task.apply(state, action)
+            plan.append(task.action_texts[action])
+        plans.append(plan)
+        if len(plan) > 1:
+            i, j = rng.sample(range(len(plan)), 2)
+            plans.append(plan[:i] + plan[i+1:])
+            swapped = list(plan)
+            swapped[i], swapped[j] = swapped[j], swapped[i]
+            plans.append(swapped)
+        i = rng.randrange(len(plan) + 1)
+        plans.append(plan[:i] + plan[i-1:i] + plan[i:])
+        plans.append(plan[:i] + ["(teleport robot moon)"] + plan[i:])
+    return ["\n".join(plan) for plan in plans]
+
+if __name__ == "__main__":
+    main()
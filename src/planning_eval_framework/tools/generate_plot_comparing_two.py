@@ -2,11 +2,10 @@ import os
 import json
 import matplotlib.pyplot as plt
 import argparse
-import math
 import numpy as np
 
 from matplotlib.ticker import FuncFormatter
-from scipy.stats import norm
+from planning_eval_framework.utils import wilson_score_interval
 
 planner_dir_to_label = {
     "llm_ic": "LLM-as-planner",
@@ -61,33 +60,6 @@ def load_single_directory_results(swap_dir):
     
     return results
 
-def wilson_score_interval(p, N, confidence=0.95):
-    if N <= 0:
-        raise ValueError("Sample size N must be greater than 0.")
-    if not (0 <= p <= 1):
-        raise ValueError("Probability p must be between 0 and 1.")
-    
-    # Calculate the Z-score based on the confidence level
-    z = norm.ppf((1 + confidence) / 2)
-    
-    # Compute the components for the Wilson score interval
-    denominator = 1 + z**2 / N
-    centre_adjusted_probability = p + z**2 / (2 * N)
-    adjusted_standard_deviation = math.sqrt((p * (1 - p) + z**2 / (4 * N)) / N)
-    
-    # Calculate the lower and upper bounds
-    lower_bound = (centre_adjusted_probability - z * adjusted_standard_deviation) / denominator
-    upper_bound = (centre_adjusted_probability + z * adjusted_standard_deviation) / denominator
-    
-    # Ensure bounds are within [0, 1] range
-    lower_bound = max(lower_bound, 0)
-    upper_bound = min(upper_bound, 1)
-
-    if p == 0:
-        lower_bound = 0
-    
-    return lower_bound, upper_bound
-
 def plot_results(results1, results2, dir1_label, dir2_label, base_dir, x_label1, x_label2):
     metrics = ['safe', 'successful']
     
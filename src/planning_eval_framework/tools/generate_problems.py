@@ -0,0 +1,30 @@
+import argparse
+
+from planning_eval_framework.problem_generator import available_problem_generators, problem_name, write_problem
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic problems of a domain, to be used with --tasks-dir.")
+    parser.add_argument("domain", type=str, choices=available_problem_generators.keys(), help="Domain of the problems.")
+    parser.add_argument("out_dir", type=str, help="Directory where the problem files are written.")
+    parser.add_argument("--locations", type=int, nargs="+", default=[8], help="Numbers of locations.")
+    parser.add_argument("--objects", type=int, nargs="+", default=[4], help="Numbers of objects (food items in overcooked).")
+    parser.add_argument("--humans", type=int, nargs="+", default=None, help="Numbers of humans (default: 1 in manipulation, 0 in overcooked).")
+    parser.add_argument("--constraints", type=int, nargs="+", default=[2], help="Numbers of constraints.")
+    parser.add_argument("--seeds", type=int, default=1, help="Problems generated for each size.")
+    args = parser.parse_args()
+
+    generate = available_problem_generators[args.domain]
+    humans_list = args.humans if args.humans is not None else [1 if args.domain == "manipulation" else 0]
+    count = 0
+    for locations in args.locations:
+        for objects in args.objects:
+            for humans in humans_list:
+                for constraints in args.constraints:
+                    for seed in range(args.seeds):
+                        problem = generate(locations, objects, humans, constraints, seed)
+                        write_problem(problem, args.out_dir, problem_name(args.domain, locations, objects, humans, constraints, seed))
+                        count += 1
+    print(f"[info] {count} {args.domain} problems written to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
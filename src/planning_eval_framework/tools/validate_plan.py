@@ -1,39 +1,130 @@
 import argparse
-from juliacall import Main as jl
-from plan_evaluator import PlanEvaluator
+import glob
+import json
+import multiprocessing
+import os
+import sys
+from functools import lru_cache, partial
 
-# Initialize Julia and load PDDL package
-jl.seval('using PDDL, SymbolicPlanners')
+from planning_eval_framework.config import DEFAULT_EVALUATOR_BACKEND
 
 def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("domain_file", type=str, help="Path to the domain PDDL file.")
-    parser.add_argument("problem_file", type=str, help="Path to the problem PDDL file.")
-    parser.add_argument("plan_file", type=str, help="Path to the plan PDDL file.")
-    
+    parser = argparse.ArgumentParser(description="Validate PDDL plans against a domain and problem. "
+                                                 "Either a single domain/problem/plan triple, or a batch given by --manifest or --plans.")
+    parser.add_argument("domain_file", type=str, nargs="?", help="Path to the domain PDDL file.")
+    parser.add_argument("problem_file", type=str, nargs="?", help="Path to the problem PDDL file.")
+    parser.add_argument("plan_file", type=str, nargs="?", help="Path to the plan PDDL file.")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="JSONL file with one {\"domain\", \"problem\", \"plan\"} entry per line. Relative paths are resolved against the manifest directory.")
+    parser.add_argument("--plans", type=str, nargs="+", default=None,
+                        help="Glob patterns of plan files, validated against domain_file and problem_file.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes used in batch mode.")
+    parser.add_argument("--output", type=str, default=None, help="File where JSONL results are written in batch mode (default: stdout).")
+    parser.add_argument("--backend", type=str, choices=["auto", "julia", "numpy"], default=DEFAULT_EVALUATOR_BACKEND,
+                        help="Plan simulation backend. \"auto\" uses numpy for STRIPS domains and julia otherwise.")
+
     args = parser.parse_args()
 
+    if args.manifest is not None or args.plans is not None:
+        run_batch(args)
+    else:
+        if args.domain_file is None or args.problem_file is None or args.plan_file is None:
+            parser.error("domain_file, problem_file and plan_file are required unless --manifest or --plans is given")
+        run_single(args.domain_file, args.problem_file, args.plan_file, args.backend)
+
+def run_single(domain_file, problem_file, plan_file, backend=DEFAULT_EVALUATOR_BACKEND):
+    from planning_eval_framework import server
+
     # Read the PDDL files
-    with open(args.domain_file, 'r') as domain_file:
-        domain_pddl_text = domain_file.read()
-    
-    with open(args.problem_file, 'r') as problem_file:
-        problem_pddl_text = problem_file.read()
-    
-    with open(args.plan_file, 'r') as plan_file:
-        plan_pddl_text = plan_file.read()
-
-    # Run the symbolic planner
-    planner_evaluator = PlanEvaluator(domain_pddl_text, problem_pddl_text, plan_pddl_text)
-    planner_evaluator.try_simulation()
-    results = {}
-    results["valid"] = planner_evaluator.is_valid()
-    if(results["valid"]):
-        results["successful"] = planner_evaluator.is_successful()
-        results["safe"] = planner_evaluator.is_safe()
+    with open(domain_file, 'r') as f:
+        domain_pddl_text = f.read()
+
+    with open(problem_file, 'r') as f:
+        problem_pddl_text = f.read()
+
+    with open(plan_file, 'r') as f:
+        plan_pddl_text = f.read()
+
+    # Run the symbolic planner, on the evaluation server if one is running
+    eval_client = server.connect()
+    if eval_client is not None:
+        results = eval_client.evaluate(domain_pddl_text, problem_pddl_text, plan_pddl_text, backend)
+    else:
+        from planning_eval_framework.plan_evaluator import evaluate_plan
+        results = evaluate_plan(domain_pddl_text, problem_pddl_text, plan_pddl_text, backend)
 
     # Print the solution
     print(results)
 
+def grab_batch_entries(args):
+    entries = []
+    if args.manifest is not None:
+        manifest_dir = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                for key in ("domain", "problem", "plan"):
+                    if key not in entry:
+                        raise ValueError(f"Manifest entry is missing '{key}': {line.strip()}")
+                    entry[key] = os.path.join(manifest_dir, entry[key])
+                entries.append(entry)
+    if args.plans is not None:
+        if args.domain_file is None or args.problem_file is None:
+            raise ValueError("--plans requires domain_file and problem_file")
+        for pattern in args.plans:
+            for plan_fn in sorted(glob.glob(pattern, recursive=True)):
+                entries.append({"domain": args.domain_file, "problem": args.problem_file, "plan": plan_fn})
+    return entries
+
+def run_batch(args):
+    entries = grab_batch_entries(args)
+    validate_entry = partial(_validate_entry, backend=args.backend)
+
+    output = open(args.output, 'w') if args.output is not None else sys.stdout
+    try:
+        if args.workers > 1:
+            # Julia does not survive a fork, so workers are spawned and each one loads it once
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(processes=args.workers, initializer=_init_worker) as pool:
+                for result in pool.imap_unordered(validate_entry, entries):
+                    _write_result(output, result)
+        else:
+            _init_worker()
+            for entry in entries:
+                _write_result(output, validate_entry(entry))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+def _write_result(output, result):
+    output.write(json.dumps(result) + "\n")
+    output.flush()
+
+def _init_worker():
+    # load the evaluator before the first plan arrives; Julia itself only starts
+    # once a plan needs the julia backend
+    import planning_eval_framework.plan_evaluator
+
+@lru_cache(maxsize=256)
+def _read_file(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+def _validate_entry(entry, backend=DEFAULT_EVALUATOR_BACKEND):
+    from planning_eval_framework.plan_evaluator import evaluate_plan
+
+    result = dict(entry)
+    try:
+        domain_pddl_text = _read_file(entry["domain"])
+        problem_pddl_text = _read_file(entry["problem"])
+        with open(entry["plan"], 'r') as f:
+            plan_pddl_text = f.read()
+        result.update(evaluate_plan(domain_pddl_text, problem_pddl_text, plan_pddl_text, backend))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,105 @@
+import json
+import os
+from functools import lru_cache
+
+from .config import TRANSLATION_CACHE_FILE, TRANSLATION_MAX_IDLE_RUNS
+from .profiling import profiler
+from .utils import connect_sqlite
+
+###############################################################################
+#
+# Persistent cache of sentence translations
+#
+# The back_trans and back_transcription recipes run translation or speech
+# models on every sentence of a description, although the same sentences come
+# back across tasks, description components, swap levels and runs. The
+# distinct outputs of the models for a sentence are kept in a pool, keyed by
+# recipe, model and sentence, in a SQLite file shared by all the processes of
+# a host. Perturbations are drawn from the pool in order, so asking for more
+# perturbations of a description (e.g. a new round of --adaptive) returns the
+# next candidates, and the models only run when the pool is too small. Once
+# TRANSLATION_MAX_IDLE_RUNS model runs in a row add no new candidate, the pool
+# is exhausted and the models are not run again for that sentence.
+#
+###############################################################################
+
+CACHE_ENV_VAR = "PLANNING_EVAL_TRANSLATION_CACHE"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    recipe TEXT NOT NULL,
+    model TEXT NOT NULL,
+    sentence TEXT NOT NULL,
+    candidates TEXT NOT NULL,
+    idle_runs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (recipe, model, sentence)
+)
+"""
+
+def model_id(augmenter):
+    """Identifies the models of a TextAttack augmenter by its transformation class and settings,
+    e.g. languages and model names."""
+    transformation = getattr(augmenter, "transformation", augmenter)
+    settings = {name: value for name, value in sorted(vars(transformation).items()) if isinstance(value, (str, int, float, bool))}
+    return json.dumps([type(transformation).__name__, settings])
+
+class TranslationCache:
+    def __init__(self, path, max_idle_runs=TRANSLATION_MAX_IDLE_RUNS):
+        self.path = path
+        self.max_idle_runs = max_idle_runs
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return connect_sqlite(self.path)
+
+    def get(self, recipe, model, sentence):
+        """Candidates of the sentence and whether its pool is exhausted."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT candidates, idle_runs FROM translations WHERE recipe = ? AND model = ? AND sentence = ?",
+                               (recipe, model, sentence)).fetchone()
+        if row is None:
+            return [], False
+        return json.loads(row[0]), row[1] >= self.max_idle_runs
+
+    def extend(self, recipe, model, sentence, outputs):
+        """Add the new distinct model outputs to the pool of the sentence, counting the run as idle
+        if there is none. Returns the pool and whether it is exhausted."""
+        with self._connect() as conn:
+            # other processes may have extended the pool meanwhile
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT candidates, idle_runs FROM translations WHERE recipe = ? AND model = ? AND sentence = ?",
+                               (recipe, model, sentence)).fetchone()
+            candidates, idle_runs = (json.loads(row[0]), row[1]) if row is not None else ([], 0)
+            new_candidates = [output for output in dict.fromkeys(outputs) if output not in candidates]
+            candidates += new_candidates
+            idle_runs = 0 if new_candidates else idle_runs + 1
+            conn.execute("INSERT OR REPLACE INTO translations (recipe, model, sentence, candidates, idle_runs) VALUES (?, ?, ?, ?, ?)",
+                         (recipe, model, sentence, json.dumps(candidates), idle_runs))
+            conn.execute("COMMIT")
+        return candidates, idle_runs >= self.max_idle_runs
+
+    def translate(self, augmenter, recipe, sentence, perturbations_number, start_index=0):
+        """Candidates start_index to start_index + perturbations_number of the sentence, running the
+        augmenter only when the pool is too small. Fewer are returned once the pool is exhausted."""
+        model = model_id(augmenter)
+        candidates, exhausted = self.get(recipe, model, sentence)
+        end_index = start_index + perturbations_number
+        if len(candidates) >= end_index or exhausted:
+            profiler.count("translation_cache_hits")
+        while len(candidates) < end_index and not exhausted:
+            profiler.count("translation_cache_misses")
+            candidates, exhausted = self.extend(recipe, model, sentence, augmenter.augment(sentence))
+        return candidates[start_index:end_index]
+
+@lru_cache(maxsize=None)
+def _open_translation_cache(path):
+    return TranslationCache(path)
+
+def get_translation_cache():
+    """Translation cache of the process, or None when it is disabled."""
+    path = os.environ.get(CACHE_ENV_VAR, TRANSLATION_CACHE_FILE)
+    if path is None or path.lower() == "off":
+        return None
+    return _open_translation_cache(path)
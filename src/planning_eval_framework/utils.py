@@ -1,2 +1,52 @@
+import math
+import sqlite3
+from statistics import NormalDist
+
 def postprocess(x):
-    return x.strip()
\ No newline at end of file
+    return x.strip()
+
+def wilson_score_interval(p, N, confidence=0.95):
+    if N <= 0:
+        raise ValueError("Sample size N must be greater than 0.")
+    if not (0 <= p <= 1):
+        raise ValueError("Probability p must be between 0 and 1.")
+    
+    # Calculate the Z-score based on the confidence level
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    
+    # Compute the components for the Wilson score interval
+    denominator = 1 + z**2 / N
+    centre_adjusted_probability = p + z**2 / (2 * N)
+    adjusted_standard_deviation = math.sqrt((p * (1 - p) + z**2 / (4 * N)) / N)
+    
+    # Calculate the lower and upper bounds
+    lower_bound = (centre_adjusted_probability - z * adjusted_standard_deviation) / denominator
+    upper_bound = (centre_adjusted_probability + z * adjusted_standard_deviation) / denominator
+    
+    # Ensure bounds are within [0, 1] range
+    lower_bound = max(lower_bound, 0)
+    upper_bound = min(upper_bound, 1)
+
+    if p == 0:
+        lower_bound = 0
+    
+    return lower_bound, upper_bound
+
+class _closing:
+    """sqlite3 connections only commit or roll back as context managers, they are not closed."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is not None and self.conn.in_transaction:
+            self.conn.execute("ROLLBACK")
+        self.conn.close()
+
+def connect_sqlite(path):
+    """Connection to the SQLite file as a context manager that closes it. Transactions are opened
+    explicitly (isolation_level=None), and locks held by other processes are waited for."""
+    return _closing(sqlite3.connect(path, timeout=60, isolation_level=None))
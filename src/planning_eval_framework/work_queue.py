@@ -0,0 +1,167 @@
+import json
+import os
+import socket
+import threading
+import time
+
+from .config import WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS
+from .utils import connect_sqlite
+
+###############################################################################
+#
+# Shared work queue of sweep units
+#
+# A sweep is materialized as work units (task x swap level x perturbation x
+# method) in a SQLite file in the run directory, and any number of worker
+# processes, on any host that sees the same filesystem, claim units one at a
+# time. A claimed unit is leased for a limited time and the lease is renewed
+# while the unit runs, so the units of a worker that crashed or lost its host
+# become claimable again once their lease expires. Each operation opens its
+# own connection and claims run in an IMMEDIATE transaction, which SQLite
+# serializes with file locks; the default rollback journal is kept since WAL
+# mode does not work over network filesystems.
+#
+###############################################################################
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+)
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkUnit:
+    def __init__(self, unit_id, key, payload, attempts):
+        self.id = unit_id
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=WORK_QUEUE_LEASE_SECONDS, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return connect_sqlite(self.path)
+
+    def enqueue(self, units):
+        """Add {key: payload} units. Keys that are already queued are skipped, so a sweep can be
+        enqueued again to add its missing units. Returns the number of units added."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            added = 0
+            for key, payload in units.items():
+                cursor = conn.execute("INSERT OR IGNORE INTO units (key, payload) VALUES (?, ?)", (key, json.dumps(payload)))
+                added += cursor.rowcount
+            conn.execute("COMMIT")
+        return added
+
+    def claim(self, worker_id):
+        """Lease the next pending unit, or a unit whose lease expired, to the worker. Returns None
+        when there is nothing to claim. Units whose lease expired on their last attempt, e.g.
+        because they keep crashing their worker, are marked as failed instead."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE units SET status = 'failed', lease_expires = NULL, error = 'lease expired on the last attempt' "
+                         "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = conn.execute("SELECT id, key, payload, attempts FROM units "
+                               "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                               "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            unit_id, key, payload, attempts = row
+            conn.execute("UPDATE units SET status = 'leased', worker = ?, lease_expires = ?, attempts = ? WHERE id = ?",
+                         (worker_id, now + self.lease_seconds, attempts + 1, unit_id))
+            conn.execute("COMMIT")
+        return WorkUnit(unit_id, key, json.loads(payload), attempts + 1)
+
+    def renew(self, unit, worker_id):
+        """Extend the lease of a unit. Returns False if the worker lost the lease."""
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE units SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                                  (time.time() + self.lease_seconds, unit.id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, unit, worker_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE units SET status = 'done', lease_expires = NULL, error = NULL WHERE id = ? AND worker = ?",
+                         (unit.id, worker_id))
+
+    def fail(self, unit, worker_id, error):
+        """Give a failed unit back to the queue, or mark it as failed after max_attempts attempts."""
+        status = "failed" if unit.attempts >= self.max_attempts else "pending"
+        with self._connect() as conn:
+            conn.execute("UPDATE units SET status = ?, lease_expires = NULL, error = ? WHERE id = ? AND worker = ?",
+                         (status, error, unit.id, worker_id))
+
+    def release(self, unit, worker_id):
+        """Give an unfinished unit back to the queue without counting the attempt, e.g. when its
+        worker is stopped."""
+        with self._connect() as conn:
+            conn.execute("UPDATE units SET status = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1 "
+                         "WHERE id = ? AND worker = ? AND status = 'leased'", (unit.id, worker_id))
+
+    def counts(self):
+        """Number of units in each status."""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall())
+
+    def payloads(self):
+        with self._connect() as conn:
+            return [json.loads(payload) for (payload,) in conn.execute("SELECT payload FROM units ORDER BY id")]
+
+    def is_drained(self):
+        counts = self.counts()
+        return counts.get("pending", 0) == 0 and counts.get("leased", 0) == 0
+
+class LeaseKeeper:
+    """Renews the lease of a unit in a background thread while the unit runs."""
+
+    def __init__(self, work_queue, unit, worker_id):
+        self.work_queue = work_queue
+        self.unit = unit
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._renew, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def _renew(self):
+        while not self.stopped.wait(self.work_queue.lease_seconds / 3):
+            if not self.work_queue.renew(self.unit, self.worker_id):
+                print(f"[warning] lease of work unit {self.unit.key} was lost")
+                return
+
+def allocate_run(directory):
+    """Create the next runN directory and return N. mkdir is atomic, also on shared filesystems,
+    so concurrent processes never get the same run."""
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        run_numbers = [int(item[3:]) for item in os.listdir(directory) if item.startswith("run") and item[3:].isdigit()]
+        run = max(run_numbers) + 1 if run_numbers else 0
+        try:
+            os.mkdir(os.path.join(directory, f"run{run}"))
+            return run
+        except FileExistsError:
+            continue
@@ -0,0 +1,115 @@
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from .config import WORKER_MAX_UNITS, WORKER_MAX_RSS_MB, WORKER_MEMORY_CHECK_INTERVAL
+
+###############################################################################
+#
+# Lifecycle of the worker processes of a sweep
+#
+# Julia, PyTorch and TextAttack stay resident for the whole life of a worker,
+# and its memory grows with every problem it parses and every matcher it
+# builds. Rather than running until the OOM killer ends it in the middle of
+# a multi-day sweep, a worker is recycled: after a number of units, or as soon
+# as its resident memory exceeds a ceiling, it gives its unit back to the work
+# queue and exits with RECYCLE_EXIT_CODE, and a fresh process takes its place.
+# Workers are started with subprocess rather than forked, since Julia does not
+# survive a fork.
+#
+###############################################################################
+
+# EX_TEMPFAIL: the worker stopped on purpose and should be started again
+RECYCLE_EXIT_CODE = 75
+
+def rss_bytes():
+    """Current resident memory of the process. Falls back on the peak resident memory where
+    /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+class WorkerLifecycle:
+    """Decides when a worker has to be recycled, and watches its memory while a unit runs."""
+
+    def __init__(self, max_units=WORKER_MAX_UNITS, max_rss_mb=WORKER_MAX_RSS_MB, check_interval=WORKER_MEMORY_CHECK_INTERVAL):
+        self.max_units = max_units
+        self.max_rss = max_rss_mb * 1024 * 1024 if max_rss_mb is not None else None
+        self.check_interval = check_interval
+        self.units = 0
+
+    def over_memory_ceiling(self):
+        return self.max_rss is not None and rss_bytes() > self.max_rss
+
+    def unit_done(self):
+        """Count a finished unit. Returns the reason to recycle the worker, or None."""
+        self.units += 1
+        if self.max_units is not None and self.units >= self.max_units:
+            return f"ran {self.units} units"
+        if self.over_memory_ceiling():
+            return f"uses {rss_bytes() / 2**20:.0f} MB"
+        return None
+
+    def watch(self, on_exceeded):
+        """Context manager calling on_exceeded from a background thread if the memory ceiling is
+        exceeded while the unit runs. on_exceeded is expected to end the process."""
+        return _MemoryWatchdog(self, on_exceeded)
+
+class _MemoryWatchdog:
+    def __init__(self, lifecycle, on_exceeded):
+        self.lifecycle = lifecycle
+        self.on_exceeded = on_exceeded
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+
+    def __enter__(self):
+        if self.lifecycle.max_rss is not None:
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _watch(self):
+        while not self.stopped.wait(self.lifecycle.check_interval):
+            if self.lifecycle.over_memory_ceiling():
+                self.on_exceeded()
+                return
+
+def supervise_workers(worker_command, processes, is_drained, poll_interval=1.0):
+    """Run `processes` worker processes, worker_command(i) being the command line of the i-th one,
+    and start a recycled or killed worker again as long as the queue is not drained."""
+    def start(i):
+        return subprocess.Popen(worker_command(i))
+
+    workers = {i: start(i) for i in range(processes)}
+    try:
+        while workers:
+            time.sleep(poll_interval)
+            for i, worker in list(workers.items()):
+                code = worker.poll()
+                if code is None:
+                    continue
+                del workers[i]
+                # negative codes: killed by a signal, e.g. by the OOM killer
+                if (code == RECYCLE_EXIT_CODE or code < 0) and not is_drained():
+                    print(f"[info] worker process {i} exited with code {code}, starting it again")
+                    workers[i] = start(i)
+                elif code not in (0, RECYCLE_EXIT_CODE):
+                    print(f"[warning] worker process {i} exited with code {code}")
+    except KeyboardInterrupt:
+        # workers give their units back to the queue on SIGTERM
+        for worker in workers.values():
+            worker.terminate()
+        for worker in workers.values():
+            worker.wait()
+        raise
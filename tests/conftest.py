@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+DOMAINS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "planning_eval_framework", "domains")
+MANIPULATION_DIR = os.path.join(DOMAINS_DIR, "manipulation")
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read()
+
+@pytest.fixture(scope="session")
+def manipulation_domain():
+    return _read(os.path.join(MANIPULATION_DIR, "domain.pddl"))
+
+@pytest.fixture(scope="session")
+def manipulation_problems():
+    """Problem PDDL of the manipulation tasks p01 to p04, by name."""
+    return {name: _read(os.path.join(MANIPULATION_DIR, f"{name}.pddl")) for name in ("p01", "p02", "p03", "p04")}
+
+@pytest.fixture(scope="session")
+def overcooked_domain():
+    return _read(os.path.join(DOMAINS_DIR, "overcooked", "domain.pddl"))
+
+@pytest.fixture(scope="session")
+def hashing_embedding_model():
+    """Deterministic offline embedding model of the benchmarks."""
+    sys.path.insert(0, BENCHMARKS_DIR)
+    try:
+        from stubs import HashingEmbeddingModel
+    finally:
+        sys.path.remove(BENCHMARKS_DIR)
+    return HashingEmbeddingModel()
@@ -0,0 +1,73 @@
+import copy
+import os
+
+import pytest
+
+from planning_eval_framework import batch
+from planning_eval_framework.mock_llm_server import MockLLMServer
+from planning_eval_framework.stub_planner import available_stub_planners
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+STUB_SETTINGS = {"stub_latency": 0.0, "stub_latency_jitter": 0.0, "stub_error_rate": 0.0, "stub_rate_limit_rate": 0.0,
+                 "stub_corruption_rate": 0.0, "seed": 0}
+
+@pytest.fixture
+def batch_service(tmp_path, monkeypatch):
+    # the batches are processed by a subprocess running the package from the source tree
+    monkeypatch.setenv("PYTHONPATH", SRC_DIR)
+    return batch.LocalBatchService(str(tmp_path / "batches"))
+
+def _submit(batch_service, tmp_path, requests, stub_settings=None):
+    requests_file = str(tmp_path / "batch_requests.jsonl")
+    batch.write_jsonl(requests_file, requests)
+    batch_id = batch_service.submit(requests_file, stub_settings)
+    status = batch_service.wait(batch_id, poll_interval=0.1)
+    return status, {row["custom_id"]: row for row in batch_service.results(batch_id)}
+
+def test_stub_planner_batch_is_submitted_polled_and_ingested(batch_service, tmp_path):
+    replay_dir = tmp_path / "replay"
+    replay_dir.mkdir()
+    plans = {"task_1": "(pick guitar bedroom)", "task_2": "(move bedroom kitchen)\n(drop guitar kitchen)"}
+    for task_name, plan in plans.items():
+        (replay_dir / f"{task_name}.pddl").write_text(plan)
+
+    planner = copy.copy(available_stub_planners["stub_replay"])
+    requests = []
+    for task_name in [*plans, "task_3"]:
+        planner.set_context(None, "manipulation", task_name)
+        requests.append(batch.make_request(f"run|{task_name}", planner, "init", "goal", "constraints", "domain", "(define)"))
+    # provider shaped requests
+    assert all(r["url"] == "/v1/chat/completions" and r["body"]["model"] == "stub_replay" for r in requests)
+    assert requests[0]["body"]["messages"][-1]["content"] == "Initial state: init\nGoal: goal\nConstraints: constraints"
+
+    status, results = _submit(batch_service, tmp_path, requests, {**STUB_SETTINGS, "stub_replay_dir": str(replay_dir)})
+    assert status == {"status": "completed", "total": 3, "completed": 3, "failed": 0}
+    for task_name, plan in plans.items():
+        assert batch.parse_result(planner, results[f"run|{task_name}"]).plan_pddl == plan
+    # a task without a stored plan gives an empty result, like an interactive call
+    assert batch.parse_result(planner, results["run|task_3"]).plan_pddl is None
+
+def test_chat_completions_requests_are_sent_to_the_api(batch_service, tmp_path, monkeypatch):
+    with MockLLMServer(reply=lambda body: body["messages"][-1]["content"].upper()) as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+        server.fail_next(400)
+        requests = [{"custom_id": f"request-{i}", "method": "POST", "url": batch.CHAT_COMPLETIONS_URL,
+                     "body": {"model": "gpt-mock", "messages": [{"role": "user", "content": f"plan {i}"}]}}
+                    for i in range(3)]
+        status, results = _submit(batch_service, tmp_path, requests)
+
+    assert status["status"] == "completed" and status["failed"] == 1
+    # the request answered with the error is not retried
+    failed = [row for row in results.values() if row["error"] is not None]
+    assert len(failed) == 1 and len(server.requests) == 3
+    with pytest.raises(RuntimeError):
+        batch.parse_result(available_stub_planners["stub_replay"], failed[0])
+    for custom_id, row in results.items():
+        if row["error"] is None:
+            content = row["response"]["body"]["choices"][0]["message"]["content"]
+            assert content == f"PLAN {custom_id.split('-')[1]}"
+
+def test_planners_without_chat_completions_requests_cannot_be_batched():
+    with pytest.raises(ValueError):
+        batch.make_request("run|task_1", object(), "init", "goal", "constraints", "domain", "(define)")
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("juliacall")
+pytest.importorskip("llm_planners")
+
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.plan_evaluator import PlanBeamSearchMatcher, configure_plan_matching
+
+# two locations, so that every successor of the robot in the second one is a state of an
+# earlier step: going back to the first location or staying in the second one
+TWO_LOCATIONS_PROBLEM = """(define (problem two-locations)
+(:domain manipulation)
+(:objects a b - location guitar - object)
+(:init (robot-at a) (at guitar a) (hand-empty))
+(:goal (at guitar b)))
+"""
+
+def _result(plan):
+    return SimpleNamespace(plan_pddl="\n".join(plan), plan_json=None, task_pddl=None)
+
+def _lines(plan_pddl):
+    return [line.strip() for line in str(plan_pddl).splitlines() if line.strip()]
+
+def _revisiting_plan(task):
+    """Back and forth walk of the robot, and a pick of an object placed back where it was."""
+    applicable = [task.action_texts[a] for a in task.applicable(task.init_state).nonzero()[0]]
+    go_to = next(text for text in applicable if text.startswith("(go-to") and len(set(text.strip("()").split()[1:])) == 2)
+    _, here, there = go_to.strip("()").split()
+    back = f"(go-to {there} {here})"
+    plan = [go_to, back]
+    picks = [text for text in applicable if text.startswith("(pick")]
+    if picks:
+        obj = picks[0].strip("()").split()[1]
+        plan += [picks[0], f"(place {obj} {here})"]
+    return plan + [go_to, back]
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_plans_revisiting_a_state_are_matched(manipulation_domain, manipulation_problems, hashing_embedding_model, problem_name):
+    problem_pddl = manipulation_problems[problem_name]
+    plan = _revisiting_plan(ground(manipulation_domain, problem_pddl))
+    matcher = PlanBeamSearchMatcher(manipulation_domain, problem_pddl, hashing_embedding_model, beam_width=2)
+    assert _lines(matcher.plan_closest_match(_result(plan))) == plan
+
+@pytest.mark.parametrize("beam_width", [1, 5])
+def test_layers_of_already_seen_states_are_expanded(manipulation_domain, hashing_embedding_model, beam_width):
+    plan = ["(go-to a b)", "(go-to b a)", "(go-to a b)", "(go-to b b)"]
+    matcher = PlanBeamSearchMatcher(manipulation_domain, TWO_LOCATIONS_PROBLEM, hashing_embedding_model, beam_width=beam_width)
+    assert _lines(matcher.plan_closest_match(_result(plan))) == plan
+
+def test_lexical_matching_is_rejected(manipulation_domain, manipulation_problems, hashing_embedding_model):
+    with pytest.raises(ValueError):
+        configure_plan_matching(SimpleNamespace(lexical_matching=True, plan_matcher="beam_search"))
+    with pytest.raises(ValueError):
+        PlanBeamSearchMatcher(manipulation_domain, manipulation_problems["p01"], hashing_embedding_model, lexical_matching=True)
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from planning_eval_framework import evaluation_memo
+from planning_eval_framework.evaluation_memo import EvaluationMemo
+from planning_eval_framework.profiling import profiler
+from planning_eval_framework.translation_cache import TranslationCache
+
+class _Augmenter:
+    """Returns the next outputs of a fixed list of translations, two at a time."""
+
+    def __init__(self, outputs):
+        # the model of the cached translations, as in TextAttack augmenters
+        self.transformation = SimpleNamespace(target_language="fr")
+        self.outputs = outputs
+        self.calls = 0
+
+    def augment(self, sentence):
+        outputs = self.outputs[2 * self.calls:2 * self.calls + 2]
+        self.calls += 1
+        return outputs
+
+def test_translation_cache_hits_and_misses(tmp_path):
+    cache = TranslationCache(str(tmp_path / "translations.sqlite"))
+    augmenter = _Augmenter(["a", "b", "c", "d"])
+    with profiler.plan("translations") as record:
+        assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2) == ["a", "b"]
+        assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2) == ["a", "b"]
+    assert augmenter.calls == 1
+    assert record["counters"] == {"translation_cache_misses": 1, "translation_cache_hits": 1}
+
+    # the pool is shared with other processes through the file
+    other = TranslationCache(str(tmp_path / "translations.sqlite"))
+    assert other.translate(_Augmenter([]), "back_trans", "The robot is in the garage.", 2) == ["a", "b"]
+
+def test_translation_pools_are_exhausted_after_idle_runs(tmp_path):
+    cache = TranslationCache(str(tmp_path / "translations.sqlite"), max_idle_runs=2)
+    # the model repeats itself before giving new outputs
+    augmenter = _Augmenter(["a", "b", "a", "b", "c", "d", "c", "d", "c", "d"])
+    assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2) == ["a", "b"]
+    assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2, start_index=2) == ["c", "d"]
+    assert augmenter.calls == 3
+    # two runs in a row without new outputs exhaust the pool
+    assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2, start_index=4) == []
+    assert augmenter.calls == 5
+    assert cache.translate(augmenter, "back_trans", "The robot is in the garage.", 2, start_index=4) == []
+    assert augmenter.calls == 5
+
+def test_evaluation_memo_hits_and_misses(tmp_path):
+    memo = EvaluationMemo(str(tmp_path / "memo.sqlite"))
+    key = memo.key("(define (domain d))", "(define (problem p))", "(pick guitar bedroom)\n(go-to bedroom kitchen)", "numpy")
+    # case, whitespace, blank and comment lines do not change the key
+    assert memo.key("(define (domain d))", "(define (problem p))", "; plan\n(PICK guitar  bedroom)\n\n(go-to bedroom kitchen)", "numpy") == key
+    assert memo.key("(define (domain d))", "(define (problem p))", "(pick guitar bedroom)", "numpy") != key
+    assert memo.key("(define (domain d))", "(define (problem p))", "(pick guitar bedroom)\n(go-to bedroom kitchen)", "julia") != key
+
+    results = {"valid": True, "successful": True, "safe": False, "constraint_violations": {"(always (not (robot-at kitchen)))": 2}}
+    with profiler.plan("memo") as record:
+        assert memo.get(key) is None
+        memo.put(key, results)
+        memoized = memo.get(key)
+    assert memoized == results
+    assert record["counters"] == {"evaluation_memo_misses": 1, "evaluation_memo_hits": 1}
+
+    # callers get copies that they can complete in place
+    memoized["profile"] = {}
+    assert "profile" not in memo.get(key)
+    # persisted results are found by other processes
+    assert EvaluationMemo(str(tmp_path / "memo.sqlite")).get(key) == results
+    assert EvaluationMemo().get(key) is None
+
+def test_evaluation_memo_keys_depend_on_the_evaluator_code(tmp_path, monkeypatch):
+    memo = EvaluationMemo(str(tmp_path / "memo.sqlite"))
+    args = ("(define (domain d))", "(define (problem p))", "(pick guitar bedroom)", "numpy")
+    key = memo.key(*args)
+    memo.put(key, {"valid": True})
+    # results persisted by another version of the evaluators are not found
+    monkeypatch.setattr(evaluation_memo, "evaluator_version", lambda: "changed")
+    assert memo.key(*args) != key
+    assert EvaluationMemo(str(tmp_path / "memo.sqlite")).get(memo.key(*args)) is None
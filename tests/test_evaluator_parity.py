@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+pytest.importorskip("juliacall")
+pytest.importorskip("llm_planners")
+
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.problem_generator import generate_manipulation
+from planning_eval_framework.tools.check_evaluator_parity import check_evaluator_parity, random_plans
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_numpy_and_julia_backends_agree(manipulation_domain, manipulation_problems, problem_name):
+    problem_pddl = manipulation_problems[problem_name]
+    plans = random_plans(ground(manipulation_domain, problem_pddl), 30, random.Random(problem_name))
+    assert check_evaluator_parity(manipulation_domain, problem_pddl, plans) == []
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_numpy_and_julia_backends_agree_on_generated_problems(manipulation_domain, seed):
+    problem = generate_manipulation(8, 4, 1, 3, seed)
+    plans = random_plans(ground(manipulation_domain, problem["pddl"]), 20, random.Random(seed))
+    plans.append("\n".join(problem["plan"]))
+    assert check_evaluator_parity(manipulation_domain, problem["pddl"], plans) == []
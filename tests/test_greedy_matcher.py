@@ -0,0 +1,62 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("llm_planners")
+
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.plan_evaluator import PlanGreedyActionMatcher
+
+def _random_walk(task, rng):
+    state, plan = task.init_state, []
+    for _ in range(10):
+        action = int(rng.choice(task.applicable(state).nonzero()[0]))
+        state = task.apply(state, action)
+        plan.append(task.action_texts[action])
+    return plan
+
+class _CountingModel:
+    """Embedding model counting the texts it encodes."""
+
+    def __init__(self, model):
+        self.model = model
+        self.encoded = []
+
+    def encode(self, sentences):
+        self.encoded.extend([sentences] if isinstance(sentences, str) else sentences)
+        return self.model.encode(sentences)
+
+    def similarity(self, embeddings1, embeddings2):
+        return self.model.similarity(embeddings1, embeddings2)
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_applicable_steps_are_matched_without_encoding(manipulation_domain, manipulation_problems, hashing_embedding_model, problem_name):
+    problem_pddl = manipulation_problems[problem_name]
+    model = _CountingModel(hashing_embedding_model)
+    matcher = PlanGreedyActionMatcher(manipulation_domain, problem_pddl, model, lexical_matching=False)
+    task = ground(manipulation_domain, problem_pddl)
+    rng = random.Random(problem_name)
+    for _ in range(5):
+        plan = _random_walk(task, rng)
+        planner_result = SimpleNamespace(plan_pddl="\n".join(plan), plan_json=None, task_pddl=None)
+        assert matcher.plan_closest_match(planner_result).splitlines() == plan
+    assert model.encoded == []
+
+def test_inapplicable_steps_are_matched_by_embedding(manipulation_domain, manipulation_problems, hashing_embedding_model):
+    model = _CountingModel(hashing_embedding_model)
+    matcher = PlanGreedyActionMatcher(manipulation_domain, manipulation_problems["p01"], model, lexical_matching=False)
+    # the robot starts in the garage, where the guitar is not
+    planner_result = SimpleNamespace(plan_pddl="(pick guitar garage)", plan_json=None, task_pddl=None)
+    assert matcher.plan_closest_match(planner_result) != "(pick guitar garage)"
+    assert "pick guitar garage" in model.encoded
+
+def test_lexical_exact_matches_are_looked_up_in_the_action_index(manipulation_domain, manipulation_problems, hashing_embedding_model):
+    model = _CountingModel(hashing_embedding_model)
+    matcher = PlanGreedyActionMatcher(manipulation_domain, manipulation_problems["p01"], model, lexical_matching=True)
+    plan = _random_walk(ground(manipulation_domain, manipulation_problems["p01"]), random.Random(0))
+    # not named exactly, but equal once normalized
+    variants = [step.upper().replace("-", "_") for step in plan]
+    planner_result = SimpleNamespace(plan_pddl="\n".join(variants), plan_json=None, task_pddl=None)
+    assert matcher.plan_closest_match(planner_result).splitlines() == plan
+    assert model.encoded == []
@@ -0,0 +1,45 @@
+import pytest
+
+from planning_eval_framework.grounding import UnsupportedPDDLError, ground, parse_sexpr, try_ground
+from planning_eval_framework.problem_generator import generate_manipulation, generate_overcooked
+from planning_eval_framework.strips_evaluator import StripsPlanEvaluator
+
+def test_parse_sexpr():
+    assert parse_sexpr("(pick Guitar bedroom) ; comment\n(go-to a b)") == [["pick", "guitar", "bedroom"], ["go-to", "a", "b"]]
+    with pytest.raises(ValueError):
+        parse_sexpr("(pick guitar")
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_manipulation_problems_are_grounded(manipulation_domain, manipulation_problems, problem_name):
+    task = ground(manipulation_domain, manipulation_problems[problem_name])
+    assert len(task.action_texts) > 0
+    assert task.init_state.shape == (len(task.atoms),)
+    assert task.applicable(task.init_state).any()
+    for i, text in enumerate(task.action_texts):
+        assert task.find_action(text) == i
+        assert task.find_action(text.upper()) == i
+    assert task.find_action("(fly guitar moon)") is None
+
+def test_try_ground_is_cached(manipulation_domain, manipulation_problems):
+    assert try_ground(manipulation_domain, manipulation_problems["p01"]) is try_ground(manipulation_domain, manipulation_problems["p01"])
+
+def test_adl_domains_are_not_grounded(overcooked_domain):
+    problem = generate_overcooked(locations=4, objects=2)
+    with pytest.raises(UnsupportedPDDLError):
+        ground(overcooked_domain, problem["pddl"])
+    assert try_ground(overcooked_domain, problem["pddl"]) is None
+
+@pytest.mark.parametrize("size", [(4, 2, 1, 1), (8, 4, 1, 2), (16, 8, 2, 4), (32, 12, 2, 6)])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_generated_problems_are_grounded_and_solved(manipulation_domain, size, seed):
+    locations, objects, humans, constraints = size
+    problem = generate_manipulation(locations, objects, humans, constraints, seed)
+    task = ground(manipulation_domain, problem["pddl"])
+    assert all(task.find_action(action) is not None for action in problem["plan"])
+
+    evaluator = StripsPlanEvaluator(manipulation_domain, problem["pddl"], "\n".join(problem["plan"]))
+    evaluator.try_simulation()
+    assert evaluator.is_valid()
+    assert evaluator.is_successful()
+    assert evaluator.is_safe()
+    assert all(step is None for step in evaluator.first_violations().values())
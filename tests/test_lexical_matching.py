@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("llm_planners")
+pytest.importorskip("sentence_transformers")
+
+from planning_eval_framework.embeddings import get_embedding_model
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.plan_evaluator import PlanGreedyActionMatcher
+
+def _near_exact_variants(text):
+    symbols = text.split()
+    variants = [text.upper(), text.replace("-", "_"), f"({text})"]
+    # one character missing from the longest argument
+    longest = max(range(1, len(symbols)), key=lambda i: len(symbols[i]), default=None)
+    if longest is not None and len(symbols[longest]) >= 6:
+        variants.append(" ".join(symbols[:longest] + [symbols[longest][:-1]] + symbols[longest+1:]))
+    return variants
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_lexical_tiers_pick_the_embedding_only_action(manipulation_domain, manipulation_problems, problem_name):
+    problem_pddl = manipulation_problems[problem_name]
+    model = get_embedding_model()
+    lexical = PlanGreedyActionMatcher(manipulation_domain, problem_pddl, model, lexical_matching=True)
+    embedding_only = PlanGreedyActionMatcher(manipulation_domain, problem_pddl, model, lexical_matching=False)
+
+    task = ground(manipulation_domain, problem_pddl)
+    state = task.init_state
+    for _ in range(3):
+        applicable = list(task.applicable(state).nonzero()[0])
+        candidates = [" ".join((task.action_names[a],) + tuple(task.action_args[a])) for a in applicable]
+        for i, text in enumerate(candidates):
+            assert lexical._closest_text_match(text, candidates) == i
+            assert embedding_only._closest_text_match(text, candidates) == i
+            for variant in _near_exact_variants(text):
+                assert lexical._closest_text_match(variant, candidates) == embedding_only._closest_text_match(variant, candidates), variant
+        state = task.apply(state, applicable[0])
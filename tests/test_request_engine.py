@@ -0,0 +1,100 @@
+import json
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from planning_eval_framework.mock_llm_server import MockLLMServer
+from planning_eval_framework.profiling import profiler
+from planning_eval_framework.request_engine import RequestEngine, TokenBucket
+
+@pytest.fixture
+def mock_server():
+    # replies with the prompt, so that results can be matched with their requests
+    with MockLLMServer(latency=0.05, reply=lambda body: body["messages"][-1]["content"]) as server:
+        yield server
+
+def _complete(server):
+    def request(prompt):
+        body = json.dumps({"model": "mock", "messages": [{"role": "user", "content": prompt}]}).encode()
+        http_request = urllib.request.Request(f"{server.url}/v1/chat/completions", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(http_request, timeout=10) as response:
+            return json.loads(response.read())
+    return request
+
+def _counters(fn):
+    before = dict(profiler.report()["counters"])
+    result = fn()
+    after = profiler.report()["counters"]
+    return result, {name: after[name] - before.get(name, 0) for name in after if after[name] != before.get(name, 0)}
+
+def test_requests_run_concurrently_up_to_the_limit(mock_server):
+    engine = RequestEngine(concurrency=4, backoff_base=0.01)
+    prompts = [f"task {i}" for i in range(16)]
+    results = engine.map(_complete(mock_server), prompts)
+    assert [r["choices"][0]["message"]["content"] for r in results] == prompts
+    assert len(mock_server.requests) == 16
+    assert mock_server.max_in_flight == 4
+
+def test_requests_run_one_at_a_time_for_planners_that_are_not_thread_safe(mock_server):
+    engine = RequestEngine(concurrency=4)
+    engine.map(_complete(mock_server), ["a", "b", "c"], in_thread=False)
+    assert mock_server.max_in_flight == 1
+
+def test_rate_limit_and_server_errors_are_retried(mock_server):
+    engine = RequestEngine(concurrency=2, max_retries=3, backoff_base=0.01, backoff_max=0.05, seed=0)
+    mock_server.fail_next(429, times=2)
+    mock_server.fail_next(503)
+    results, counters = _counters(lambda: engine.map(_complete(mock_server), ["a", "b"]))
+    assert all(not isinstance(r, Exception) for r in results)
+    assert counters["llm_retries"] == 3
+    assert counters["llm_request_attempts"] == 5
+    assert "llm_errors" not in counters
+
+def test_retry_after_is_respected(mock_server):
+    engine = RequestEngine(concurrency=1, max_retries=1, backoff_base=0.001, backoff_max=0.001)
+    mock_server.fail_next(429, retry_after=0.5)
+    start = time.monotonic()
+    results = engine.map(_complete(mock_server), ["a"])
+    assert not isinstance(results[0], Exception)
+    assert time.monotonic() - start >= 0.5
+
+def test_failures_are_returned_in_place_after_the_retries(mock_server):
+    engine = RequestEngine(concurrency=2, max_retries=2, backoff_base=0.01, backoff_max=0.01)
+    mock_server.fail_next(500, times=3)
+    results, counters = _counters(lambda: engine.map(_complete(mock_server), ["fails"]))
+    assert isinstance(results[0], urllib.error.HTTPError) and results[0].code == 500
+    assert counters["llm_request_attempts"] == 3
+    assert counters["llm_errors"] == 1
+
+def test_client_errors_are_not_retried(mock_server):
+    engine = RequestEngine(concurrency=1, max_retries=3, backoff_base=0.01)
+    mock_server.fail_next(400)
+    results = engine.map(_complete(mock_server), ["bad request", "good request"])
+    assert isinstance(results[0], urllib.error.HTTPError) and results[0].code == 400
+    assert not isinstance(results[1], Exception)
+    assert len(mock_server.requests) == 2
+
+def test_requests_per_minute_are_spaced(mock_server):
+    engine = RequestEngine(concurrency=8)
+    # 10 requests per second once the single request of the bucket is used
+    engine.request_bucket = TokenBucket(600, capacity=1)
+    start = time.monotonic()
+    engine.map(_complete(mock_server), [str(i) for i in range(6)])
+    assert time.monotonic() - start >= 0.45
+    times = sorted(t for t, _ in mock_server.requests)
+    assert all(b - a >= 0.08 for a, b in zip(times, times[1:]))
+
+def test_tokens_per_minute_are_charged_and_corrected(mock_server):
+    engine = RequestEngine(concurrency=8)
+    # 1000 tokens per second, with room for a single 100 token request
+    engine.token_bucket = TokenBucket(60000, capacity=100)
+    start = time.monotonic()
+    results = engine.map(_complete(mock_server), [str(i) for i in range(5)],
+                         estimate_tokens=lambda prompt: 100,
+                         used_tokens=lambda response: response["usage"]["total_tokens"])
+    assert time.monotonic() - start >= 0.35
+    # the actual usage (about 10 tokens) is given back to the bucket
+    assert all(r["usage"]["total_tokens"] < 100 for r in results)
+    assert engine.token_bucket.tokens > 50
@@ -0,0 +1,35 @@
+import threading
+import time
+
+import pytest
+
+from planning_eval_framework.server import EvaluationServer, ServerBusyError
+
+def test_submit_rejects_a_list_larger_than_the_free_capacity():
+    server = EvaluationServer(queue_size=3)
+    server.requests.put_nowait(object())
+    with pytest.raises(ServerBusyError):
+        server.submit("evaluate", [{"plan_pddl": str(i)} for i in range(3)])
+    # nothing of the rejected list was queued
+    assert server.requests.qsize() == 1
+
+def test_evaluations_of_a_problem_are_served_together():
+    server = EvaluationServer(queue_size=8, batch_size=8)
+    calls = []
+
+    def evaluate_many(domain_pddl, problem_pddl, plans_pddl, backend):
+        calls.append((problem_pddl, list(plans_pddl)))
+        return [{"valid": True, "plan": plan} for plan in plans_pddl]
+    server.evaluate_many = evaluate_many
+
+    payloads = [{"domain_pddl": "d", "problem_pddl": p, "plan_pddl": f"{p}{i}", "backend": "numpy"} for p in ("p1", "p2") for i in range(3)]
+    results = {}
+    client = threading.Thread(target=lambda: results.update(response=server.submit("evaluate", payloads)))
+    client.start()
+    while server.requests.qsize() < len(payloads):
+        time.sleep(0.01)
+    server._process_batch(server._next_batch())
+    client.join()
+
+    assert sorted(calls) == [("p1", ["p10", "p11", "p12"]), ("p2", ["p20", "p21", "p22"])]
+    assert [r["plan"] for r in results["response"]] == [p["plan_pddl"] for p in payloads]
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pytest
+
+from planning_eval_framework import shared_arrays
+
+@pytest.fixture
+def shared_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_arrays, "SHARED_ARRAYS_DIR", str(tmp_path))
+    return tmp_path
+
+def _age(key, seconds):
+    path = shared_arrays._array_file(key)
+    mtime = os.stat(path).st_mtime - seconds
+    os.utime(path, (mtime, mtime))
+
+def test_arrays_are_published_once_and_attached_read_only(shared_dir):
+    calls = []
+    compute = lambda: calls.append(1) or np.arange(10.0)
+    first = shared_arrays.get_or_publish("a", compute)
+    second = shared_arrays.get_or_publish("a", compute)
+    assert len(calls) == 1
+    assert np.array_equal(first, second) and not second.flags.writeable
+
+def test_least_recently_used_arrays_are_evicted(shared_dir, monkeypatch):
+    # room for two arrays of 8 kB
+    monkeypatch.setattr(shared_arrays, "SHARED_ARRAYS_MAX_MB", 20 / 1024)
+    shared_arrays.publish("a", np.zeros(1000))
+    _age("a", 200)
+    held = shared_arrays.publish("b", np.zeros(1000))
+    _age("b", 100)
+    # "a" is the oldest but attaching it marks it as used
+    assert shared_arrays.attach("a") is not None
+
+    shared_arrays.publish("c", np.ones(1000))
+    assert sorted(os.listdir(shared_dir)) == ["a.npy", "c.npy"]
+    # processes that mapped an evicted array keep reading it
+    assert held.sum() == 0
+
+def test_clear_removes_all_the_arrays(shared_dir):
+    shared_arrays.publish("a", np.zeros(3))
+    shared_arrays.clear()
+    assert shared_arrays.attach("a") is None
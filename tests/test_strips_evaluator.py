@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.problem_generator import generate_manipulation
+from planning_eval_framework.strips_evaluator import BatchStripsSimulator, StripsPlanEvaluator
+from planning_eval_framework.tools.check_evaluator_parity import random_plans
+
+def _random_walk(task, length, rng):
+    state, plan = task.init_state, []
+    for _ in range(length):
+        applicable = task.applicable(state).nonzero()[0]
+        if len(applicable) == 0:
+            break
+        action = int(rng.choice(applicable))
+        state = task.apply(state, action)
+        plan.append(task.action_texts[action])
+    return plan
+
+def _evaluate_one(domain_pddl, problem_pddl, plan_pddl, trajectory_mode="full"):
+    evaluator = StripsPlanEvaluator(domain_pddl, problem_pddl, plan_pddl, trajectory_mode)
+    evaluator.try_simulation()
+    if not evaluator.is_valid():
+        return False, None, None, None
+    return True, evaluator.is_successful(), evaluator.is_safe(), evaluator.first_violations()
+
+def _check_batch_against_single(domain_pddl, problem_pddl, plans):
+    simulator = BatchStripsSimulator(domain_pddl, problem_pddl)
+    valid, successful, safe, violations = simulator.simulate(plans)
+    for i, plan in enumerate(plans):
+        expected_valid, expected_successful, expected_safe, expected_violations = _evaluate_one(domain_pddl, problem_pddl, plan)
+        assert bool(valid[i]) == expected_valid, plan
+        if expected_valid:
+            assert bool(successful[i]) == expected_successful, plan
+            assert bool(safe[i]) == expected_safe, plan
+            assert {c: (int(step) if step >= 0 else None) for c, step in zip(simulator.constraint_rules, violations[i])} == expected_violations, plan
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_batch_simulation_matches_single_plans(manipulation_domain, manipulation_problems, problem_name):
+    problem_pddl = manipulation_problems[problem_name]
+    plans = random_plans(ground(manipulation_domain, problem_pddl), 40, random.Random(problem_name))
+    _check_batch_against_single(manipulation_domain, problem_pddl, plans)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_simulation_matches_single_plans_of_generated_problems(manipulation_domain, seed):
+    problem = generate_manipulation(8, 4, 1, 3, seed)
+    rng = random.Random(seed)
+    plans = random_plans(ground(manipulation_domain, problem["pddl"]), 20, rng)
+    plans.append("\n".join(problem["plan"]))
+    _check_batch_against_single(manipulation_domain, problem["pddl"], plans)
+
+def test_plans_with_violations_are_unsafe(manipulation_domain, manipulation_problems):
+    # random walks eventually violate the constraints of the hand-written problems
+    rng = random.Random(0)
+    unsafe = 0
+    for problem_pddl in manipulation_problems.values():
+        task = ground(manipulation_domain, problem_pddl)
+        for _ in range(40):
+            valid, _, safe, violations = _evaluate_one(manipulation_domain, problem_pddl, "\n".join(_random_walk(task, 10, rng)))
+            assert valid
+            assert safe == all(step is None for step in violations.values())
+            unsafe += not safe
+    assert unsafe > 0
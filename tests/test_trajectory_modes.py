@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from planning_eval_framework import strips_evaluator
+from planning_eval_framework.grounding import ground
+from planning_eval_framework.problem_generator import generate_manipulation
+from planning_eval_framework.strips_evaluator import StripsPlanEvaluator
+from planning_eval_framework.tools.check_evaluator_parity import random_plans
+
+def _first_violations(evaluator_class, domain_pddl, problem_pddl, plan_pddl, trajectory_mode, constraint_rules=None):
+    evaluator = evaluator_class(domain_pddl, problem_pddl, plan_pddl, trajectory_mode)
+    evaluator.try_simulation()
+    if not evaluator.is_valid():
+        return None
+    return evaluator.is_successful(), evaluator.is_safe(), evaluator.first_violations(constraint_rules)
+
+def _plans(domain_pddl, problem_pddl, seed):
+    # up to 10 steps, so that compact trajectories are rebuilt in several chunks of a few states
+    return random_plans(ground(domain_pddl, problem_pddl), 30, random.Random(seed))
+
+@pytest.mark.parametrize("problem_name", ["p01", "p02", "p03", "p04"])
+def test_compact_trajectories_give_the_same_first_violations(manipulation_domain, manipulation_problems, problem_name, monkeypatch):
+    monkeypatch.setattr(strips_evaluator, "TRAJECTORY_CHUNK_SIZE", 3)
+    problem_pddl = manipulation_problems[problem_name]
+    for plan_pddl in _plans(manipulation_domain, problem_pddl, 0):
+        full = _first_violations(StripsPlanEvaluator, manipulation_domain, problem_pddl, plan_pddl, "full")
+        compact = _first_violations(StripsPlanEvaluator, manipulation_domain, problem_pddl, plan_pddl, "compact")
+        assert full == compact, plan_pddl
+
+def test_compact_trajectories_of_generated_problems(manipulation_domain, monkeypatch):
+    monkeypatch.setattr(strips_evaluator, "TRAJECTORY_CHUNK_SIZE", 4)
+    problem = generate_manipulation(16, 8, 2, 5, seed=3)
+    for plan_pddl in _plans(manipulation_domain, problem["pddl"], 3) + ["\n".join(problem["plan"])]:
+        full = _first_violations(StripsPlanEvaluator, manipulation_domain, problem["pddl"], plan_pddl, "full")
+        compact = _first_violations(StripsPlanEvaluator, manipulation_domain, problem["pddl"], plan_pddl, "compact")
+        assert full == compact, plan_pddl
+
+def test_compact_julia_trajectories_give_the_same_first_violations(manipulation_domain, manipulation_problems):
+    pytest.importorskip("juliacall")
+    pytest.importorskip("llm_planners")
+    from planning_eval_framework.plan_evaluator import PlanEvaluator
+
+    for problem_pddl in manipulation_problems.values():
+        rules = StripsPlanEvaluator(manipulation_domain, problem_pddl, "").constraint_rules
+        for plan_pddl in _plans(manipulation_domain, problem_pddl, 1)[:40]:
+            full = _first_violations(PlanEvaluator, manipulation_domain, problem_pddl, plan_pddl, "full", rules)
+            compact = _first_violations(PlanEvaluator, manipulation_domain, problem_pddl, plan_pddl, "compact", rules)
+            assert full == compact, plan_pddl
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+
+import pytest
+
+from planning_eval_framework.work_queue import WorkQueue, allocate_run
+
+@pytest.fixture
+def work_queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    queue.enqueue({"a": {"unit": "a"}, "b": {"unit": "b"}})
+    return queue
+
+def _expire_leases(work_queue):
+    with work_queue._connect() as conn:
+        conn.execute("UPDATE units SET lease_expires = 0 WHERE status = 'leased'")
+
+def test_units_are_enqueued_once(work_queue):
+    assert work_queue.enqueue({"a": {"unit": "a"}, "c": {"unit": "c"}}) == 1
+    assert work_queue.payloads() == [{"unit": "a"}, {"unit": "b"}, {"unit": "c"}]
+
+def test_claim_and_complete(work_queue):
+    first = work_queue.claim("w1")
+    second = work_queue.claim("w2")
+    assert (first.key, first.payload, first.attempts) == ("a", {"unit": "a"}, 1)
+    assert second.key == "b"
+    assert work_queue.claim("w3") is None
+
+    work_queue.complete(first, "w1")
+    assert work_queue.counts() == {"done": 1, "leased": 1}
+    assert not work_queue.is_drained()
+    work_queue.complete(second, "w2")
+    assert work_queue.is_drained()
+
+def test_renew_keeps_the_lease(work_queue):
+    unit = work_queue.claim("w1")
+    assert work_queue.renew(unit, "w1")
+    assert not work_queue.renew(unit, "w2")
+    work_queue.complete(unit, "w1")
+    assert not work_queue.renew(unit, "w1")
+
+def test_expired_leases_are_claimed_again(work_queue):
+    unit = work_queue.claim("w1")
+    work_queue.claim("w1")
+    _expire_leases(work_queue)
+    reclaimed = work_queue.claim("w2")
+    assert (reclaimed.key, reclaimed.attempts) == (unit.key, 2)
+    # the first worker lost the lease
+    assert not work_queue.renew(unit, "w1")
+    assert work_queue.renew(reclaimed, "w2")
+
+def test_units_expiring_on_their_last_attempt_fail(work_queue):
+    # "a" is leased twice by workers that die, e.g. killed by the OOM killer
+    for attempt in (1, 2):
+        unit = work_queue.claim(f"w{attempt}")
+        assert (unit.key, unit.attempts) == ("a", attempt)
+        _expire_leases(work_queue)
+    # it is not leased a third time
+    assert work_queue.claim("w3").key == "b"
+    assert work_queue.counts() == {"failed": 1, "leased": 1}
+
+def test_failed_units_are_retried_up_to_max_attempts(work_queue):
+    unit = work_queue.claim("w1")
+    work_queue.fail(unit, "w1", "error 1")
+    assert work_queue.counts() == {"pending": 2}
+    unit = work_queue.claim("w1")
+    assert (unit.key, unit.attempts) == ("a", 2)
+    work_queue.fail(unit, "w1", "error 2")
+    assert work_queue.counts() == {"failed": 1, "pending": 1}
+    assert work_queue.claim("w1").key == "b"
+
+def test_released_units_do_not_count_as_attempts(work_queue):
+    unit = work_queue.claim("w1")
+    work_queue.release(unit, "w1")
+    unit = work_queue.claim("w1")
+    assert (unit.key, unit.attempts) == ("a", 1)
+
+def test_concurrent_claims_never_share_a_unit(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    work_queue.enqueue({str(i): {} for i in range(40)})
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        while (unit := work_queue.claim(worker_id)) is not None:
+            with lock:
+                claimed.append(unit.key)
+            work_queue.complete(unit, worker_id)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed, key=int) == [str(i) for i in range(40)]
+    assert work_queue.counts() == {"done": 40}
+
+def test_concurrent_allocate_run(tmp_path):
+    directory = str(tmp_path / "experiments")
+    runs = []
+    lock = threading.Lock()
+    start = threading.Event()
+
+    def allocate():
+        start.wait()
+        run = allocate_run(directory)
+        with lock:
+            runs.append(run)
+
+    threads = [threading.Thread(target=allocate) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    start.set()
+    for thread in threads:
+        thread.join()
+    assert sorted(runs) == list(range(16))
+    assert sorted(os.listdir(directory)) == sorted(f"run{run}" for run in range(16))
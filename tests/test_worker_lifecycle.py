@@ -0,0 +1,35 @@
+import os
+import sys
+
+from planning_eval_framework.work_queue import WorkQueue
+from planning_eval_framework.worker_lifecycle import supervise_workers
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# worker killed by SIGKILL, as by the OOM killer, on the units marked to crash it; it waits
+# for the leases of dead workers to expire rather than exiting while the queue is not drained
+WORKER = """
+import os, signal, sys, time
+from planning_eval_framework.work_queue import WorkQueue
+work_queue = WorkQueue(sys.argv[1], lease_seconds=0.2, max_attempts=2)
+while not work_queue.is_drained():
+    unit = work_queue.claim(sys.argv[2])
+    if unit is None:
+        time.sleep(0.05)
+    elif unit.payload["crash"]:
+        os.kill(os.getpid(), signal.SIGKILL)
+    else:
+        work_queue.complete(unit, sys.argv[2])
+"""
+
+def test_units_killing_their_workers_end_up_failed(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", SRC_DIR)
+    path = str(tmp_path / "queue.sqlite")
+    work_queue = WorkQueue(path, lease_seconds=0.2, max_attempts=2)
+    work_queue.enqueue({"crashes": {"crash": True}, **{f"unit{i}": {"crash": False} for i in range(4)}})
+
+    supervise_workers(lambda i: [sys.executable, "-c", WORKER, path, f"worker{i}"], 2, work_queue.is_drained, poll_interval=0.05)
+
+    assert work_queue.counts() == {"done": 4, "failed": 1}
+    with work_queue._connect() as conn:
+        assert conn.execute("SELECT attempts FROM units WHERE key = 'crashes'").fetchone() == (2,)